@@ -0,0 +1,152 @@
+"""
+Benchmark of the analysis dashboard data on SQLite.
+
+Creates 100,000 synthetic evaluations (10 courses, 20 models) and computes
+the per-course and global grade/time averages with confidence intervals,
+once with the previous code (one query per course plus a global one,
+reading evaluation.model per row, pure-Python statistics) and once with
+the code of the analysis dashboard (graphics_service.analysis_statistics,
+which reads the materialized per-exam/model statistics table), and reports
+queries and time spent. Runs against a throwaway in-memory database, so
+the project database is not touched.
+
+Usage:
+    python -m benchmarks.analysis_benchmark [--evaluations 100000] [--courses 10] [--models 20]
+"""
+import argparse
+import os
+import random
+import time
+from collections import defaultdict
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mi_web.settings')
+django.setup()
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from genaigrader.models import Course, Evaluation, Exam, Model  # noqa: E402
+from genaigrader.services.confidence_service import compute_averages  # noqa: E402
+from genaigrader.services.graphics_service import analysis_statistics  # noqa: E402
+from genaigrader.services.statistics_service import rebuild_statistics  # noqa: E402
+
+
+def legacy_process_evaluations_for_graphics(evaluations):
+    """The per-row grouping the analysis view used before, kept here for comparison."""
+    model_values = defaultdict(lambda: {'grades': [], 'times': [], 'model': None})
+    for evaluation in evaluations:
+        model_desc = evaluation.model.description
+        model_values[model_desc]['grades'].append(evaluation.grade)
+        model_values[model_desc]['times'].append(evaluation.time)
+        if model_values[model_desc]['model'] is None:
+            model_values[model_desc]['model'] = evaluation.model
+    return model_values
+
+
+def legacy_compute_model_statistics(model_values):
+    model_average_grades, _ = compute_averages(model_values, 'grades')
+    model_average_times, _ = compute_averages(model_values, 'times')
+    model_map = {data['model'].description: data['model'] for data in model_values.values()}
+    return (
+        sorted(model_average_grades, key=lambda x: model_map[x['model__description']].get_sort_key()),
+        sorted(model_average_times, key=lambda x: model_map[x['model__description']].get_sort_key())
+    )
+
+
+def legacy_analysis(user):
+    course_data = {}
+    for course in Course.objects.filter(user=user).prefetch_related('exam_set'):
+        evaluations = Evaluation.objects.filter(exam__in=course.exam_set.all(), status=Evaluation.DONE)
+        if evaluations.exists():
+            course_data[course.id] = legacy_compute_model_statistics(legacy_process_evaluations_for_graphics(evaluations))
+    all_evals = Evaluation.objects.filter(exam__course__user=user, status=Evaluation.DONE)
+    overall = legacy_compute_model_statistics(legacy_process_evaluations_for_graphics(all_evals))
+    return course_data, overall
+
+
+def dashboard_analysis(user):
+    """The analysis dashboard data, in the shape of legacy_analysis for comparison."""
+    data = analysis_statistics(user)
+    course_data = {
+        course['course']['id']: (course['model_averages'], course['time_averages'])
+        for course in data['course_data'] if course['model_averages']
+    }
+    return course_data, (data['overall_model_averages'], data['overall_time_averages'])
+
+
+def populate(evaluations, courses, models):
+    user = User.objects.create_user(username='benchmark')
+    model_objs = Model.objects.bulk_create([Model(description=f'family{i % 4}:{i}b') for i in range(models)])
+    exams = []
+    for i in range(courses):
+        course = Course.objects.create(name=f'Course {i}', user=user)
+        exams += [Exam.objects.create(course=course, description=f'Exam {i}.{j}', user=user) for j in range(3)]
+    rng = random.Random(0)
+    now = timezone.now()
+    Evaluation.objects.bulk_create(
+        [
+            Evaluation(prompt='', ev_date=now, grade=round(rng.uniform(0, 10), 2), time=round(rng.uniform(1, 60), 2),
+                       model=rng.choice(model_objs), exam=rng.choice(exams))
+            for _ in range(evaluations)
+        ],
+        batch_size=5000,
+    )
+    rebuild_statistics()  # bulk_create does not send the signals maintaining the statistics
+    return user
+
+
+def largest_difference(a, b):
+    """Largest difference between the numbers of two results of the same shape."""
+    if isinstance(a, dict):
+        return max((largest_difference(a[key], b[key]) for key in a), default=0.0)
+    if isinstance(a, (list, tuple)):
+        return max((largest_difference(x, y) for x, y in zip(a, b)), default=0.0)
+    return abs(a - b) if isinstance(a, (int, float)) else float(a != b)
+
+
+def measure(run):
+    # Counted with a wrapper: the legacy code runs more queries than the query log keeps
+    queries = 0
+
+    def count(execute, sql, params, many, context):
+        nonlocal queries
+        queries += 1
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(count):
+        start = time.perf_counter()
+        result = run()
+        elapsed = time.perf_counter() - start
+    return result, queries, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--evaluations', type=int, default=100_000)
+    parser.add_argument('--courses', type=int, default=10)
+    parser.add_argument('--models', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        user = populate(args.evaluations, args.courses, args.models)
+        print(f"{args.evaluations} evaluations, {args.courses} courses, {args.models} models\n")
+        print(f"{'':<12} {'queries':>8} {'time (s)':>9}")
+
+        legacy, legacy_queries, legacy_time = measure(lambda: legacy_analysis(user))
+        dashboard, queries, elapsed = measure(lambda: dashboard_analysis(user))
+        print(f"{'legacy':<12} {legacy_queries:>8} {legacy_time:>9.3f}")
+        print(f"{'dashboard':<12} {queries:>8} {elapsed:>9.3f}")
+        # The merged moments can round the last shown digit the other way
+        print(f"\nLargest difference: {largest_difference(legacy, dashboard):.2f}")
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""
+Benchmark of exam and evaluation persistence on SQLite.
+
+Saves a synthetic exam of 1,000 questions (4 options each) and one
+QuestionEvaluation per question, once with the previous row-by-row code
+and once with the bulk_create/bulk_update code, and reports the number
+of queries and the time spent. Runs against a throwaway in-memory
+database, so the project database is not touched.
+
+Usage:
+    python -m benchmarks.bulk_persistence_benchmark [--questions 1000] [--batch-size 500]
+"""
+import argparse
+import os
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mi_web.settings')
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.contrib.auth.models import User  # noqa: E402
+from django.core.files.uploadedfile import SimpleUploadedFile  # noqa: E402
+from django.db import connection, transaction  # noqa: E402
+from django.test.client import RequestFactory  # noqa: E402
+from django.test.utils import CaptureQueriesContext, setup_test_environment  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from genaigrader.models import Course, Evaluation, Model, Question, QuestionEvaluation, QuestionOption  # noqa: E402
+from genaigrader.services.exam_service import create_exam  # noqa: E402
+from genaigrader.services.stream_service import _save_checkpoint  # noqa: E402
+from genaigrader.services.upload_file_service import persist_exam_and_questions  # noqa: E402
+
+
+def synthetic_exam(questions):
+    return [
+        {
+            'statement': f"Question {i}: which option is correct?",
+            'options': ["a) first", "b) second", "c) third", "d) fourth"],
+            'correct_option': "abcd"[i % 4],
+        }
+        for i in range(questions)
+    ]
+
+
+def legacy_persist_exam(uploaded_file, course, user, request, questions_data, batch_size=None):
+    """The row-by-row persistence persist_exam_and_questions replaced, kept here for comparison."""
+    with transaction.atomic():
+        exam = create_exam(uploaded_file, course, user, request)
+        exam.save()
+        for q_data in questions_data:
+            question = Question.objects.create(statement=q_data['statement'], exam=exam)
+            correct_option = None
+            for opt_content in q_data['options']:
+                option = QuestionOption.objects.create(content=opt_content, question=question)
+                if opt_content.split(')')[0].strip().lower() == q_data['correct_option']:
+                    correct_option = option
+            question.correct_option = correct_option
+            question.save()
+    return exam
+
+
+def legacy_save_evaluation(evaluation, question_evaluations):
+    with transaction.atomic():
+        evaluation.save()
+        for q_eval in question_evaluations:
+            q_eval.evaluation = evaluation
+            q_eval.save()
+
+
+def bulk_save_evaluation(evaluation, question_evaluations):
+    _save_checkpoint(evaluation, question_evaluations, 0, len(question_evaluations), 0.0, done=True)
+
+
+def measure(run):
+    with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        result = run()
+        elapsed = time.perf_counter() - start
+    return result, len(queries), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--questions', type=int, default=1000)
+    parser.add_argument('--batch-size', type=int, default=settings.BULK_BATCH_SIZE)
+    args = parser.parse_args()
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        user = User.objects.create_user(username='benchmark')
+        course = Course.objects.create(name='Benchmark', user=user)
+        model = Model.objects.create(description='Benchmark model')
+        request = RequestFactory().post('/upload/', {'user_exam': 'Benchmark exam'})
+        questions_data = synthetic_exam(args.questions)
+
+        print(f"{args.questions} questions, batch size {args.batch_size}\n")
+        print(f"{'':<22} {'legacy queries':>15} {'legacy (s)':>11} {'bulk queries':>13} {'bulk (s)':>9}")
+
+        rows = {}
+        for label, persist in (('legacy', legacy_persist_exam), ('bulk', persist_exam_and_questions)):
+            uploaded_file = SimpleUploadedFile('exam.txt', b'')
+            exam, queries, elapsed = measure(
+                lambda: persist(uploaded_file, course, user, request, questions_data, batch_size=args.batch_size)
+            )
+            rows[label, 'exam'] = (queries, elapsed)
+
+            questions = list(Question.objects.filter(exam=exam).select_related('correct_option'))
+            evaluation = Evaluation(prompt='', ev_date=timezone.now(), grade=0, time=0.0, model=model, exam=exam)
+            question_evaluations = [
+                QuestionEvaluation(question=question, question_option=question.correct_option)
+                for question in questions
+            ]
+            save = legacy_save_evaluation if label == 'legacy' else bulk_save_evaluation
+            _, queries, elapsed = measure(lambda: save(evaluation, question_evaluations))
+            rows[label, 'evaluation'] = (queries, elapsed)
+
+        for step, title in (('exam', 'persist exam'), ('evaluation', 'save evaluation')):
+            legacy_queries, legacy_time = rows['legacy', step]
+            bulk_queries, bulk_time = rows['bulk', step]
+            print(f"{title:<22} {legacy_queries:>15} {legacy_time:>11.3f} {bulk_queries:>13} {bulk_time:>9.3f}")
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+"""
+Benchmark of exam file parsing.
+
+Parses a synthetic exam of 50,000 questions (4 options each) with the
+previous parser, which read the file from disk after the upload was saved
+there, matched uncompiled patterns and stopped at the first error, and with
+parse_exam, which reads the uploaded file object directly. Also parses a
+copy of the exam with an error every 1,000 questions, to show that every
+error is collected in the same pass.
+
+Usage:
+    python -m benchmarks.exam_parser_benchmark [--questions 50000] [--repeat 3]
+"""
+import argparse
+import os
+import re
+import tempfile
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mi_web.settings')
+django.setup()
+
+from django.core.files.uploadedfile import SimpleUploadedFile  # noqa: E402
+
+from genaigrader.services.exam_service import ExamFormatError, parse_exam  # noqa: E402
+
+
+def synthetic_exam(questions, error_every=None):
+    """Exam file content; with error_every, every error_every-th question has an invalid correct option."""
+    lines = []
+    for i in range(questions):
+        answer = "z" if error_every and i % error_every == error_every - 1 else "abcd"[i % 4]
+        lines += [
+            f"Question {i}: which option is correct?",
+            "a) first", "b) second", "c) third", "d) fourth",
+            "",
+            answer,
+            "",
+        ]
+    return "\n".join(lines).encode("utf-8")
+
+
+def legacy_process_exam_file(file_path):
+    """The parser parse_exam replaced, kept here for comparison."""
+    questions_data = []
+    statement = []
+    current_question = None
+    state = "statement"
+    line_number = 0
+    has_content = False
+
+    with open(file_path, "r", encoding="utf-8") as f:
+        for line in f:
+            line_number += 1
+            stripped_line = line.strip()
+            if stripped_line:
+                has_content = True
+
+            if state == "statement":
+                if stripped_line and re.match(r'^[a-zA-Z]\)', stripped_line):
+                    if not statement:
+                        raise ValueError(f"Line {line_number}: Question missing statement")
+                    current_question = {
+                        'statement': "\n".join(statement).strip(),
+                        'options': [stripped_line],
+                        'correct_option': None
+                    }
+                    state = "options"
+                    statement = []
+                elif stripped_line:
+                    statement.append(stripped_line)
+
+            elif state == "options":
+                if not stripped_line:
+                    if len(current_question['options']) < 2:
+                        raise ValueError(f"Line {line_number}: Minimum 2 options required.")
+                    state = "correct"
+                elif re.match(r'^[a-zA-Z]\)', stripped_line):
+                    current_question['options'].append(stripped_line)
+                else:
+                    correct_option = stripped_line.lower().strip()
+                    option_letters = [opt.split(')')[0].strip().lower() for opt in current_question['options']]
+                    if correct_option not in option_letters:
+                        raise ValueError(f"Line {line_number}: Invalid correct option '{correct_option}'.")
+                    current_question['correct_option'] = correct_option
+                    questions_data.append(current_question)
+                    current_question = None
+                    state = "statement"
+
+            elif state == "correct" and stripped_line:
+                correct_option = stripped_line.lower().strip()
+                option_letters = [opt.split(')')[0].strip().lower() for opt in current_question['options']]
+                if correct_option not in option_letters:
+                    raise ValueError(f"Line {line_number}: Invalid correct option '{correct_option}'.")
+                current_question['correct_option'] = correct_option
+                questions_data.append(current_question)
+                current_question = None
+                state = "statement"
+
+        if not has_content:
+            raise ValueError("File is completely empty")
+        if state != "statement":
+            raise ValueError("Invalid format: incomplete final question")
+        if not questions_data:
+            raise ValueError("File contains no valid questions")
+
+    return questions_data
+
+
+def legacy_parse(content, directory):
+    """Saves the upload to disk, as save_uploaded_file did, and parses the saved file."""
+    uploaded_file = SimpleUploadedFile("exam.txt", content)
+    path = os.path.join(directory, uploaded_file.name)
+    with open(path, "wb") as f:
+        for chunk in uploaded_file.chunks():
+            f.write(chunk)
+    return legacy_process_exam_file(path)
+
+
+def streaming_parse(content, directory):
+    return parse_exam(SimpleUploadedFile("exam.txt", content))
+
+
+def best_time(parse, content, directory, repeat):
+    """Best time of `repeat` runs, and the questions parsed or the number of errors found."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        try:
+            result = len(parse(content, directory))
+            outcome = f"{result} questions"
+        except ExamFormatError as e:
+            outcome = f"{len(e.errors)} errors"
+        except ValueError:
+            outcome = "1 error"
+        times.append(time.perf_counter() - start)
+    return min(times), outcome
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--questions', type=int, default=50_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    files = (
+        ('valid exam', synthetic_exam(args.questions)),
+        ('exam with errors', synthetic_exam(args.questions, error_every=1000)),
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        legacy_questions = legacy_parse(files[0][1], directory)
+        assert streaming_parse(files[0][1], directory) == legacy_questions, "The parsers disagree"
+
+        print(f"{args.questions} questions, {len(files[0][1]) / 1e6:.1f} MB, best of {args.repeat}\n")
+        print(f"{'':<18} {'legacy (s)':>11} {'legacy result':>15} {'streaming (s)':>14} {'streaming result':>17}")
+        for title, content in files:
+            legacy_time, legacy_outcome = best_time(legacy_parse, content, directory, args.repeat)
+            streaming_time, streaming_outcome = best_time(streaming_parse, content, directory, args.repeat)
+            print(f"{title:<18} {legacy_time:>11.3f} {legacy_outcome:>15} {streaming_time:>14.3f} {streaming_outcome:>17}")
+
+
+if __name__ == '__main__':
+    main()
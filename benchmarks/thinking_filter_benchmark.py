@@ -0,0 +1,101 @@
+"""
+Micro-benchmark of the thinking-aware stream filter.
+
+Feeds synthetic reasoning streams of up to 100k tokens through
+ThinkingFilter and through the previous implementation, which appended
+every chunk to a buffer and searched the whole buffer for '</think>'.
+
+Usage:
+    python -m benchmarks.thinking_filter_benchmark [--tokens 100000] [--repeat 3]
+"""
+import argparse
+import random
+import time
+
+from genaigrader.llm_api import ThinkingFilter
+
+WORDS = ["the", " answer", " depends", " on", " whether", " option", " b", " is", " correct", ",", "\n", " so"]
+
+
+def synthetic_stream(tokens, seed=0):
+    """Reasoning stream of `tokens` chunks, with the tags split across chunks."""
+    rng = random.Random(seed)
+    yield "<th"
+    yield "ink>"
+    for _ in range(tokens):
+        yield rng.choice(WORDS)
+    yield "</thi"
+    yield "nk>\n\n"
+    yield "b"
+
+
+def legacy_filter(stream):
+    """The buffering filter ThinkingFilter replaced, kept here for comparison."""
+    buffer = ""
+    first_chunk = True
+    buffering = False
+    for content in stream:
+        if first_chunk:
+            first_chunk = False
+            if content.lstrip().startswith('<think>'):
+                buffering = True
+                buffer += content
+                continue
+            yield from (line for line in content.splitlines() if line.strip())
+            continue
+        if buffering:
+            buffer += content
+            end_tag = buffer.find('</think>')
+            if end_tag == -1:
+                continue
+            yield from (line for line in buffer[end_tag + len('</think>'):].splitlines() if line.strip())
+            buffering = False
+            buffer = ""
+        else:
+            yield from (line for line in content.splitlines() if line.strip())
+
+
+def incremental_filter(stream):
+    thinking_filter = ThinkingFilter()
+    for content in stream:
+        yield from thinking_filter.feed(content)
+    yield from thinking_filter.flush()
+
+
+def best_time(run, chunks, repeat):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = list(run(chunks))
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--tokens', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'tokens':>10} {'legacy (s)':>12} {'incremental (s)':>16} {'speedup':>8}")
+    sizes = sorted({max(args.tokens // 10, 1), max(args.tokens // 2, 1), args.tokens})
+    for tokens in sizes:
+        chunks = list(synthetic_stream(tokens))
+        legacy_time, legacy_result = best_time(legacy_filter, chunks, args.repeat)
+        new_time, new_result = best_time(incremental_filter, chunks, args.repeat)
+        # The legacy filter misses the split opening tag, so it leaks the reasoning.
+        assert new_result == ["b"], new_result
+        print(f"{tokens:>10} {legacy_time:>12.4f} {new_time:>16.4f} {legacy_time / new_time:>7.1f}x"
+              f"{'' if legacy_result == new_result else '  (legacy output differs)'}")
+
+    # Same stream, but with the opening tag whole, which the legacy filter understands.
+    chunks = ["<think>"] + list(synthetic_stream(args.tokens))[2:]
+    legacy_time, _ = best_time(legacy_filter, chunks, 1)
+    new_time, _ = best_time(incremental_filter, chunks, args.repeat)
+    print(f"\nUnsplit opening tag, {args.tokens} tokens: legacy {legacy_time:.4f}s, "
+          f"incremental {new_time:.4f}s ({legacy_time / new_time:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Course, Exam, Question, QuestionOption, Model, Evaluation, QuestionEvaluation
+from .models import Course, Exam, Question, QuestionOption, Model, Evaluation, QuestionEvaluation, CachedResponse, BatchJob, BatchTask, EvaluationStatistic, DataVersion
 
 @admin.register(Course)
 class CourseAdmin(admin.ModelAdmin):
@@ -14,7 +14,7 @@ class CourseAdmin(admin.ModelAdmin):
 class ExamAdmin(admin.ModelAdmin):
     list_display = ('id', 'description', 'course_id', 'user', 'show_questions')
     list_filter = ('course_id', 'user') 
-    search_fields = ('description',) 
+    search_fields = ('description', 'content_hash')
 
     def show_questions(self, obj):
         return ", ".join([question.statement[:50] for question in obj.question_set.all()])
@@ -41,7 +41,7 @@ class QuestionOptionAdmin(admin.ModelAdmin):
 
 @admin.register(Model)
 class ModelAdmin(admin.ModelAdmin):
-    list_display = ('id', 'description', 'show_evaluations')
+    list_display = ('id', 'description', 'max_concurrency', 'show_evaluations')
     search_fields = ('description',)  
 
     def show_evaluations(self, obj):
@@ -50,12 +50,12 @@ class ModelAdmin(admin.ModelAdmin):
 
 @admin.register(Evaluation)
 class EvaluationAdmin(admin.ModelAdmin):
-    list_display = ('id', 'prompt', 'ev_date', 'grade', 'time', 'model_id', 'show_model_description', 'exam_id', 'show_question_evaluations')
+    list_display = ('id', 'prompt', 'ev_date', 'grade', 'time', 'status', 'model_id', 'show_model_description', 'exam_id', 'show_question_evaluations')
     list_filter = ('model_id', 'exam_id')  
     search_fields = ('prompt', 'model__description',)
 
     def show_question_evaluations(self, obj):
-        return ", ".join([f"Q{qe.question.id} (O{qe.question_option.id})" for qe in obj.questionevaluation_set.all()])
+        return ", ".join([f"Q{qe.question_id} (O{qe.question_option_id or '-'})" for qe in obj.questionevaluation_set.all()])
     show_question_evaluations.short_description = 'Evaluaciones de Preguntas'
 
     def show_model_description(self, obj):
@@ -65,9 +65,33 @@ class EvaluationAdmin(admin.ModelAdmin):
 @admin.register(QuestionEvaluation)
 class QuestionEvaluationAdmin(admin.ModelAdmin):
     list_display = ('id', 'evaluation_id', 'question_id', 'question_option_id', 'show_related_info')
-    list_filter = ('evaluation_id', 'question_id', 'question_option_id')  
+    list_filter = ('evaluation_id', 'question_id', 'question_option_id', 'answer_recorded')  
     search_fields = ('evaluation_id__id', 'question_id__id', 'question_option_id__id')  
 
     def show_related_info(self, obj):
-        return f"Evaluation: {obj.evaluation.prompt[:50]}, Question: {obj.question.statement[:50]}, Option: {obj.question_option.content}"
+        return f"Evaluation: {obj.evaluation.prompt[:50]}, Question: {obj.question.statement[:50]}, Option: {obj.question_option.content if obj.question_option else '-'}"
     show_related_info.short_description = 'Información Relacionada'
+
+@admin.register(CachedResponse)
+class CachedResponseAdmin(admin.ModelAdmin):
+    list_display = ('id', 'model', 'response', 'hits', 'created_at', 'last_used_at')
+    list_filter = ('model',)
+
+@admin.register(BatchJob)
+class BatchJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'status', 'repetitions', 'target_half_width', 'use_cache', 'created_at', 'finished_at')
+    list_filter = ('status',)
+
+@admin.register(BatchTask)
+class BatchTaskAdmin(admin.ModelAdmin):
+    list_display = ('id', 'job_id', 'position', 'exam', 'model', 'repetition', 'status', 'worker', 'evaluation_id', 'started_at', 'finished_at')
+    list_filter = ('status', 'worker')
+
+@admin.register(EvaluationStatistic)
+class EvaluationStatisticAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'course', 'exam', 'model', 'count', 'grade_mean', 'time_mean')
+    list_filter = ('user', 'course', 'model')
+
+@admin.register(DataVersion)
+class DataVersionAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'version')
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ChatConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'genaigrader'
+
+    def ready(self):
+        from genaigrader import signals  # noqa: F401
@@ -1,11 +1,249 @@
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+import weakref
+import httpx
 import ollama
 import openai
 from django.core.validators import URLValidator
 from django.core.exceptions import ValidationError
 
+# Seconds a successful connectivity check of an external model is trusted for.
+VALIDATION_CACHE_TTL = 300
+
+# Process-wide OpenAI clients and validation results, keyed by
+# (api_url, sha256(api_key)) and (api_url, sha256(api_key), model name).
+_cache_lock = threading.Lock()
+_client_pool = {}
+_validated_until = {}
+# AsyncOpenAI clients are bound to the event loop they were created on, so
+# they are pooled per loop: {loop: {(api_url, sha256(api_key)): client}}.
+_async_client_pool = weakref.WeakKeyDictionary()
+
+
+class GenerationAborted(Exception):
+    """The model stream was cut short because it went over one of the model's limits."""
+    reason = 'aborted'
+
+
+class ThinkingBudgetExceeded(GenerationAborted):
+    """The model spent more than Model.thinking_budget characters inside <think>."""
+    reason = 'thinking_budget'
+
+
+class QuestionTimeout(GenerationAborted):
+    """The model did not finish answering within Model.question_timeout seconds."""
+    reason = 'timeout'
+
+
+def _credentials_key(api_url, api_key):
+    return (api_url, hashlib.sha256((api_key or "").encode('utf-8')).hexdigest())
+
+
+def get_openai_client(api_url, api_key):
+    """
+    Returns the shared openai.OpenAI client for the given credentials, creating it on first use.
+    OpenAI clients are thread-safe and keep a connection pool, so reusing them saves handshakes.
+    """
+    key = _credentials_key(api_url, api_key)
+    with _cache_lock:
+        client = _client_pool.get(key)
+        if client is None:
+            client = openai.OpenAI(api_key=api_key, base_url=api_url)
+            _client_pool[key] = client
+        return client
+
+
+def get_async_openai_client(api_url, api_key):
+    """
+    Returns the shared openai.AsyncOpenAI client for the given credentials on
+    the running event loop, creating it on first use. The clients of a loop
+    are dropped with it; close_async_clients() closes them beforehand.
+    """
+    loop = asyncio.get_running_loop()
+    key = _credentials_key(api_url, api_key)
+    with _cache_lock:
+        clients = _async_client_pool.setdefault(loop, {})
+        client = clients.get(key)
+        if client is None:
+            client = openai.AsyncOpenAI(api_key=api_key, base_url=api_url)
+            clients[key] = client
+        return client
+
+
+async def close_async_clients():
+    """Closes the pooled AsyncOpenAI clients of the running event loop, e.g. before the loop ends."""
+    with _cache_lock:
+        clients = list(_async_client_pool.pop(asyncio.get_running_loop(), {}).values())
+    for client in clients:
+        await client.close()
+
+
+def _discard_async_clients(credentials=None):
+    """
+    Drops the pooled AsyncOpenAI clients, or only those of `credentials`.
+    Clients of a loop that is still running are closed on it. Called with _cache_lock held.
+    """
+    for loop, clients in list(_async_client_pool.items()):
+        for key in [k for k in clients if credentials in (None, k)]:
+            client = clients.pop(key)
+            if loop.is_running():
+                asyncio.run_coroutine_threadsafe(client.close(), loop)
+
+
+def invalidate_validation_cache(api_url=None, api_key=None):
+    """
+    Forgets cached clients and validation results.
+
+    Call it whenever a model's credentials change or the model is deleted.
+    Without arguments, everything is forgotten.
+    """
+    with _cache_lock:
+        if api_url is None and api_key is None:
+            _client_pool.clear()
+            _discard_async_clients()
+            _validated_until.clear()
+            return
+        credentials = _credentials_key(api_url, api_key)
+        _client_pool.pop(credentials, None)
+        _discard_async_clients(credentials)
+        for key in [k for k in _validated_until if k[:2] == credentials]:
+            del _validated_until[key]
+
+
+def _validation_key(model_obj):
+    return _credentials_key(model_obj.api_url, model_obj.api_key) + (model_obj.description,)
+
+
+def _is_recently_validated(model_obj):
+    with _cache_lock:
+        expires_at = _validated_until.get(_validation_key(model_obj))
+    return expires_at is not None and expires_at > time.monotonic()
+
+
+def _remember_validation(model_obj):
+    with _cache_lock:
+        _validated_until[_validation_key(model_obj)] = time.monotonic() + VALIDATION_CACHE_TTL
+
+
+class ThinkingFilter:
+    """
+    Incremental filter that hides the <think>...</think> blocks of reasoning models.
+
+    Chunks are fed one at a time as they arrive from the model stream, so the
+    same filter serves both the blocking and the async backends. Tags are
+    found even when they are split across chunks or don't start the first
+    chunk. Each chunk is scanned once, and only a possible partial tag (at
+    most len('</think>') - 1 characters) is kept between chunks, so memory
+    stays bounded however long the reasoning trace is.
+
+    After the stream, `thinking_chars` and `thinking_chunks` tell how much
+    reasoning output was skipped. Streaming APIs usually send one token per
+    chunk, so `thinking_chunks` approximates the number of thinking tokens.
+    """
+    OPEN_TAG = '<think>'
+    CLOSE_TAG = '</think>'
+
+    def __init__(self):
+        self.inside = False
+        self.pending = ""  # Tail of the last chunk that may be the start of a tag
+        self.thinking_chars = 0
+        self.thinking_chunks = 0
+
+    def feed(self, content):
+        """
+        Processes one chunk of model output.
+
+        Returns:
+        - list[str]: Non-blank lines of visible (non-thinking) text in this chunk.
+        """
+        if not content:
+            return []
+        if not self.pending and '<' not in content:
+            # Fast path: no tag can start or end in this chunk
+            if self.inside:
+                self.thinking_chars += len(content)
+                self.thinking_chunks += 1
+                return []
+            return self._lines(content)
+        had_thinking = self.inside
+
+        text = self.pending + content
+        self.pending = ""
+        visible = []
+        pos = 0
+        while pos < len(text):
+            tag = self.CLOSE_TAG if self.inside else self.OPEN_TAG
+            tag_start = text.find(tag, pos)
+            if tag_start == -1:
+                held = self._partial_tag_length(text, pos, tag)
+                end = len(text) - held
+                self.pending = text[end:]
+                if self.inside:
+                    self.thinking_chars += end - pos
+                else:
+                    visible.append(text[pos:end])
+                break
+
+            if self.inside:
+                self.thinking_chars += tag_start - pos
+            else:
+                visible.append(text[pos:tag_start])
+                had_thinking = True
+            self.inside = not self.inside
+            pos = tag_start + len(tag)
+
+        if had_thinking:
+            self.thinking_chunks += 1
+        return self._lines("".join(visible)) if visible else []
+
+    def flush(self):
+        """
+        Returns what was held back at the end of the stream (an unfinished tag prefix).
+        """
+        text, self.pending = self.pending, ""
+        if self.inside:
+            self.thinking_chars += len(text)
+            return []
+        return self._lines(text)
+
+    @staticmethod
+    def _partial_tag_length(text, pos, tag):
+        """Length of the suffix of text[pos:] that is a proper prefix of tag (0 if none)."""
+        # Both tags contain a single '<', at their start, so only the last '<' can begin a prefix.
+        start = text.rfind('<', max(pos, len(text) - len(tag) + 1))
+        if start != -1 and tag.startswith(text[start:]):
+            return len(text) - start
+        return 0
+
+    @staticmethod
+    def _lines(text):
+        # Only yield non-blank lines
+        return [line for line in text.splitlines() if line.strip()]
+
+
+def ollama_model_name(name):
+    """Normalizes an Ollama model name: "llama3" and "llama3:latest" are the same model."""
+    return name.removesuffix(':latest')
+
+
+def list_ollama_models(host=None):
+    """
+    Returns the names of the models pulled on an Ollama instance.
+
+    Parameters:
+    - host (str, optional): Base URL of the instance. Defaults to the ollama library's default host.
+
+    Returns:
+    - set[str]: Model names, normalized with ollama_model_name.
+    """
+    return {ollama_model_name(model.model) for model in ollama.Client(host=host).list().models}
+
 
 class LlmApi:
-    def __init__(self, model_obj):
+    def __init__(self, model_obj, ollama_host=None):
         """
         Initialize the LlmApi with a model object.
 
@@ -15,9 +253,15 @@ class LlmApi:
             - is_external (bool): Indicates if the model is external (e.g., OpenAI) or local (e.g., Ollama).
             - api_url (str, optional): Required if is_external=True. The base URL of the external API.
             - api_key (str, optional): Required if is_external=True. The authentication token for the external API.
+        - ollama_host (str, optional): Base URL of the Ollama instance running local models.
+          Defaults to the ollama library's default host.
         """
         self.model_obj = model_obj
+        self.ollama_host = ollama_host
         self.client = None  # Inicializamos el cliente como None
+        self.async_client = None
+        # Reasoning output skipped in the last response: {'chars': int, 'chunks': int}
+        self.thinking_stats = None
 
     def validate(self):
         """
@@ -26,6 +270,48 @@ class LlmApi:
         Raises:
         - ValueError: If any required fields are missing or incorrectly formatted.
         """
+        errors = self._validate_fields()
+
+        # Validamos la conectividad y autenticación del modelo externo
+        if self.model_obj.is_external and not errors:
+            try:
+                # Creamos el cliente solo si no hay errores
+                self.client = get_openai_client(self.model_obj.api_url, self.model_obj.api_key)
+                # Realizamos una prueba de conectividad, salvo si ya se hizo hace poco
+                if not _is_recently_validated(self.model_obj):
+                    self.client.models.list()  # Conexión a la API externa
+                    _remember_validation(self.model_obj)
+            except Exception as e:
+                errors.append(self._connection_error_message(e))
+        self._raise_errors(errors)
+
+    async def avalidate(self):
+        """
+        Async counterpart of validate(). Uses the shared openai.AsyncOpenAI client
+        of the running event loop for external models.
+
+        Raises:
+        - ValueError: If any required fields are missing or incorrectly formatted.
+        """
+        errors = self._validate_fields()
+
+        if self.model_obj.is_external and not errors:
+            try:
+                self.async_client = get_async_openai_client(self.model_obj.api_url, self.model_obj.api_key)
+                if not _is_recently_validated(self.model_obj):
+                    await self.async_client.models.list()
+                    _remember_validation(self.model_obj)
+            except Exception as e:
+                errors.append(self._connection_error_message(e))
+        self._raise_errors(errors)
+
+    def _validate_fields(self):
+        """
+        Checks the model fields without contacting the API.
+
+        Returns:
+        - list[str]: Error messages, empty if the fields are valid.
+        """
         errors = []
 
         if not self.model_obj.description:
@@ -42,25 +328,19 @@ class LlmApi:
 
             if not self.model_obj.api_key:
                 errors.append("API key is required for external models")
+        return errors
 
-            # Validamos la conectividad y autenticación del modelo externo
-            if not errors:
-                try:
-                    # Creamos el cliente solo si no hay errores
-                    self.client = openai.OpenAI(
-                        api_key=self.model_obj.api_key,
-                        base_url=self.model_obj.api_url
-                    )
-                    # Realizamos una prueba de conectividad
-                    self.client.models.list()  # Conexión a la API externa
-                except openai.AuthenticationError:
-                    errors.append("Invalid or unauthorized API key")
-                except openai.APIConnectionError:
-                    errors.append(f"Failed to connect to the API at {self.model_obj.api_url}")
-                except openai.NotFoundError:
-                    errors.append(f"Model '{self.model_obj.description}' not found on the API")
-                except Exception as e:
-                    errors.append(f"Error trying to validate model: {e}")
+    def _connection_error_message(self, error):
+        if isinstance(error, openai.AuthenticationError):
+            return "Invalid or unauthorized API key"
+        if isinstance(error, openai.APIConnectionError):
+            return f"Failed to connect to the API at {self.model_obj.api_url}"
+        if isinstance(error, openai.NotFoundError):
+            return f"Model '{self.model_obj.description}' not found on the API"
+        return f"Error trying to validate model: {error}"
+
+    @staticmethod
+    def _raise_errors(errors):
         if errors:
             raise ValueError("\n".join([f"Model error: {e}" for e in errors]))
 
@@ -73,53 +353,124 @@ class LlmApi:
 
     def _yield_thinking_aware(self, stream, get_content):
         """
-        If the first chunk starts with <think>, buffer until </think> and yield only what comes after (ignoring blank lines).
-        Otherwise, yield all content as it arrives (ignoring blank lines).
-        """
-        buffer = ""
-        first_chunk = True
-        buffering = False
-        for chunk in stream:
-            content = get_content(chunk)
-            if not content:
-                continue
-            if first_chunk:
-                first_chunk = False
-                if content.lstrip().startswith('<think>'):
-                    buffering = True
-                    buffer += content
-                    continue  # Don't yield yet
-                else:
-                    # Only yield non-blank lines
-                    for line in content.splitlines():
-                        if line.strip():
-                            yield line
-                    continue
-            if buffering:
-                buffer += content
-                end_tag = buffer.find('</think>')
-                if end_tag == -1:
-                    # Still inside <think> block
-                    continue
-                # Found </think>, yield only what comes after
-                after = buffer[end_tag + len('</think>'):]
-                for line in after.splitlines():
-                    if line.strip():
-                        yield line
-                buffering = False
-                buffer = ""
-            else:
-                # Only yield non-blank lines
-                for line in content.splitlines():
-                    if line.strip():
-                        yield line
+        Yields the non-blank lines of the response as they arrive, skipping <think>...</think> blocks.
+        The amount of skipped reasoning is left in self.thinking_stats.
+
+        Raises:
+        - ThinkingBudgetExceeded, QuestionTimeout: If the model goes over its limits.
+        """
+        thinking_filter = ThinkingFilter()
+        check_limits = self._limit_checker()
+        try:
+            for chunk in stream:
+                lines = thinking_filter.feed(get_content(chunk))
+                check_limits(thinking_filter)
+                yield from lines
+            yield from thinking_filter.flush()
+        finally:
+            self._record_thinking_stats(thinking_filter)
+
+    async def _ayield_thinking_aware(self, stream, get_content):
+        """Async counterpart of _yield_thinking_aware for async chunk streams."""
+        thinking_filter = ThinkingFilter()
+        check_limits = self._limit_checker()
+        try:
+            async for chunk in stream:
+                lines = thinking_filter.feed(get_content(chunk))
+                check_limits(thinking_filter)
+                for line in lines:
+                    yield line
+            for line in thinking_filter.flush():
+                yield line
+        finally:
+            self._record_thinking_stats(thinking_filter)
 
-    def _use_external_model(self, prompt):
+    def _limit_checker(self):
+        """
+        Returns a function that raises once a stream goes over the model's
+        thinking budget or per-question deadline. The deadline starts now.
+        """
+        budget = getattr(self.model_obj, 'thinking_budget', None)
+        timeout = getattr(self.model_obj, 'question_timeout', None)
+        deadline = time.monotonic() + timeout if timeout else None
+
+        def check(thinking_filter):
+            if budget is not None and thinking_filter.thinking_chars > budget:
+                raise ThinkingBudgetExceeded(
+                    f"Model {self.model_obj.description} exceeded its thinking budget of {budget} characters"
+                )
+            if deadline is not None and time.monotonic() > deadline:
+                raise QuestionTimeout(
+                    f"Model {self.model_obj.description} did not answer within {timeout} seconds"
+                )
+        return check
+
+    def _request_timeout(self):
+        """Per-request network timeout, so a stalled stream can't outlive the question deadline."""
+        return getattr(self.model_obj, 'question_timeout', None)
+
+    def _ollama_client(self):
+        """
+        The ollama module's default client, or a dedicated one when another host
+        or a request timeout is needed.
+        """
+        options = self._ollama_client_options()
+        return ollama.Client(**options) if options else ollama
+
+    def _ollama_client_options(self):
+        """Host and timeout arguments for the Ollama clients, skipping unset ones."""
+        options = {}
+        if self.ollama_host:
+            options['host'] = self.ollama_host
+        timeout = self._request_timeout()
+        if timeout:
+            options['timeout'] = timeout
+        return options
+
+    def _record_thinking_stats(self, thinking_filter):
+        self.thinking_stats = {
+            'chars': thinking_filter.thinking_chars,
+            'chunks': thinking_filter.thinking_chunks,
+        }
+        if thinking_filter.thinking_chars:
+            logging.info(
+                f"Skipped {thinking_filter.thinking_chars} thinking characters "
+                f"({thinking_filter.thinking_chunks} chunks) from {self.model_obj.description}"
+            )
+
+    def _openai_options(self, max_tokens, stop):
+        """Builds the generation limit and timeout arguments for the OpenAI API, skipping unset ones."""
+        options = {}
+        if max_tokens is not None:
+            options['max_tokens'] = max_tokens
+        if stop:
+            options['stop'] = stop
+        timeout = self._request_timeout()
+        if timeout:
+            options['timeout'] = timeout
+        return options
+
+    @staticmethod
+    def _ollama_options(max_tokens, stop):
+        """Builds the Ollama `options` dict (num_predict, stop), or None if no limit is set."""
+        options = {}
+        if max_tokens is not None:
+            options['num_predict'] = max_tokens
+        if stop:
+            options['stop'] = stop
+        return options or None
+
+    def _use_external_model(self, prompt, max_tokens=None, stop=None):
         """
         Calls an external (OpenAI-compatible) API to generate a response to the prompt.
 
+        The HTTP stream is closed as soon as the caller stops consuming this
+        generator, so no further tokens are generated or downloaded.
+
         Parameters:
         - prompt (str): The user input to be sent to the external model.
+        - max_tokens (int, optional): Maximum number of tokens to generate.
+        - stop (list[str], optional): Sequences where the model stops generating.
 
         Yields:
         - str: A stream of response chunks from the model (partial content).
@@ -135,15 +486,24 @@ class LlmApi:
             model=self.model_obj.description,
             messages=[{"role": "user", "content": prompt}],
             stream=True,
+            **self._openai_options(max_tokens, stop),
         )
-        yield from self._yield_thinking_aware(response, lambda chunk: chunk.choices[0].delta.content if chunk.choices and chunk.choices[0].delta else None)
+        try:
+            yield from self._yield_thinking_aware(response, lambda chunk: chunk.choices[0].delta.content if chunk.choices and chunk.choices[0].delta else None)
+        finally:
+            response.close()
 
-    def _use_local_model(self, prompt):
+    def _use_local_model(self, prompt, max_tokens=None, stop=None):
         """
         Calls a local Ollama model to generate a response to the prompt.
 
+        The HTTP stream is closed as soon as the caller stops consuming this
+        generator, which makes Ollama stop generating.
+
         Parameters:
         - prompt (str): The user input to be sent to the local model.
+        - max_tokens (int, optional): Maximum number of tokens to generate (num_predict).
+        - stop (list[str], optional): Sequences where the model stops generating.
 
         Yields:
         - str: A stream of response chunks from the local model.
@@ -151,19 +511,62 @@ class LlmApi:
         Raises:
         - ValueError: If an error occurs during local model execution.
         """
-        response_stream = ollama.chat(
+        response_stream = self._ollama_client().chat(
             model=self.model_obj.description,
             messages=[{"role": "user", "content": prompt}],
             stream=True,
+            options=self._ollama_options(max_tokens, stop),
         )
-        yield from self._yield_thinking_aware(response_stream, lambda chunk: chunk['message']['content'])
+        try:
+            yield from self._yield_thinking_aware(response_stream, lambda chunk: chunk['message']['content'])
+        finally:
+            response_stream.close()
 
-    def generate_response(self, prompt):
+    async def _ause_external_model(self, prompt, max_tokens=None, stop=None):
+        """Async counterpart of _use_external_model, built on openai.AsyncOpenAI."""
+        if not self.async_client:
+            raise ValueError("AsyncOpenAI client not initialized. Validation might have failed or was skipped.")
+
+        response = await self.async_client.chat.completions.create(
+            model=self.model_obj.description,
+            messages=[{"role": "user", "content": prompt}],
+            stream=True,
+            **self._openai_options(max_tokens, stop),
+        )
+        try:
+            async for line in self._ayield_thinking_aware(response, lambda chunk: chunk.choices[0].delta.content if chunk.choices and chunk.choices[0].delta else None):
+                yield line
+        finally:
+            await response.close()
+
+    async def _ause_local_model(self, prompt, max_tokens=None, stop=None):
+        """Async counterpart of _use_local_model, built on ollama.AsyncClient."""
+        if not self.async_client:
+            self.async_client = ollama.AsyncClient(**self._ollama_client_options())
+
+        response_stream = await self.async_client.chat(
+            model=self.model_obj.description,
+            messages=[{"role": "user", "content": prompt}],
+            stream=True,
+            options=self._ollama_options(max_tokens, stop),
+        )
+        try:
+            async for line in self._ayield_thinking_aware(response_stream, lambda chunk: chunk['message']['content']):
+                yield line
+        finally:
+            await response_stream.aclose()
+
+    def generate_response(self, prompt, max_tokens=None, stop=None):
         """
         Main method to generate a response using either a local or external model.
 
+        Closing the returned generator early (e.g. once the answer is known)
+        also closes the upstream stream.
+
         Parameters:
         - prompt (str): The user message or question.
+        - max_tokens (int, optional): Maximum number of tokens the model may generate.
+        - stop (list[str], optional): Sequences where the model stops generating.
 
         Yields:
         - str: A stream of generated text from the selected model.
@@ -172,6 +575,7 @@ class LlmApi:
         - ValueError: If model validation fails (e.g., missing API key, invalid URL).
         - ollama.ResponseError: If an error occurs while calling the local model.
         - openai.error.OpenAIError: If an error occurs while calling the external model.
+        - GenerationAborted: If the model exceeds its thinking budget or question timeout.
 
         Example:
         >>> llm = LlmApi(model_obj)
@@ -182,7 +586,41 @@ class LlmApi:
         ...     print(f"An error occurred: {e}")
         """
         self.validate()
-        if self.model_obj.is_external:
-            yield from self._use_external_model(prompt)
-        else:
-            yield from self._use_local_model(prompt)
+        try:
+            if self.model_obj.is_external:
+                yield from self._use_external_model(prompt, max_tokens, stop)
+            else:
+                yield from self._use_local_model(prompt, max_tokens, stop)
+        except (openai.APITimeoutError, httpx.TimeoutException) as e:
+            raise QuestionTimeout(f"Model {self.model_obj.description} timed out: {e}") from e
+
+    async def agenerate_response(self, prompt, max_tokens=None, stop=None):
+        """
+        Async counterpart of generate_response(), for use from async views and tasks.
+
+        Many calls can share one event loop, since no thread is blocked while
+        waiting on the model.
+
+        Parameters:
+        - prompt (str): The user message or question.
+        - max_tokens (int, optional): Maximum number of tokens the model may generate.
+        - stop (list[str], optional): Sequences where the model stops generating.
+
+        Yields:
+        - str: A stream of generated text from the selected model.
+
+        Example:
+        >>> llm = LlmApi(model_obj)
+        >>> async for chunk in llm.agenerate_response("What is the capital of France?"):
+        ...     print(chunk, end="")
+        """
+        await self.avalidate()
+        try:
+            if self.model_obj.is_external:
+                async for line in self._ause_external_model(prompt, max_tokens, stop):
+                    yield line
+            else:
+                async for line in self._ause_local_model(prompt, max_tokens, stop):
+                    yield line
+        except (openai.APITimeoutError, httpx.TimeoutException) as e:
+            raise QuestionTimeout(f"Model {self.model_obj.description} timed out: {e}") from e
@@ -0,0 +1,28 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from genaigrader.services.columnar_export_service import FORMATS, write_tables
+
+
+class Command(BaseCommand):
+    help = (
+        "Writes the finished evaluations of a user, their answers, and the courses, exams, models and "
+        "questions they refer to, as one typed Parquet (or Arrow IPC) file per table. Needs pyarrow."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help="Owner of the evaluations.")
+        parser.add_argument('output', help="Existing directory where the files are written.")
+        parser.add_argument('--format', choices=FORMATS, default=None,
+                            help="File format. Defaults to Parquet, or Arrow IPC if pyarrow lacks Parquet support.")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"Unknown user: {options['username']}")
+        try:
+            paths = write_tables(user, options['output'], options['format'])
+        except ImportError as e:
+            raise CommandError(str(e))
+        for path in paths:
+            self.stdout.write(path)
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from genaigrader.services.dashboard_cache_service import bump_data_version
+from genaigrader.services.statistics_service import rebuild_statistics
+
+
+class Command(BaseCommand):
+    help = (
+        "Recomputes the per exam and model statistics of the dashboards from the finished evaluations. "
+        "They are kept up to date as evaluations are saved and deleted; rebuild them after changing "
+        "evaluations outside the ORM (e.g. bulk updates or raw SQL)."
+    )
+
+    def handle(self, *args, **options):
+        rows = rebuild_statistics()
+        bump_data_version()  # Drop the dashboards cached from the previous statistics
+        self.stdout.write(f"Rebuilt {rows} evaluation statistic(s)")
@@ -0,0 +1,93 @@
+import logging
+import os
+import socket
+from functools import partial
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from genaigrader.llm_api import list_ollama_models, ollama_model_name
+from genaigrader.services.batch_job_service import (
+    claim_task, renew_leases, requeue_expired_tasks, requeue_tasks_of, run_batch_task
+)
+from genaigrader.services.estimator_service import task_seconds
+from genaigrader.services.scheduler_service import TASK_ORDERS, Heartbeat, ResourceScheduler, dispatch
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs the queued batch evaluation tasks. The worker's Ollama host runs one evaluation at a time, "
+        "while evaluations of external models run in parallel. Start as many workers as needed, on as many "
+        "machines as needed: they share the queue in the database, and each one only takes the local models "
+        "pulled on its own Ollama host."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--name', default=f"{socket.gethostname()}-{os.getpid()}",
+            help="Worker name recorded in the tasks it runs. Reuse it after a crash to requeue its unfinished tasks."
+        )
+        parser.add_argument('--ollama-host', default=settings.OLLAMA_HOST,
+                            help="Base URL of the Ollama instance running this worker's local models.")
+        parser.add_argument('--local-models', default=None,
+                            help="Comma-separated local models this worker runs. Defaults to the models pulled "
+                                 "on its Ollama host, checked again at every heartbeat.")
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help="Seconds to wait before checking an empty queue again.")
+        parser.add_argument('--threads', type=int, default=settings.BATCH_WORKER_THREADS,
+                            help="Maximum number of evaluations running at once.")
+        parser.add_argument('--endpoint-slots', type=int, default=settings.EXTERNAL_ENDPOINT_SLOTS,
+                            help="Maximum number of evaluations running at once against each external endpoint.")
+        parser.add_argument('--order', choices=TASK_ORDERS, default=settings.BATCH_TASK_ORDER,
+                            help="Order of the tasks: submission order, shortest estimated first, or earliest deadline first.")
+        parser.add_argument('--once', action='store_true', help="Exit as soon as the queue is empty.")
+
+    def handle(self, *args, **options):
+        name = options['name']
+        ollama_host = options['ollama_host']
+        fixed_models = options['local_models']
+        requeued = requeue_tasks_of(name)
+        if requeued:
+            logging.warning(f"Worker {name}: requeued {requeued} unfinished task(s) from a previous run")
+        requeue_expired_tasks()
+
+        if fixed_models is not None:
+            local_models = {ollama_model_name(model.strip()) for model in fixed_models.split(',') if model.strip()}
+        else:
+            local_models = pulled_models(ollama_host)
+        scheduler = ResourceScheduler(
+            external_slots=options['endpoint_slots'], order=options['order'], estimate=task_seconds,
+            ollama_host=ollama_host, local_models=local_models,
+        )
+        self.stdout.write(
+            f"Worker {name} waiting for batch tasks (Ollama at {ollama_host} with "
+            f"{', '.join(sorted(local_models)) or 'no models'})"
+        )
+
+        def beat():
+            renew_leases(name)
+            requeue_expired_tasks()  # Take over the tasks of workers that disappeared
+            if fixed_models is None:
+                scheduler.local_models = pulled_models(ollama_host)
+
+        heartbeat = Heartbeat(beat, settings.BATCH_TASK_LEASE / 3)
+        heartbeat.start()
+        try:
+            dispatch(
+                name, partial(run_batch_task, ollama_host=ollama_host), claim_task,
+                scheduler=scheduler,
+                threads=options['threads'],
+                poll_interval=options['poll_interval'],
+                once=options['once'],
+            )
+        except KeyboardInterrupt:
+            self.stdout.write(f"Worker {name} stopped")
+        finally:
+            heartbeat.stop()
+
+
+def pulled_models(ollama_host):
+    """Names of the models pulled on an Ollama host; none if it cannot be reached."""
+    try:
+        return list_ollama_models(ollama_host)
+    except Exception as e:
+        logging.warning(f"Cannot list the models of Ollama at {ollama_host}: {e}")
+        return set()
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('genaigrader', '0008_alter_evaluation_ev_date'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='model',
+            name='max_concurrency',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
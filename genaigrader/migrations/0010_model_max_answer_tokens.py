@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('genaigrader', '0009_model_max_concurrency'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='model',
+            name='max_answer_tokens',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('genaigrader', '0011_cachedresponse'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='model',
+            name='question_timeout',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='model',
+            name='thinking_budget',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='questionevaluation',
+            name='question_option',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='genaigrader.questionoption'),
+        ),
+    ]
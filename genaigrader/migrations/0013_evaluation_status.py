@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('genaigrader', '0012_model_thinking_budget_question_timeout'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='evaluation',
+            name='status',
+            field=models.CharField(choices=[('running', 'Running'), ('done', 'Done')], default='done', max_length=10),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:36
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('genaigrader', '0013_evaluation_status'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BatchJob',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('user_prompt', models.TextField(blank=True)),
+                ('repetitions', models.PositiveIntegerField(default=1)),
+                ('use_cache', models.BooleanField(default=False)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done')], default='queued', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='BatchEvent',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('data', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='genaigrader.batchjob')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='BatchTask',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('repetition', models.PositiveIntegerField()),
+                ('position', models.PositiveIntegerField()),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=10)),
+                ('worker', models.CharField(blank=True, max_length=255)),
+                ('error', models.TextField(blank=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('evaluation', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='genaigrader.evaluation')),
+                ('exam', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='genaigrader.exam')),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tasks', to='genaigrader.batchjob')),
+                ('model', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='genaigrader.model')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'job', 'position'], name='genaigrader_status_6dec86_idx')],
+            },
+        ),
+    ]
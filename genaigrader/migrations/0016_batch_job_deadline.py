@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('genaigrader', '0015_adaptive_repetitions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='batchjob',
+            name='deadline',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
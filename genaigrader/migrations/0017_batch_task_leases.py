@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('genaigrader', '0016_batch_job_deadline'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='batchtask',
+            name='lease_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='batchtask',
+            index=models.Index(fields=['status', 'lease_expires_at'], name='genaigrader_status_327f11_idx'),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:59
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def build_statistics(apps, schema_editor):
+    # Frozen copy of statistics_service.rebuild_statistics, on the historical
+    # models, so that later changes to the service cannot alter this migration.
+    Evaluation = apps.get_model('genaigrader', 'Evaluation')
+    EvaluationStatistic = apps.get_model('genaigrader', 'EvaluationStatistic')
+
+    statistics = {}
+    rows = Evaluation.objects.filter(status='done').values_list(
+        'exam_id', 'model_id', 'exam__course_id', 'exam__course__user_id', 'grade', 'time'
+    )
+    for exam_id, model_id, course_id, user_id, grade, time in rows.iterator():
+        statistic = statistics.get((exam_id, model_id))
+        if statistic is None:
+            statistic = statistics[exam_id, model_id] = EvaluationStatistic(
+                exam_id=exam_id, model_id=model_id, course_id=course_id, user_id=user_id
+            )
+        # Welford's algorithm, as in statistics_service.welford_add
+        statistic.count += 1
+        for metric, value in (('grade', grade), ('time', time)):
+            mean = getattr(statistic, f'{metric}_mean')
+            delta = value - mean
+            mean += delta / statistic.count
+            setattr(statistic, f'{metric}_mean', mean)
+            setattr(statistic, f'{metric}_m2', getattr(statistic, f'{metric}_m2') + delta * (value - mean))
+
+    EvaluationStatistic.objects.all().delete()
+    EvaluationStatistic.objects.bulk_create(statistics.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('genaigrader', '0017_batch_task_leases'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EvaluationStatistic',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('grade_mean', models.FloatField(default=0.0)),
+                ('grade_m2', models.FloatField(default=0.0)),
+                ('time_mean', models.FloatField(default=0.0)),
+                ('time_m2', models.FloatField(default=0.0)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='genaigrader.course')),
+                ('exam', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='genaigrader.exam')),
+                ('model', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='genaigrader.model')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'course'], name='genaigrader_user_id_b9906e_idx')],
+                'constraints': [models.UniqueConstraint(fields=('exam', 'model'), name='unique_statistic_per_exam_model')],
+            },
+        ),
+        migrations.RunPython(build_statistics, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:31
+
+import hashlib
+import json
+
+from django.db import migrations, models
+
+
+# Frozen copies of exam_service.exam_content_hash and stored_questions_data,
+# on the historical models, so that later changes to the service cannot
+# alter this migration.
+
+def _normalized_question(statement, options, correct_option):
+    return json.dumps([
+        " ".join(statement.split()),
+        sorted(" ".join(option.split()) for option in options),
+        correct_option,
+    ])
+
+
+def _content_hash(questions_data):
+    digest = hashlib.sha256()
+    for question in sorted(_normalized_question(*q_data) for q_data in questions_data):
+        digest.update(question.encode("utf-8"))
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
+def _questions_data(apps, exam_ids):
+    """(statement, options, correct option letter) of the questions of the exams, by exam id."""
+    Question = apps.get_model('genaigrader', 'Question')
+    QuestionOption = apps.get_model('genaigrader', 'QuestionOption')
+    options = {}
+    for question_id, content in QuestionOption.objects.filter(question__exam_id__in=exam_ids).values_list(
+        'question_id', 'content'
+    ):
+        options.setdefault(question_id, []).append(content)
+
+    exams = {}
+    for question_id, exam_id, statement, correct_content in Question.objects.filter(exam_id__in=exam_ids).values_list(
+        'id', 'exam_id', 'statement', 'correct_option__content'
+    ):
+        correct_option = correct_content.split(')')[0].strip().lower() if correct_content else None
+        exams.setdefault(exam_id, []).append((statement, options.get(question_id, []), correct_option))
+    return exams
+
+
+def hash_exams(apps, schema_editor):
+    Exam = apps.get_model('genaigrader', 'Exam')
+    exam_ids = list(Exam.objects.values_list('id', flat=True))
+    for first in range(0, len(exam_ids), 500):
+        chunk = exam_ids[first:first + 500]
+        questions = _questions_data(apps, chunk)
+        exams = [Exam(id=exam_id, content_hash=_content_hash(questions.get(exam_id, []))) for exam_id in chunk]
+        Exam.objects.bulk_update(exams, ['content_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('genaigrader', '0019_data_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exam',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.RunPython(hash_exams, migrations.RunPython.noop),
+    ]
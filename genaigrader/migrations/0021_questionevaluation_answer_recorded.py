@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:02
+
+from django.db import migrations, models
+from django.db.migrations.recorder import MigrationRecorder
+
+# Migration after which the option chosen by the model is stored in QuestionEvaluation.question_option
+CHOSEN_OPTION_MIGRATION = '0012_model_thinking_budget_question_timeout'
+
+
+def flag_legacy_answers(apps, schema_editor):
+    """Answers of the evaluations started before CHOSEN_OPTION_MIGRATION was applied hold the correct option."""
+    recorder = MigrationRecorder(schema_editor.connection)
+    applied = (
+        recorder.migration_qs.filter(app='genaigrader', name=CHOSEN_OPTION_MIGRATION)
+        .values_list('applied', flat=True).first()
+    )
+    if applied is None:
+        return
+    QuestionEvaluation = apps.get_model('genaigrader', 'QuestionEvaluation')
+    QuestionEvaluation.objects.filter(evaluation__ev_date__lt=applied).update(answer_recorded=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('genaigrader', '0020_exam_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='questionevaluation',
+            name='answer_recorded',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.RunPython(flag_legacy_answers, migrations.RunPython.noop),
+    ]
@@ -16,6 +16,8 @@ class Exam(models.Model):
     description = models.CharField(max_length=255)
     course = models.ForeignKey(Course, on_delete=models.CASCADE) 
     user = models.ForeignKey(User, on_delete=models.CASCADE)  
+    # SHA-256 of the normalized questions (see exam_service.exam_content_hash), to recognize re-uploads
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)
 
     def __str__(self):
         return self.description
@@ -46,6 +48,20 @@ class Model(models.Model):
     api_key = models.CharField(max_length=255, null=True, blank=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
 
+    # Maximum number of questions sent to the model at the same time.
+    # Remote APIs spend most of their time waiting on the network, so they
+    # usually benefit from values above 1; local Ollama models do not.
+    max_concurrency = models.PositiveIntegerField(default=1)
+
+    # Token limit for the answer. Only set it for models that answer right
+    # away: reasoning models need room to think before giving the letter.
+    max_answer_tokens = models.PositiveIntegerField(null=True, blank=True)
+
+    # Limits that keep a stuck reasoning model from blocking an evaluation.
+    # A question that exceeds either one is recorded as unanswered.
+    thinking_budget = models.PositiveIntegerField(null=True, blank=True)  # Characters inside <think>
+    question_timeout = models.FloatField(null=True, blank=True)  # Seconds per question
+
     def clean(self):
         super().clean()
         if self.is_external and not self.user:
@@ -110,6 +126,10 @@ class Model(models.Model):
             return (0, family.lower(), size_value, size_unit_priority, size_unit.lower(), variant.lower())
 
 class Evaluation(models.Model):
+    RUNNING = 'running'
+    DONE = 'done'
+    STATUS_CHOICES = [(RUNNING, 'Running'), (DONE, 'Done')]
+
     id = models.AutoField(primary_key=True)
     prompt = models.TextField()
     ev_date = models.DateTimeField()
@@ -117,15 +137,147 @@ class Evaluation(models.Model):
     time = models.FloatField()
     model = models.ForeignKey(Model, on_delete= models.CASCADE)
     exam = models.ForeignKey(Exam, on_delete=models.CASCADE)
+    # Running evaluations have been checkpointed but not finished; their grade only
+    # counts the questions answered so far and they can be resumed.
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=DONE)
 
     def __str__(self):
         return f'{self.prompt} {self.grade}'
 
+class EvaluationStatistic(models.Model):
+    """
+    Count, mean and M2 (sum of squared deviations from the mean) of the grade
+    and time of the finished evaluations of a model on an exam. Kept up to
+    date with Welford's algorithm as evaluations are saved and deleted (see
+    statistics_service), so dashboards read one row per exam and model.
+    """
+    id = models.AutoField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)  # Owner of the course
+    course = models.ForeignKey(Course, on_delete=models.CASCADE)
+    exam = models.ForeignKey(Exam, on_delete=models.CASCADE)
+    model = models.ForeignKey(Model, on_delete=models.CASCADE)
+    count = models.PositiveIntegerField(default=0)
+    grade_mean = models.FloatField(default=0.0)
+    grade_m2 = models.FloatField(default=0.0)
+    time_mean = models.FloatField(default=0.0)
+    time_m2 = models.FloatField(default=0.0)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['exam', 'model'], name='unique_statistic_per_exam_model')]
+        indexes = [models.Index(fields=['user', 'course'])]
+
+    def __str__(self):
+        return f'{self.model} on {self.exam}: {self.count} evaluations, mean grade {self.grade_mean:.2f}'
+
+class DataVersion(models.Model):
+    """
+    Counter bumped whenever the data behind a user's dashboards changes, so
+    cached statistics are keyed by it and never served stale (see
+    dashboard_cache_service). The row without user is bumped by changes
+    that concern every user, e.g. a model renamed.
+    """
+    id = models.AutoField(primary_key=True)
+    user = models.OneToOneField(User, on_delete=models.CASCADE, null=True, blank=True)
+    version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.user or "All users"}: version {self.version}'
+
 class QuestionEvaluation(models.Model):
     id = models.AutoField(primary_key=True)
     evaluation = models.ForeignKey(Evaluation, on_delete=models.CASCADE)
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
-    question_option = models.ForeignKey(QuestionOption, on_delete=models.CASCADE)
+    # Option chosen by the model; null if it gave no valid answer (e.g. it timed out)
+    question_option = models.ForeignKey(QuestionOption, on_delete=models.CASCADE, null=True, blank=True)
+    # False for answers saved before the chosen option was recorded: those rows hold
+    # the correct option of the question, whatever the model answered
+    answer_recorded = models.BooleanField(default=True)
+
+    def __str__(self):
+        return f"Evaluation {self.evaluation.id}, Question {self.question.id}, Option {self.question_option_id}"
+
+class CachedResponse(models.Model):
+    """
+    Persistent cache of model answers, keyed by model identity, prompt and decoding parameters.
+    Entries are evicted least-recently-used first (see response_cache_service).
+    """
+    id = models.AutoField(primary_key=True)
+    key = models.CharField(max_length=64, unique=True)
+    model = models.ForeignKey(Model, on_delete=models.CASCADE)
+    response = models.TextField()
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f'{self.model} {self.key[:12]}: {self.response}'
+
+class BatchJob(models.Model):
+    """
+    A batch evaluation submitted from the batch evaluations page. Its tasks are
+    run by `manage.py run_batch_worker` processes, not by the web request.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    STATUS_CHOICES = [(QUEUED, 'Queued'), (RUNNING, 'Running'), (DONE, 'Done')]
+
+    id = models.AutoField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    user_prompt = models.TextField(blank=True)
+    repetitions = models.PositiveIntegerField(default=1)  # Maximum, when target_half_width is set
+    use_cache = models.BooleanField(default=False)
+    # Adaptive repetitions: stop repeating a pair once the CI half-width of its grade is below this
+    target_half_width = models.FloatField(null=True, blank=True)
+    deadline = models.DateTimeField(null=True, blank=True)  # Used by workers scheduling by deadline
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'Batch {self.id} ({self.status})'
+
+class BatchTask(models.Model):
+    """One evaluation of a batch job: an exam, a model and a repetition number."""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    SKIPPED = 'skipped'  # Repetition not needed by an adaptive job
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed'), (SKIPPED, 'Skipped')
+    ]
+
+    id = models.AutoField(primary_key=True)
+    job = models.ForeignKey(BatchJob, on_delete=models.CASCADE, related_name='tasks')
+    exam = models.ForeignKey(Exam, on_delete=models.CASCADE)
+    model = models.ForeignKey(Model, on_delete=models.CASCADE)
+    repetition = models.PositiveIntegerField()
+    position = models.PositiveIntegerField()  # Order in which the tasks are run
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    worker = models.CharField(max_length=255, blank=True)  # Name of the worker that claimed the task
+    # A running task whose lease expires is put back in the queue: its worker is gone
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    evaluation = models.ForeignKey(Evaluation, on_delete=models.SET_NULL, null=True, blank=True)
+    error = models.TextField(blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'job', 'position']), models.Index(fields=['status', 'lease_expires_at'])]
+
+    def __str__(self):
+        return f'{self.job} #{self.position + 1}: {self.model} on {self.exam} ({self.status})'
+
+class BatchEvent(models.Model):
+    """
+    Progress event of a batch job, stored so that browsers can follow (and
+    reconnect to) a batch that runs in a worker. `data` is the JSON payload.
+    """
+    id = models.AutoField(primary_key=True)
+    job = models.ForeignKey(BatchJob, on_delete=models.CASCADE, related_name='events')
+    data = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return f"Evaluation {self.evaluation.id}, Question {self.question.id}, Option {self.question_option.id}"
\ No newline at end of file
+        return f'{self.job} event {self.id}'
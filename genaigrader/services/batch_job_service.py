@@ -0,0 +1,280 @@
+import json
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from genaigrader.models import BatchEvent, BatchJob, BatchTask, Evaluation
+from genaigrader.services.batch_service import adaptive_summary, generate_eval_tasks, repetitions_settled, run_eval_task
+
+
+def submit_batch_job(user, exams, models, repetitions, user_prompt, use_cache=False, target_half_width=None,
+                     deadline=None):
+    """
+    Queues a batch evaluation for the workers.
+
+    Parameters:
+    - user: User submitting the batch.
+    - exams: Exams to evaluate.
+    - models: Models to evaluate.
+    - repetitions: Number of repetitions of each exam-model pair.
+    - user_prompt: User-provided prompt.
+    - use_cache: Whether to reuse answers from the persistent response cache.
+    - target_half_width: If set, `repetitions` is a maximum: the remaining
+      repetitions of a pair are skipped once the CI half-width of its grade
+      is below this target (see batch_service.repetitions_settled).
+    - deadline: When the results are needed, for workers ordering tasks by deadline.
+
+    Returns:
+    - BatchJob: The queued job, with one queued BatchTask per evaluation,
+      in the same order as generate_eval_tasks.
+
+    Raises:
+    - ValueError: If an adaptive job would use the response cache.
+    """
+    if use_cache and target_half_width is not None:
+        # Cached repetitions repeat the same answers, so their grades would always look settled
+        raise ValueError("Adaptive repetitions cannot use the response cache: the repeated answers "
+                         "would be identical.")
+    with transaction.atomic():
+        job = BatchJob.objects.create(
+            user=user, user_prompt=user_prompt, repetitions=repetitions, use_cache=use_cache,
+            target_half_width=target_half_width, deadline=deadline
+        )
+        BatchTask.objects.bulk_create([
+            BatchTask(job=job, exam=exam, model=model, repetition=rep, position=position)
+            for position, (exam, model, rep) in enumerate(generate_eval_tasks(exams, models, repetitions))
+        ])
+        if not job.tasks.exists():
+            _finish_job(job)
+    return job
+
+
+def record_event(job, data):
+    """Stores a progress event of a job. `data` is a dict or an already encoded JSON string."""
+    if not isinstance(data, str):
+        data = json.dumps(data)
+    return BatchEvent.objects.create(job=job, data=data)
+
+
+def claim_task(task, worker):
+    """
+    Marks a queued task as running on `worker`, unless another worker claimed it
+    first. The worker holds the task for BATCH_TASK_LEASE seconds, and must
+    renew the lease (see renew_leases) to keep it.
+
+    Returns:
+    - bool: Whether the task was claimed. If so, `task` is updated.
+    """
+    now = timezone.now()
+    lease_expires_at = now + timedelta(seconds=settings.BATCH_TASK_LEASE)
+    claimed = BatchTask.objects.filter(id=task.id, status=BatchTask.QUEUED).update(
+        status=BatchTask.RUNNING, worker=worker, started_at=now, lease_expires_at=lease_expires_at
+    )
+    if not claimed:
+        return False
+    BatchJob.objects.filter(id=task.job_id, status=BatchJob.QUEUED).update(status=BatchJob.RUNNING)
+    task.status, task.worker, task.started_at = BatchTask.RUNNING, worker, now
+    task.lease_expires_at = lease_expires_at
+    return True
+
+
+def renew_leases(worker):
+    """
+    Heartbeat of a worker: extends the leases of the tasks it is running.
+
+    Returns:
+    - int: Number of running tasks of the worker.
+    """
+    return BatchTask.objects.filter(status=BatchTask.RUNNING, worker=worker).update(
+        lease_expires_at=timezone.now() + timedelta(seconds=settings.BATCH_TASK_LEASE)
+    )
+
+
+def requeue_expired_tasks():
+    """
+    Puts back in the queue the running tasks whose lease expired, because
+    their worker died or lost contact with the database. Any worker may
+    call it, so the tasks of a missing worker are taken over by the others.
+
+    Returns:
+    - int: Number of requeued tasks.
+    """
+    requeued = BatchTask.objects.filter(status=BatchTask.RUNNING, lease_expires_at__lt=timezone.now()).update(
+        status=BatchTask.QUEUED, worker='', started_at=None, lease_expires_at=None
+    )
+    if requeued:
+        logging.warning(f"Requeued {requeued} batch task(s) whose worker stopped renewing their lease")
+    return requeued
+
+
+def requeue_tasks_of(worker):
+    """
+    Puts back in the queue the tasks left running by a previous run of
+    `worker` that did not finish them (e.g. because the process was killed).
+
+    Returns:
+    - int: Number of requeued tasks.
+    """
+    return BatchTask.objects.filter(status=BatchTask.RUNNING, worker=worker).update(
+        status=BatchTask.QUEUED, worker='', started_at=None, lease_expires_at=None
+    )
+
+
+def run_batch_task(task, ollama_host=None):
+    """
+    Runs a claimed task, storing its events for the browsers following the job.
+    Each event carries the task id, since tasks of a job may run concurrently.
+
+    The evaluation is recorded on the task as soon as it is first saved, so a
+    requeued task continues it instead of starting over. The task ends as done
+    with the evaluation it produced, or as failed with the error that stopped
+    it. The job is finished with its last task.
+
+    If the worker lost the task meanwhile (its lease expired and it was
+    requeued), it stops and discards its result: the task belongs to another
+    worker, which continues the evaluation recorded on the task. An evaluation
+    the task does not refer to is deleted, so it is not counted twice.
+
+    Parameters:
+    - task: Task claimed by the calling worker.
+    - ollama_host: Ollama instance of the worker, for local models.
+    """
+    job = task.job
+    total_tasks = job.tasks.count()
+    error = ''
+    # Read again, since a previous owner may have recorded it after the task was fetched
+    evaluation = Evaluation.objects.filter(batchtask__id=task.id).first()
+    evaluation_id = evaluation.id if evaluation else None
+
+    if evaluation is None or evaluation.status == Evaluation.RUNNING:
+        events = run_eval_task(
+            task.exam, task.model, task.repetition, job.repetitions, task.position + 1, total_tasks,
+            job.user_prompt, job.use_cache, ollama_host, evaluation=evaluation
+        )
+        try:
+            for event in events:
+                data = json.loads(event.removeprefix('data: '))
+                if 'error' in data:
+                    error = data['error']
+                if data.get('evaluation_id'):
+                    # Sent at each checkpoint: record the evaluation, and stop if the task was lost
+                    evaluation_id = data['evaluation_id']
+                    if not _owned(task).update(evaluation_id=evaluation_id):
+                        events.close()
+                        break
+                data['task'] = task.id
+                record_event(job, data)
+        except Exception as e:
+            logging.exception(f"Batch task {task.id} failed")
+            error = str(e)
+            record_event(job, {'error': error, 'task': task.id})
+    # Otherwise a previous owner finished the evaluation after losing the lease: keep it
+
+    finished = _owned(task).update(
+        status=BatchTask.FAILED if error else BatchTask.DONE,
+        error=error,
+        evaluation_id=evaluation_id,
+        finished_at=timezone.now(),
+        lease_expires_at=None
+    )
+    if not finished:
+        logging.warning(f"Batch task {task.id} was taken over by another worker; discarding its result")
+        if evaluation_id is not None and not BatchTask.objects.filter(id=task.id, evaluation_id=evaluation_id).exists():
+            Evaluation.objects.filter(id=evaluation_id).delete()
+        return
+    if job.target_half_width is not None:
+        skip_settled_repetitions(task)
+    finish_job_if_complete(job)
+
+
+def _owned(task):
+    """The task, as long as the worker that claimed it still holds it."""
+    return BatchTask.objects.filter(id=task.id, status=BatchTask.RUNNING, worker=task.worker)
+
+
+def skip_settled_repetitions(task):
+    """
+    In an adaptive job, skips the queued repetitions of the task's exam-model
+    pair once the grades of its finished repetitions are precise enough.
+
+    Returns:
+    - int: Number of skipped repetitions.
+    """
+    job = task.job
+    pair_tasks = job.tasks.filter(exam_id=task.exam_id, model_id=task.model_id)
+    grades = list(
+        pair_tasks.filter(status=BatchTask.DONE, evaluation__isnull=False)
+        .order_by('position').values_list('evaluation__grade', flat=True)
+    )
+    if not repetitions_settled(grades, job.target_half_width):
+        return 0
+
+    skipped = pair_tasks.filter(status=BatchTask.QUEUED).update(
+        status=BatchTask.SKIPPED, finished_at=timezone.now()
+    )
+    if skipped:
+        record_event(job, {'adaptive': adaptive_summary(task.exam, task.model, grades, skipped), 'task': task.id})
+    return skipped
+
+
+def finish_job_if_complete(job):
+    """Marks the job as done, and tells its followers, once none of its tasks is pending."""
+    if job.tasks.filter(status__in=[BatchTask.QUEUED, BatchTask.RUNNING]).exists():
+        return False
+    return _finish_job(job)
+
+
+def _finish_job(job):
+    with transaction.atomic():
+        # Only one worker gets to finish the job and send the 'done' event
+        finished = BatchJob.objects.filter(id=job.id).exclude(status=BatchJob.DONE).update(
+            status=BatchJob.DONE, finished_at=timezone.now()
+        )
+        if finished:
+            done = {'done': True}
+            if job.target_half_width is not None:
+                done['repetitions_saved'] = job.tasks.filter(status=BatchTask.SKIPPED).count()
+            record_event(job, done)
+            logging.info(f"Batch job {job.id} finished")
+    return bool(finished)
+
+
+def events_after(job, last_event_id, limit=500):
+    """
+    Returns the events of a job stored after `last_event_id`, oldest first.
+
+    Returns:
+    - list: (event id, JSON payload) tuples.
+    """
+    return list(
+        job.events.filter(id__gt=last_event_id).order_by('id').values_list('id', 'data')[:limit]
+    )
+
+
+def job_summary(job):
+    """
+    Returns the state of a job and its tasks as a JSON-serializable dict.
+    """
+    tasks = job.tasks.select_related('exam', 'model').order_by('position')
+    return {
+        'id': job.id,
+        'status': job.status,
+        'target_half_width': job.target_half_width,
+        'deadline': job.deadline.isoformat() if job.deadline else None,
+        'created_at': job.created_at.isoformat(),
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'tasks': [
+            {
+                'id': task.id,
+                'exam': task.exam.description,
+                'model': task.model.description,
+                'repetition': task.repetition,
+                'status': task.status,
+                'worker': task.worker,
+                'evaluation_id': task.evaluation_id,
+                'error': task.error,
+            }
+            for task in tasks
+        ],
+    }
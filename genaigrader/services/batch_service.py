@@ -0,0 +1,185 @@
+import json
+import logging
+from typing import Any, Dict, Generator, Iterable, List
+from genaigrader.llm_api import LlmApi
+from genaigrader.models import Evaluation, Exam, Model
+from genaigrader.services.confidence_service import ci_half_width
+from genaigrader.services.exam_pack_service import get_exam_pack
+from genaigrader.services.stream_service import resume_evaluation, stream_responses
+
+
+# Repetitions run before an adaptive batch may stop repeating an exam-model pair
+ADAPTIVE_MIN_REPETITIONS = 2
+
+
+def generate_eval_tasks(exams: Iterable, models: Iterable, repetitions: int) -> Generator:
+    """
+    Generator that yields all combinations of exams, models, and repetitions.
+    Args:
+        exams: Iterable of Exam objects.
+        models: Iterable of Model objects.
+        repetitions: Number of repetitions for each exam-model pair.
+    Yields:
+        Tuple of (exam, model, repetition number)
+    """
+    # Models are iterated before exams because loading a local model has
+    # a significant overhead, and we want to minimize the number of times
+    # we load the model.
+    for model in models:
+        for exam in exams:
+            for rep in range(1, repetitions + 1):
+                yield exam, model, rep
+
+def validate_exam(exam: Exam) -> Iterable:
+    """
+    Validates that the exam has questions.
+    Args:
+        exam: Exam object to validate.
+    Returns:
+        Queryset of questions for the exam.
+    Raises:
+        ValueError: If the exam has no questions.
+    """
+    questions = exam.question_set.prefetch_related('questionoption_set').all()
+    if not questions.exists():
+        raise ValueError(f"Exam {exam} has no questions.")
+    return questions
+
+def validate_model(model: Model, ollama_host: str | None = None) -> 'LlmApi':
+    """
+    Validates the model by initializing and validating an LlmApi instance.
+    Args:
+        model: Model object to validate.
+        ollama_host: Ollama instance to run local models on. Defaults to the ollama library's default host.
+    Returns:
+        LlmApi instance.
+    Raises:
+        ValueError: If the model is invalid.
+    """
+    llm = LlmApi(model, ollama_host=ollama_host)
+    llm.validate()
+    return llm
+
+def extract_summary(responses: List[str]) -> Dict[str, Any] | None:
+    """
+    Extracts summary information from the evaluation responses.
+    Args:
+        responses: List of response strings. Each response is expected to be a JSON string
+            with keys 'correct_count', 'total_time', and 'total_questions'.
+    Returns:
+        Dictionary with grade and time, or None if not found.
+    """
+    for r in reversed(responses):
+        try:
+            data = json.loads(r.replace('data: ', '').strip())
+            if {'correct_count', 'total_time', 'total_questions'}.issubset(data):
+
+                normalized_score = round(data['correct_count'] / data['total_questions'] * 10, 2)
+                return {
+                    'grade': f"{normalized_score} ({data['correct_count']}/{data['total_questions']})",
+                    'time': data['total_time']
+                }
+        except json.JSONDecodeError as e:
+            logging.warning(f"Failed to decode JSON in extract_summary: {e}")
+            continue
+    return None
+
+def repetitions_settled(grades: List[float], target_half_width: float,
+                        min_repetitions: int = ADAPTIVE_MIN_REPETITIONS) -> bool:
+    """
+    Tells whether the grades of an exam-model pair are precise enough to stop repeating it.
+    Args:
+        grades: Grades of the repetitions run so far.
+        target_half_width: Wanted half-width of the 95% confidence interval of the mean grade, in grade points.
+        min_repetitions: Repetitions always run, since a single grade says nothing about the spread.
+    Returns:
+        True if the confidence interval is at most target_half_width wide on each side.
+    """
+    if len(grades) < min_repetitions:
+        return False
+    return ci_half_width(grades) <= target_half_width
+
+def run_eval_task(exam: Exam, model: Model, rep: int, repetitions: int, eval_number: int, total_tasks: int,
+                  user_prompt: str, use_cache: bool = False, ollama_host: str | None = None,
+                  evaluation: Evaluation | None = None) -> Generator[str, None, None]:
+    """
+    Runs one evaluation of a batch and streams its events.
+    Args:
+        exam: Exam to evaluate.
+        model: Model to evaluate.
+        rep: Repetition number of this evaluation.
+        repetitions: Number of repetitions of each exam-model pair.
+        eval_number: Position of this evaluation in the batch, starting at 1.
+        total_tasks: Number of evaluations in the batch.
+        user_prompt: User-provided prompt.
+        use_cache: Whether to reuse answers from the persistent response cache.
+        ollama_host: Ollama instance to run local models on.
+        evaluation: Interrupted evaluation of this task to continue instead of starting a new one.
+    Yields:
+        Server-sent event strings: a 'progress' message, the question events of
+        stream_responses and an 'eval_result' summary, or a single 'error' event.
+    """
+    try:
+        validate_exam(exam)
+    except ValueError as e:
+        logging.warning(str(e))
+        yield f"data: {json.dumps({'error': str(e)})}\n\n"
+        return
+
+    try:
+        llm = validate_model(model, ollama_host)
+    except ValueError as e:
+        error_msg = f"Model {model}: {str(e)}"
+        logging.warning(error_msg)
+        yield f"data: {json.dumps({'error': error_msg})}\n\n"
+        return
+
+    progress_msg = ""
+    try:
+        subject_name = getattr(exam.course, 'name', '')
+        progress_msg = (
+            f"Eval {eval_number}/{total_tasks} - "
+            f"Model: <b>{model.description}</b> Subject: <b>{subject_name}</b> "
+            f"Exam: <b>{exam.description}</b> Repetition: {rep}/{repetitions}"
+        )
+        logging.info(f"Progress: {progress_msg}")
+        yield f"data: {json.dumps({'progress': progress_msg})}\n\n"
+
+        if evaluation is not None:
+            chunks = resume_evaluation(evaluation, llm, use_cache=use_cache)
+        else:
+            # Compiled once per exam and shared by every model and repetition
+            questions = get_exam_pack(exam).questions
+            chunks = stream_responses(questions, user_prompt, llm, len(questions), exam, use_cache=use_cache)
+        responses = []
+        for chunk in chunks:
+            responses.append(chunk)
+            logging.info(f"Yielding chunk: {chunk[:100]}")
+            yield chunk
+
+        summary = extract_summary(responses)
+        if summary:
+            yield f"data: {json.dumps({'eval_result': summary})}\n\n"
+    except Exception as e:
+        error_msg = f"Error during {progress_msg}: {str(e)}"
+        logging.warning(error_msg)
+        yield f"data: {json.dumps({'error': error_msg})}\n\n"
+
+def adaptive_summary(exam: Exam, model: Model, grades: List[float], saved: int) -> Dict[str, Any]:
+    """
+    Describes how an exam-model pair ended in an adaptive batch.
+    Args:
+        exam: Exam of the pair.
+        model: Model of the pair.
+        grades: Grades of the repetitions that were run.
+        saved: Number of repetitions that were not needed.
+    Returns:
+        Dictionary with the pair, the repetitions run and saved, and the reached CI half-width.
+    """
+    return {
+        'model': model.description,
+        'exam': exam.description,
+        'repetitions': len(grades),
+        'saved': saved,
+        'half_width': round(ci_half_width(grades), 2) if grades else None,
+    }
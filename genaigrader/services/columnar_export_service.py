@@ -0,0 +1,174 @@
+import os
+import tempfile
+import zipfile
+from django.db.models import BooleanField, Case, F, Value, When
+from genaigrader.models import Course, Evaluation, Exam, Model, Question, QuestionEvaluation
+
+try:
+    import pyarrow as pa
+except ImportError:  # Optional: pip install "genaigrader[arrow]"
+    pa = None
+
+# Rows written to the files at a time, read from the database in chunks of the same size
+EXPORT_BATCH_SIZE = 50_000
+
+PARQUET = 'parquet'
+ARROW = 'arrow'  # Arrow IPC file, for pyarrow builds without Parquet support
+FORMATS = (PARQUET, ARROW)
+
+# Tables of the export: (name, columns), columns being (field, column name, type).
+# Evaluations and answers are the facts; the other tables are their dimensions.
+TABLES = (
+    ('courses', (('id', 'id', 'int64'), ('name', 'name', 'string'))),
+    ('exams', (('id', 'id', 'int64'), ('course_id', 'course_id', 'int64'), ('description', 'description', 'string'))),
+    ('models', (
+        ('id', 'id', 'int64'), ('description', 'description', 'string'), ('api_url', 'api_url', 'string'),
+    )),
+    ('questions', (
+        ('id', 'id', 'int64'), ('exam_id', 'exam_id', 'int64'), ('statement', 'statement', 'string'),
+        ('correct_option_id', 'correct_option_id', 'int64'),
+    )),
+    ('evaluations', (
+        ('id', 'id', 'int64'), ('exam_id', 'exam_id', 'int64'), ('exam__course_id', 'course_id', 'int64'),
+        ('model_id', 'model_id', 'int64'), ('ev_date', 'date', 'timestamp'), ('grade', 'grade', 'float64'),
+        ('time', 'time', 'float64'), ('prompt', 'prompt', 'string'),
+    )),
+    ('answers', (
+        ('id', 'id', 'int64'), ('evaluation_id', 'evaluation_id', 'int64'), ('question_id', 'question_id', 'int64'),
+        ('question_option_id', 'option_id', 'int64'), ('evaluation__model_id', 'model_id', 'int64'),
+        ('correct', 'correct', 'bool'),
+    )),
+)
+
+
+def arrow_available():
+    return pa is not None
+
+
+def default_format():
+    """Parquet when pyarrow supports it, otherwise Arrow IPC."""
+    try:
+        import pyarrow.parquet  # noqa: F401
+        return PARQUET
+    except ImportError:
+        return ARROW
+
+
+def table_querysets(user):
+    """
+    Querysets of the tables of a user's export, by table name. Only finished
+    evaluations are exported, and only the answers whose chosen option was recorded.
+    """
+    evaluations = Evaluation.objects.filter(exam__course__user=user, status=Evaluation.DONE)
+    answers = QuestionEvaluation.objects.filter(evaluation__in=evaluations, answer_recorded=True).annotate(correct=Case(
+        When(question_option_id=F('question__correct_option_id'), then=Value(True)),
+        default=Value(False), output_field=BooleanField(),
+    ))
+    return {
+        'courses': Course.objects.filter(user=user),
+        'exams': Exam.objects.filter(course__user=user),
+        'models': Model.objects.filter(id__in=evaluations.values('model_id')),
+        'questions': Question.objects.filter(exam__course__user=user),
+        'evaluations': evaluations,
+        'answers': answers,
+    }
+
+
+def table_batches(queryset, columns, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Reads a table in chunks and groups its rows into column batches.
+
+    Parameters:
+    - queryset: Queryset of the table.
+    - columns: Its (field, column name, type) columns.
+    - batch_size: Rows per batch.
+
+    Yields:
+    - dict: Column name -> list of values, at most batch_size rows each.
+    """
+    fields = [field for field, _, _ in columns]
+    names = [name for _, name, _ in columns]
+    rows = queryset.order_by('id').values_list(*fields).iterator(chunk_size=batch_size)
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == batch_size:
+            yield dict(zip(names, map(list, zip(*batch))))
+            batch = []
+    if batch:
+        yield dict(zip(names, map(list, zip(*batch))))
+
+
+def arrow_schema(columns):
+    types = {
+        'int64': pa.int64(), 'float64': pa.float64(), 'bool': pa.bool_(), 'string': pa.string(),
+        'timestamp': pa.timestamp('us', tz='UTC'),
+    }
+    return pa.schema([(name, types[column_type]) for _, name, column_type in columns])
+
+
+def write_tables(user, directory, file_format=None, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Writes the evaluation data of a user as one columnar file per table,
+    batch by batch, so memory does not grow with the number of rows.
+
+    Parameters:
+    - user: Owner of the data.
+    - directory: Existing directory where the files are written.
+    - file_format: PARQUET or ARROW. Defaults to default_format().
+    - batch_size: Rows written at a time.
+
+    Returns:
+    - list: Paths of the written files.
+
+    Raises:
+    - ImportError: If pyarrow is not installed.
+    """
+    if pa is None:
+        raise ImportError('Columnar exports need pyarrow: pip install "genaigrader[arrow]"')
+    file_format = file_format or default_format()
+    if file_format not in FORMATS:
+        raise ValueError(f"Unknown export format: {file_format}")
+
+    querysets = table_querysets(user)
+    paths = []
+    for name, columns in TABLES:
+        schema = arrow_schema(columns)
+        path = os.path.join(directory, f'{name}.{file_format}')
+        with _writer(path, schema, file_format) as writer:
+            for batch in table_batches(querysets[name], columns, batch_size):
+                writer.write_batch(pa.RecordBatch.from_pydict(batch, schema=schema))
+        paths.append(path)
+    return paths
+
+
+def _writer(path, schema, file_format):
+    if file_format == PARQUET:
+        import pyarrow.parquet as pq
+        return pq.ParquetWriter(path, schema)
+    return pa.ipc.new_file(path, schema)
+
+
+def export_archive(user, file_format=None):
+    """
+    Writes the tables of a user's export (see write_tables) into a zip
+    archive, staged on disk rather than in memory.
+
+    Returns:
+    - file: Temporary file with the archive, positioned at its start; it is
+      deleted when closed.
+    """
+    archive = tempfile.TemporaryFile()
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            paths = write_tables(user, directory, file_format)
+            # Parquet and Arrow files are already compressed or not worth compressing
+            with zipfile.ZipFile(archive, 'w', compression=zipfile.ZIP_STORED) as zip_file:
+                for path in paths:
+                    zip_file.write(path, os.path.basename(path))
+    except BaseException:
+        archive.close()
+        raise
+    archive.seek(0)
+    return archive
+
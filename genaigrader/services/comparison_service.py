@@ -0,0 +1,239 @@
+import math
+import warnings
+from dataclasses import dataclass
+import numpy as np
+from genaigrader.models import Evaluation, Model, QuestionEvaluation
+
+# Family-wise significance level of the comparisons of a group (Holm's correction)
+SIGNIFICANCE = 0.05
+# Below this number of discordant questions, McNemar's test uses the exact binomial distribution
+EXACT_MCNEMAR_LIMIT = 25
+BOOTSTRAP_RESAMPLES = 2000
+# Bootstrap values (resamples x models x questions) computed at once, to bound memory
+BOOTSTRAP_CHUNK = 4_000_000
+
+
+@dataclass(frozen=True, slots=True)
+class CorrectnessMatrix:
+    """
+    Answers of several models to the same questions, as model x question
+    arrays: how many times each model answered each question, and how many
+    of those answers were correct. Repetitions of an evaluation add up.
+    """
+    model_ids: np.ndarray
+    question_ids: np.ndarray
+    answered: np.ndarray
+    correct: np.ndarray
+
+    @property
+    def accuracy(self):
+        """Fraction of correct answers of each model to each question (0 if never answered)."""
+        return self.correct / np.maximum(self.answered, 1)
+
+    @property
+    def asked(self):
+        """Whether each model answered each question."""
+        return self.answered > 0
+
+
+def answer_rows(question_evaluations):
+    """
+    Fetches the answers of finished evaluations in a single query, leaving
+    out those saved before the chosen option was recorded.
+
+    Parameters:
+    - question_evaluations: QuestionEvaluation queryset to restrict, e.g. to an exam.
+
+    Returns:
+    - numpy.ndarray: Rows of (course id, model id, question id, correct), as integers.
+    """
+    rows = question_evaluations.filter(evaluation__status=Evaluation.DONE, answer_recorded=True).values_list(
+        'question__exam__course_id', 'evaluation__model_id', 'question_id',
+        'question_option_id', 'question__correct_option_id',
+    )
+    rows = np.array([row[:3] + (row[3] is not None and row[3] == row[4],) for row in rows], dtype=np.int64)
+    return rows.reshape(-1, 4)
+
+
+def correctness_matrix(rows):
+    """
+    Builds the CorrectnessMatrix of answer rows (see answer_rows) with two
+    bincounts, without a Python loop over the answers.
+    """
+    model_ids, model_index = np.unique(rows[:, 1], return_inverse=True)
+    question_ids, question_index = np.unique(rows[:, 2], return_inverse=True)
+    shape = (len(model_ids), len(question_ids))
+    cells = np.ravel_multi_index((model_index.ravel(), question_index.ravel()), shape)
+    answered = np.bincount(cells, minlength=shape[0] * shape[1]).reshape(shape)
+    correct = np.bincount(cells, weights=rows[:, 3], minlength=shape[0] * shape[1]).reshape(shape)
+    return CorrectnessMatrix(model_ids, question_ids, answered, correct)
+
+
+def mcnemar_tests(matrix):
+    """
+    McNemar's test of every pair of models at once, on the questions both answered.
+
+    With one evaluation per model, b and c are the usual discordant counts
+    (questions only the first / only the second model got right). With
+    repetitions, each question contributes the probability that the first
+    model is right and the second wrong (and vice versa), estimated from
+    their answers.
+
+    Returns:
+    - tuple: (b, c, shared, p_values), arrays of shape (models, models).
+      shared is the number of questions both models answered.
+    """
+    asked = matrix.asked.astype(float)
+    right = asked * matrix.accuracy
+    wrong = asked - right
+    b = right @ wrong.T
+    c = b.T
+    shared = asked @ asked.T
+
+    discordant = b + c
+    statistic = np.where(discordant > 0, np.maximum(np.abs(b - c) - 1, 0) ** 2 / np.maximum(discordant, 1e-12), 0.0)
+    # Chi-square with one degree of freedom and continuity correction
+    p_values = np.vectorize(math.erfc, otypes=[float])(np.sqrt(statistic / 2))
+
+    counts = matrix.answered[matrix.asked]
+    if counts.size and counts.max() == 1:  # One answer per question: the counts are integers
+        for i, j in zip(*np.nonzero((discordant > 0) & (discordant < EXACT_MCNEMAR_LIMIT))):
+            p_values[i, j] = _exact_mcnemar(round(b[i, j]), round(c[i, j]))
+    return b, c, shared, p_values
+
+
+def _exact_mcnemar(b, c):
+    """Two-sided exact McNemar p-value: binomial test of b successes in b + c trials with p = 1/2."""
+    n = b + c
+    tail = sum(math.comb(n, k) for k in range(min(b, c) + 1)) / 2 ** n
+    return min(1.0, 2 * tail)
+
+
+def bootstrap_differences(matrix, resamples=BOOTSTRAP_RESAMPLES, confidence=0.95, seed=0):
+    """
+    Paired bootstrap of the accuracy difference of every pair of models at
+    once: the questions are resampled with replacement, and each pair is
+    compared on the resampled questions both answered.
+
+    Parameters:
+    - matrix: CorrectnessMatrix.
+    - resamples: Number of bootstrap resamples.
+    - confidence: Confidence level of the intervals.
+    - seed: Seed of the random generator, so that the results are reproducible.
+
+    Returns:
+    - tuple: (differences, lower, upper, p_values), arrays of shape (models,
+      models) with the accuracy of the row model minus that of the column
+      model; NaN for pairs without shared questions.
+    """
+    asked = matrix.asked.astype(float)
+    right = asked * matrix.accuracy
+    n_models, n_questions = asked.shape
+
+    def pair_differences(weights):
+        # weights: (resamples, questions) -> (resamples, models, models)
+        weighted_right = weights[:, None, :] * right[None]
+        weighted_asked = weights[:, None, :] * asked[None]
+        totals = weighted_asked @ asked.T
+        return (weighted_right @ asked.T - weighted_asked @ right.T) / np.where(totals > 0, totals, np.nan)
+
+    with np.errstate(invalid='ignore'):
+        differences = pair_differences(np.ones((1, n_questions)))[0]
+        rng = np.random.default_rng(seed)
+        chunk = max(1, BOOTSTRAP_CHUNK // max(n_models * n_questions, 1))
+        resampled = []
+        for first in range(0, resamples, chunk):
+            size = min(chunk, resamples - first)
+            # Times each question is drawn in each resample
+            weights = rng.multinomial(n_questions, np.full(n_questions, 1 / n_questions), size=size).astype(float)
+            resampled.append(pair_differences(weights))
+        resampled = np.concatenate(resampled)
+
+        alpha = (1 - confidence) / 2
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)  # Pairs without shared questions
+            lower, upper = np.nanquantile(resampled, [alpha, 1 - alpha], axis=0)
+        valid = np.isfinite(resampled)
+        below = np.sum(resampled <= 0, axis=0) / np.maximum(valid.sum(axis=0), 1)
+        above = np.sum(resampled >= 0, axis=0) / np.maximum(valid.sum(axis=0), 1)
+        p_values = np.minimum(1.0, 2 * np.minimum(below, above))
+    p_values[~np.isfinite(differences)] = np.nan
+    return differences, lower, upper, p_values
+
+
+def holm_adjust(p_values):
+    """Holm-Bonferroni adjusted p-values, for testing several pairs at once."""
+    p_values = np.asarray(p_values, dtype=float)
+    order = np.argsort(p_values)
+    adjusted = np.maximum.accumulate(p_values[order] * (len(p_values) - np.arange(len(p_values))))
+    result = np.empty_like(p_values)
+    result[order] = np.minimum(adjusted, 1.0)
+    return result
+
+
+def compare_models(matrix, models, resamples=BOOTSTRAP_RESAMPLES, confidence=0.95, seed=0):
+    """
+    Paired comparison of every pair of models of a correctness matrix.
+
+    Parameters:
+    - matrix: CorrectnessMatrix.
+    - models: Dict of the Model objects by id.
+    - resamples, confidence, seed: See bootstrap_differences.
+
+    Returns:
+    - list: One dict per pair of models with shared questions, models in the
+      order of Model.get_sort_key: their descriptions and accuracies (%), the
+      difference with its bootstrap interval (percentage points), the
+      McNemar and bootstrap p-values, the Holm-adjusted McNemar p-value and
+      whether the difference is significant after the adjustment.
+    """
+    b, c, shared, mcnemar_p = mcnemar_tests(matrix)
+    differences, lower, upper, bootstrap_p = bootstrap_differences(matrix, resamples, confidence, seed)
+    order = sorted(range(len(matrix.model_ids)), key=lambda i: models[int(matrix.model_ids[i])].get_sort_key())
+    pairs = [(i, j) for position, i in enumerate(order) for j in order[position + 1:] if shared[i, j] > 0]
+    if not pairs:
+        return []
+    rows, columns = np.array(pairs).T
+    holm_p = holm_adjust(mcnemar_p[rows, columns])
+
+    accuracy = matrix.accuracy
+    asked = matrix.asked
+    comparisons = []
+    for k, (i, j) in enumerate(pairs):
+        both = asked[i] & asked[j]
+        comparisons.append({
+            'model_a': models[int(matrix.model_ids[i])].description,
+            'model_b': models[int(matrix.model_ids[j])].description,
+            'questions': int(shared[i, j]),
+            'accuracy_a': round(float(accuracy[i, both].mean()) * 100, 1),
+            'accuracy_b': round(float(accuracy[j, both].mean()) * 100, 1),
+            'only_a': round(float(b[i, j]), 1),
+            'only_b': round(float(c[i, j]), 1),
+            'difference': round(float(differences[i, j]) * 100, 1),
+            'lower': round(float(lower[i, j]) * 100, 1),
+            'upper': round(float(upper[i, j]) * 100, 1),
+            'mcnemar_p': round(float(mcnemar_p[i, j]), 4),
+            'bootstrap_p': round(float(bootstrap_p[i, j]), 4),
+            'holm_p': round(float(holm_p[k]), 4),
+            'significant': bool(holm_p[k] < SIGNIFICANCE),
+        })
+    return comparisons
+
+
+def course_comparisons(user, models=None):
+    """
+    Paired model comparisons of each course of a user and of all of them,
+    from a single query of their answers.
+
+    Returns:
+    - dict: List of comparisons (see compare_models) by course id, and under None for all courses.
+    """
+    rows = answer_rows(QuestionEvaluation.objects.filter(question__exam__course__user=user))
+    if len(rows) == 0:
+        return {}
+    if models is None:
+        models = Model.objects.in_bulk(np.unique(rows[:, 1]).tolist())
+    comparisons = {None: compare_models(correctness_matrix(rows), models)}
+    for course_id in np.unique(rows[:, 0]).tolist():
+        comparisons[course_id] = compare_models(correctness_matrix(rows[rows[:, 0] == course_id]), models)
+    return comparisons
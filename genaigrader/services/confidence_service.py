@@ -1,47 +1,114 @@
 import math
+from functools import lru_cache
+from statistics import NormalDist
+import numpy as np
+
+# Relative precision of the Student-t quantiles
+T_QUANTILE_TOLERANCE = 1e-12
+# Bootstrap draws generated at once, to bound the memory of large samples
+BOOTSTRAP_CHUNK = 2_000_000
+
+def _beta_fraction(x, a, b):
+    """Continued fraction of the incomplete beta function (modified Lentz's method)."""
+    tiny = 1e-300
+    c = 1.0
+    d = 1.0 - (a + b) * x / (a + 1.0)
+    d = 1.0 / (d if abs(d) > tiny else tiny)
+    h = d
+    for m in range(1, 500):
+        for numerator in (m * (b - m) * x / ((a + 2 * m - 1) * (a + 2 * m)),
+                          -(a + m) * (a + b + m) * x / ((a + 2 * m) * (a + 2 * m + 1))):
+            d = 1.0 + numerator * d
+            d = 1.0 / (d if abs(d) > tiny else tiny)
+            c = 1.0 + numerator / c
+            c = c if abs(c) > tiny else tiny
+            h *= d * c
+        if abs(d * c - 1.0) < 1e-16:
+            break
+    return h
+
+def regularized_beta(x, a, b):
+    """Regularized incomplete beta function I_x(a, b)."""
+    if x <= 0:
+        return 0.0
+    if x >= 1:
+        return 1.0
+    front = math.exp(math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b) + a * math.log(x) + b * math.log1p(-x))
+    # The fraction converges quickly on this side of the mode; use the symmetry on the other
+    if x < (a + 1) / (a + b + 2):
+        return front * _beta_fraction(x, a, b) / a
+    return 1.0 - front * _beta_fraction(1.0 - x, b, a) / b
+
+def t_survival(t, df):
+    """P(T > t) for a Student-t variable with df degrees of freedom."""
+    tail = 0.5 * regularized_beta(df / (df + t * t), df / 2, 0.5)
+    return tail if t >= 0 else 1.0 - tail
+
+def t_density(t, df):
+    log_density = (math.lgamma((df + 1) / 2) - math.lgamma(df / 2) - 0.5 * math.log(df * math.pi)
+                   - (df + 1) / 2 * math.log1p(t * t / df))
+    return math.exp(log_density)
+
+@lru_cache(maxsize=4096)
+def t_quantile(probability, df):
+    """
+    Quantile of the Student-t distribution, for any probability and any
+    (possibly fractional) degrees of freedom; infinite df gives the normal
+    quantile.
+
+    Closed forms are used for 1 and 2 degrees of freedom. Otherwise the
+    Cornish-Fisher approximation is refined with safeguarded Newton steps on
+    the exact upper tail until T_QUANTILE_TOLERANCE.
+    """
+    if not 0 < probability < 1:
+        raise ValueError("The probability must be between 0 and 1")
+    if df <= 0:
+        raise ValueError("The degrees of freedom must be positive")
+    if probability < 0.5:
+        return -t_quantile(1 - probability, df)
+    if probability == 0.5:
+        return 0.0
+    if math.isinf(df):
+        return NormalDist().inv_cdf(probability)
+    if df == 1:
+        return math.tan(math.pi * (probability - 0.5))
+    if df == 2:
+        return (2 * probability - 1) / math.sqrt(2 * probability * (1 - probability))
+
+    tail = 1 - probability
+    z = NormalDist().inv_cdf(probability)
+    t = z + (z ** 3 + z) / (4 * df) + (5 * z ** 5 + 16 * z ** 3 + 3 * z) / (96 * df ** 2)
+    low, high = 0.0, math.inf  # Bracket of the quantile
+    for _ in range(100):
+        excess = t_survival(t, df) - tail
+        if excess > 0:
+            low = t
+        else:
+            high = t
+        new_t = t + excess / t_density(t, df)
+        if not low < new_t < high:
+            new_t = (low + high) / 2 if high < math.inf else 2 * t
+        if abs(new_t - t) <= T_QUANTILE_TOLERANCE * new_t:
+            return new_t
+        t = new_t
+    return t
 
 def confidence_interval(data, confidence=0.95):
+    """
+    Mean of the data and its Student-t confidence interval, for any
+    confidence level. Lower bounds are clipped at 0 (no negative grades).
+
+    Returns:
+    - tuple: (mean, lower, upper).
+    """
     n = len(data)
     if n < 1:
         raise ValueError("Need at least one data point")
     elif n == 1:
         return (data[0], data[0], data[0])  # Single data point case
 
-    mean = sum(data) / n
-    variance = sum((x - mean) ** 2 for x in data) / (n - 1)
-    std_dev = math.sqrt(variance)
-    std_err = std_dev / math.sqrt(n)
-
-    # z-values for normal distribution
-    z_values = {
-        0.90: 1.645,
-        0.95: 1.96,
-        0.99: 2.576
-    }
-
-    # t-values for small samples (df = n-1)
-    t_values = {
-        0.90: [6.314, 2.920, 2.353, 2.132, 2.015, 1.943, 1.895, 1.860, 1.833,
-               1.812, 1.796, 1.782, 1.771, 1.761, 1.753, 1.746, 1.740, 1.734,
-               1.729, 1.725, 1.721, 1.717, 1.714, 1.711, 1.708, 1.706, 1.703,
-               1.701, 1.699],
-        0.95: [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262,
-               2.228, 2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101,
-               2.093, 2.086, 2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052,
-               2.048, 2.045],
-        0.99: [63.657, 9.925, 5.841, 4.604, 4.032, 3.707, 3.499, 3.355, 3.250,
-               3.169, 3.106, 3.055, 3.012, 2.977, 2.947, 2.921, 2.898, 2.878,
-               2.861, 2.845, 2.831, 2.819, 2.807, 2.797, 2.787, 2.779, 2.771,
-               2.763, 2.756]
-    }
-
-    if n <= 30:
-        t = t_values[confidence][n-2]  # n-2 because index starts at 0 for n=2
-    else:
-        t = z_values[confidence]
-
-    margin = t * std_err
-    return mean, max(mean - margin, 0), mean + margin  # Prevent negative grades
+    _, means, lower, upper = grouped_confidence_intervals(np.zeros(n, dtype=np.int64), data, 1, confidence)
+    return float(means[0, 0]), float(lower[0, 0]), float(upper[0, 0])
 
 def compute_averages(model_values, value_name):
     """Calculate average values with confidence intervals for each model"""
@@ -60,4 +127,184 @@ def compute_averages(model_values, value_name):
             'yMax': round(csup, 2)
         })
     
-    return model_averages, []
\ No newline at end of file
+    return model_averages, []
+
+def ci_half_width(data, confidence=0.95):
+    """Half-width of the confidence interval of the mean (0 for a single data point)"""
+    mean, _, upper = confidence_interval(data, confidence)
+    return upper - mean  # The lower bound is clipped at 0, the upper one is not
+
+def critical_values(counts, confidence=0.95):
+    """
+    Two-sided Student-t critical value for each sample size (n - 1 degrees of
+    freedom), and 0 for samples of one value, whose interval is the value
+    itself. Quantiles are computed once per distinct sample size.
+    """
+    counts = np.asarray(counts)
+    sizes, inverse = np.unique(counts, return_inverse=True)
+    values = np.array([t_quantile((1 + confidence) / 2, int(n) - 1) if n > 1 else 0.0 for n in sizes])
+    return values[inverse.reshape(counts.shape)] if len(sizes) else np.zeros(counts.shape)
+
+def grouped_moments(group_index, values, n_groups):
+    """
+    Count, mean and M2 (sum of squared deviations from the mean) of several
+    metrics for many groups at once.
+
+    Parameters:
+    - group_index: Array with the group (0 to n_groups - 1) of each row.
+    - values: Array of shape (rows, metrics).
+    - n_groups: Number of groups.
+
+    Returns:
+    - tuple: (counts, means, m2). counts has shape (n_groups,); the others (n_groups, metrics).
+    """
+    values = np.asarray(values, dtype=float).reshape(len(group_index), -1)
+    counts = np.bincount(group_index, minlength=n_groups)
+    sums = np.stack([np.bincount(group_index, weights=column, minlength=n_groups) for column in values.T], axis=1)
+    means = sums / np.maximum(counts, 1)[:, None]
+    # Two-pass: squared deviations from each group's mean
+    deviations = (values - means[group_index]) ** 2
+    m2 = np.stack([np.bincount(group_index, weights=column, minlength=n_groups) for column in deviations.T], axis=1)
+    return counts, means, m2
+
+def merge_moments(group_index, counts, means, m2, n_groups):
+    """
+    Combines the moments of parts into the moments of groups of parts
+    (Chan et al.'s parallel formula), e.g. exams into courses.
+
+    Parameters:
+    - group_index: Array with the group of each part.
+    - counts, means, m2: Moments of the parts, as returned by grouped_moments.
+    - n_groups: Number of groups.
+
+    Returns:
+    - tuple: (counts, means, m2) of the groups.
+    """
+    counts = np.asarray(counts, dtype=float)
+    means = np.asarray(means, dtype=float).reshape(len(counts), -1)
+    m2 = np.asarray(m2, dtype=float).reshape(len(counts), -1)
+    totals = np.bincount(group_index, weights=counts, minlength=n_groups)
+    safe_totals = np.maximum(totals, 1)[:, None]
+    group_means = np.stack([
+        np.bincount(group_index, weights=counts * column, minlength=n_groups) for column in means.T
+    ], axis=1) / safe_totals
+    spread = counts[:, None] * (means - group_means[group_index]) ** 2
+    group_m2 = np.stack([
+        np.bincount(group_index, weights=column, minlength=n_groups) for column in (m2 + spread).T
+    ], axis=1)
+    return totals.astype(np.int64), group_means, group_m2
+
+def intervals_from_moments(counts, means, m2, confidence=0.95):
+    """
+    Confidence intervals of the means from the moments of each group, as
+    confidence_interval computes them.
+
+    Returns:
+    - tuple: (lower, upper), arrays shaped like means. Lower bounds are clipped at 0.
+    """
+    counts = np.asarray(counts)
+    variances = m2 / np.maximum(counts - 1, 1)[:, None]
+    margins = critical_values(counts, confidence)[:, None] * np.sqrt(variances) / np.sqrt(np.maximum(counts, 1))[:, None]
+    return np.maximum(means - margins, 0), means + margins
+
+def grouped_confidence_intervals(group_index, values, n_groups, confidence=0.95):
+    """
+    Mean and confidence interval of several metrics for many groups at once,
+    with the same results as calling confidence_interval on each group.
+
+    Parameters:
+    - group_index: Array with the group (0 to n_groups - 1) of each row.
+    - values: Array of shape (rows, metrics).
+    - n_groups: Number of groups.
+    - confidence: Confidence level, between 0 and 1.
+
+    Returns:
+    - tuple: (counts, means, lower, upper). counts has shape (n_groups,); the
+      other arrays have shape (n_groups, metrics). Lower bounds are clipped at 0.
+    """
+    counts, means, m2 = grouped_moments(group_index, values, n_groups)
+    lower, upper = intervals_from_moments(counts, means, m2, confidence)
+    return counts, means, lower, upper
+
+def bootstrap_intervals(group_index, values, n_groups, confidence=0.95, resamples=2000, seed=None):
+    """
+    Percentile bootstrap confidence intervals of the means of several metrics
+    for many groups at once; unlike the t-intervals, they do not assume the
+    means are normally distributed, e.g. for skewed times.
+
+    Every group is resampled with replacement `resamples` times in the same
+    vectorized draws (in chunks of BOOTSTRAP_CHUNK values).
+
+    Parameters:
+    - group_index: Array with the group (0 to n_groups - 1) of each row.
+    - values: Array of shape (rows, metrics).
+    - n_groups: Number of groups.
+    - confidence: Confidence level, between 0 and 1.
+    - resamples: Number of bootstrap resamples.
+    - seed: Seed of the random generator, for reproducible intervals.
+
+    Returns:
+    - tuple: (counts, means, lower, upper), shaped as in grouped_confidence_intervals.
+      Empty groups get 0 for every value.
+    """
+    group_index = np.asarray(group_index, dtype=np.int64)
+    values = np.asarray(values, dtype=float).reshape(len(group_index), -1)
+    rows, metrics = values.shape
+    counts = np.bincount(group_index, minlength=n_groups)
+    means = np.stack([np.bincount(group_index, weights=column, minlength=n_groups) for column in values.T], axis=1)
+    means = means / np.maximum(counts, 1)[:, None] if rows else np.zeros((n_groups, metrics))
+    if not rows:
+        return counts, means, means.copy(), means.copy()
+
+    # Rows sorted by group, so that a group's rows are a contiguous range to draw from
+    order = np.argsort(group_index, kind='stable')
+    row_groups = group_index[order]
+    sorted_values = values[order]
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    rng = np.random.default_rng(seed)
+
+    resampled_means = np.empty((resamples, n_groups, metrics))
+    chunk = max(1, BOOTSTRAP_CHUNK // rows)
+    for first in range(0, resamples, chunk):
+        size = min(chunk, resamples - first)
+        draws = starts[row_groups] + (rng.random((size, rows)) * counts[row_groups]).astype(np.int64)
+        bins = (np.arange(size)[:, None] * n_groups + row_groups).ravel()
+        sums = np.stack([
+            np.bincount(bins, weights=sorted_values[draws, metric].ravel(), minlength=size * n_groups)
+            for metric in range(metrics)
+        ], axis=-1)
+        resampled_means[first:first + size] = sums.reshape(size, n_groups, metrics) / np.maximum(counts, 1)[:, None]
+
+    alpha = (1 - confidence) / 2
+    lower, upper = np.quantile(resampled_means, [alpha, 1 - alpha], axis=0)
+    return counts, means, lower, upper
+
+def wilson_intervals(successes, trials, confidence=0.95):
+    """
+    Wilson score intervals of proportions, e.g. how often each question is
+    answered correctly. Unlike the normal approximation, they stay within
+    [0, 1] and are not empty for proportions of 0 or 1.
+
+    Parameters:
+    - successes: Array with the successes of each proportion.
+    - trials: Array with the trials of each proportion.
+    - confidence: Confidence level, between 0 and 1.
+
+    Returns:
+    - tuple: (proportions, lower, upper) arrays. Proportions without trials
+      are NaN, with the uninformative interval [0, 1].
+    """
+    trials = np.asarray(trials, dtype=float)
+    answered = trials > 0
+    successes = np.where(answered, successes, 0.0)
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    n = np.maximum(trials, 1)
+    proportions = successes / n
+    denominator = 1 + z * z / n
+    centre = (proportions + z * z / (2 * n)) / denominator
+    margin = z * np.sqrt(proportions * (1 - proportions) / n + z * z / (4 * n * n)) / denominator
+    return (
+        np.where(answered, proportions, np.nan),
+        np.where(answered, np.maximum(centre - margin, 0.0), 0.0),
+        np.where(answered, np.minimum(centre + margin, 1.0), 1.0),
+    )
@@ -0,0 +1,53 @@
+from django.core.cache import cache
+from django.db.models import F, Q, Sum
+from genaigrader.models import DataVersion
+
+# Seconds a computed dashboard is kept. Keys include the data version, so
+# entries are never stale and only expire to free memory.
+DASHBOARD_CACHE_TIMEOUT = 24 * 60 * 60
+
+
+def data_version(user_id):
+    """
+    Version of the data behind a user's dashboards, in one query: their own
+    counter plus the one shared by every user. Both only grow, so their sum
+    changes whenever either is bumped.
+    """
+    versions = DataVersion.objects.filter(Q(user_id=user_id) | Q(user__isnull=True))
+    return versions.aggregate(version=Sum('version'))['version'] or 0
+
+
+def bump_data_version(user_id=None):
+    """Invalidates the cached dashboards of a user, or of every user if None."""
+    versions = DataVersion.objects.filter(user_id=user_id)
+    if not versions.update(version=F('version') + 1):
+        _, created = DataVersion.objects.get_or_create(user_id=user_id, defaults={'version': 1})
+        if not created:  # Created by someone else in the meantime
+            versions.update(version=F('version') + 1)
+
+
+def data_etag(user_id, name):
+    """ETag of a user's dashboard, e.g. for django.views.decorators.http.condition."""
+    return f'"{name}-{user_id}-{data_version(user_id)}"'
+
+
+def cached_dashboard(user_id, name, build):
+    """
+    Returns the payload of a user's dashboard, built by `build()` only when
+    the data changed since it was last cached.
+
+    The version is read before building, so a change committed meanwhile can
+    only make the cached payload newer than its key, never older.
+
+    Parameters:
+    - user_id: Owner of the dashboard.
+    - name: Dashboard name, unique per user (e.g. 'analysis' or 'exam-3').
+    - build: Callable computing the payload. The payload it returns must be
+      picklable, since it is stored in the cache.
+    """
+    key = f'dashboard:{user_id}:{name}:{data_version(user_id)}'
+    payload = cache.get(key)
+    if payload is None:
+        payload = build()
+        cache.set(key, payload, DASHBOARD_CACHE_TIMEOUT)
+    return payload
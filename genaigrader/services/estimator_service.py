@@ -0,0 +1,242 @@
+import math
+import threading
+import time
+from dataclasses import dataclass
+from django.db.models import Count, F, FloatField, IntegerField, OuterRef, Subquery, Sum
+from genaigrader.models import Evaluation, Exam, QuestionEvaluation
+from genaigrader.services.exam_pack_service import get_exam_pack
+from genaigrader.services.llm_service import generate_prompt
+from genaigrader.services.scheduler_service import QUEUE_ORDER, ResourceScheduler, task_resource
+
+# Seconds the latency model is reused before it is rebuilt from the evaluations
+LATENCY_MODEL_TTL = 300
+# z-value of the 95% bounds of the estimates
+BOUNDS_Z = 1.96
+# Rough number of characters per token, to estimate token counts from prompt lengths
+CHARS_PER_TOKEN = 4
+
+_latency_lock = threading.Lock()
+_latency = None  # (built at, LatencyModel)
+
+
+@dataclass(frozen=True, slots=True)
+class LatencyStats:
+    """Seconds per question of a model (or of all models), over its past evaluations."""
+    evaluations: int
+    mean: float
+    std: float
+
+    @classmethod
+    def from_sums(cls, n, total, total_squares):
+        mean = total / n
+        variance = max(total_squares / n - mean * mean, 0.0) * n / (n - 1) if n > 1 else 0.0
+        return cls(n, mean, math.sqrt(variance))
+
+
+class LatencyModel:
+    """
+    Per-model latency, used to estimate how long evaluations will take.
+
+    Models without finished evaluations fall back to the statistics of all
+    models together, with their spread as uncertainty.
+    """
+
+    def __init__(self, per_model, overall=None):
+        self.per_model = per_model  # model id -> LatencyStats
+        self.overall = overall
+
+    def stats_for(self, model_id):
+        """
+        Returns:
+        - tuple: (LatencyStats | None, basis), basis being 'history', 'global' or 'none'.
+        """
+        if model_id in self.per_model:
+            return self.per_model[model_id], 'history'
+        if self.overall is not None:
+            return self.overall, 'global'
+        return None, 'none'
+
+    def estimate(self, model_id, question_count):
+        """
+        Estimates the duration of an evaluation.
+
+        Parameters:
+        - model_id: Model to evaluate.
+        - question_count: Number of questions of the exam.
+
+        Returns:
+        - dict: 'seconds', 'low' and 'high' (95% bounds) and 'std', all None
+          without history, and the 'basis' of the estimate.
+        """
+        stats, basis = self.stats_for(model_id)
+        if stats is None:
+            return {'seconds': None, 'low': None, 'high': None, 'std': None, 'basis': basis}
+        seconds = stats.mean * question_count
+        std = stats.std * question_count
+        return {
+            'seconds': seconds,
+            'low': max(seconds - BOUNDS_Z * std, 0.0),
+            'high': seconds + BOUNDS_Z * std,
+            'std': std,
+            'basis': basis,
+        }
+
+
+def load_latency_model():
+    """
+    Builds the latency model from the finished evaluations.
+
+    The time of each evaluation is divided by the number of questions it
+    answered, and the per-question times are summed per model by the
+    database, so the evaluations are not loaded.
+    """
+    answered = Subquery(
+        QuestionEvaluation.objects.filter(evaluation=OuterRef('pk'))
+        .values('evaluation').annotate(count=Count('id')).values('count'),
+        output_field=IntegerField()
+    )
+    evaluations = (
+        Evaluation.objects.filter(status=Evaluation.DONE, time__gt=0)
+        .annotate(answered=answered).filter(answered__gt=0)
+        .annotate(per_question=F('time') * 1.0 / F('answered'))
+    )
+    rows = evaluations.values('model_id').annotate(
+        n=Count('id'),
+        total=Sum('per_question', output_field=FloatField()),
+        total_squares=Sum(F('per_question') * F('per_question'), output_field=FloatField()),
+    ).order_by()
+
+    per_model = {}
+    n_all = total_all = squares_all = 0
+    for row in rows:
+        per_model[row['model_id']] = LatencyStats.from_sums(row['n'], row['total'], row['total_squares'])
+        n_all += row['n']
+        total_all += row['total']
+        squares_all += row['total_squares']
+    overall = LatencyStats.from_sums(n_all, total_all, squares_all) if n_all else None
+    return LatencyModel(per_model, overall)
+
+
+def get_latency_model():
+    """Returns the latency model, rebuilding it when it is older than LATENCY_MODEL_TTL."""
+    global _latency
+    with _latency_lock:
+        if _latency is not None and time.monotonic() - _latency[0] < LATENCY_MODEL_TTL:
+            return _latency[1]
+    latency_model = load_latency_model()
+    with _latency_lock:
+        _latency = (time.monotonic(), latency_model)
+    return latency_model
+
+
+def invalidate_latency_model():
+    """Forgets the latency model, so the next estimate sees the latest evaluations."""
+    global _latency
+    with _latency_lock:
+        _latency = None
+
+
+def question_counts(exam_ids):
+    """Returns a dict with the number of questions of each exam, in one query."""
+    return dict(
+        Exam.objects.filter(id__in=exam_ids).annotate(count=Count('question')).values_list('id', 'count')
+    )
+
+
+def prompt_tokens(exam, user_prompt):
+    """Estimated tokens sent to a model to evaluate an exam once."""
+    chars = sum(len(generate_prompt(question, user_prompt)['prompt']) for question in get_exam_pack(exam).questions)
+    return round(chars / CHARS_PER_TOKEN)
+
+
+def estimate_batch(exams, models, repetitions, user_prompt="", latency_model=None, external_slots=None):
+    """
+    Estimates the duration and token usage of a batch before it is submitted.
+
+    Parameters:
+    - exams: Exams to evaluate.
+    - models: Models to evaluate.
+    - repetitions: Number of repetitions of each exam-model pair.
+    - user_prompt: User-provided prompt.
+    - latency_model: LatencyModel to use. Defaults to get_latency_model().
+    - external_slots: Concurrent evaluations per external endpoint, as in the scheduler.
+
+    Returns:
+    - dict: 'tasks', the estimate of one evaluation of each exam-model pair;
+      'total', the summed work with 95% bounds (tasks assumed independent);
+      'wall', the expected elapsed time when the tasks are spread over the
+      resources like the scheduler does; and the prompt token estimates. Answer
+      tokens are not estimated: no token usage is recorded.
+    """
+    latency_model = latency_model or get_latency_model()
+    scheduler = ResourceScheduler(external_slots=external_slots, order=QUEUE_ORDER)
+    counts = question_counts([exam.id for exam in exams])
+    exam_prompt_tokens = {exam.id: prompt_tokens(exam, user_prompt) for exam in exams}
+
+    tasks = []
+    per_resource = {}
+    unknown = 0
+    total_prompt_tokens = 0
+    for model in models:
+        resource = task_resource(model)
+        for exam in exams:
+            question_count = counts.get(exam.id, 0)
+            estimate = latency_model.estimate(model.id, question_count)
+            tokens_in = exam_prompt_tokens[exam.id]
+            tasks.append({
+                'exam_id': exam.id, 'model_id': model.id, 'questions': question_count,
+                'repetitions': repetitions, 'prompt_tokens': tokens_in,
+                **{key: _round(value) for key, value in estimate.items()},
+            })
+            total_prompt_tokens += tokens_in * repetitions
+            if estimate['seconds'] is None:
+                unknown += repetitions
+                continue
+            work = per_resource.setdefault(resource, [0.0, 0.0])
+            work[0] += estimate['seconds'] * repetitions
+            work[1] += estimate['std'] ** 2 * repetitions
+
+    total = _bounds(sum(seconds for seconds, _ in per_resource.values()),
+                    sum(variance for _, variance in per_resource.values()))
+    # Resources run in parallel: the batch lasts as long as its busiest one
+    walls = [_bounds(seconds / scheduler.capacity(resource), variance / scheduler.capacity(resource) ** 2)
+             for resource, (seconds, variance) in per_resource.items()]
+    wall = {key: max((bounds[key] for bounds in walls), default=0.0) for key in ('seconds', 'low', 'high')}
+
+    return {
+        'tasks': tasks,
+        'evaluations': len(exams) * len(models) * repetitions,
+        'unknown_evaluations': unknown,  # Not included in the durations
+        'total': total,
+        'wall': {key: _round(value) for key, value in wall.items()},
+        'prompt_tokens': total_prompt_tokens,
+    }
+
+
+def task_seconds(task, latency_model=None):
+    """
+    Estimated duration of a batch task, for shortest-job-first scheduling.
+    Uses `task.question_count` when the query annotated it.
+
+    Returns:
+    - float: Estimated seconds; infinity without any history, so unknown tasks go last.
+    """
+    latency_model = latency_model or get_latency_model()
+    question_count = getattr(task, 'question_count', None)
+    if question_count is None:
+        question_count = len(get_exam_pack(task.exam_id).questions)
+    seconds = latency_model.estimate(task.model_id, question_count)['seconds']
+    return math.inf if seconds is None else seconds
+
+
+def _bounds(seconds, variance):
+    std = math.sqrt(variance)
+    return {
+        'seconds': _round(seconds),
+        'low': _round(max(seconds - BOUNDS_Z * std, 0.0)),
+        'high': _round(seconds + BOUNDS_Z * std),
+    }
+
+
+def _round(value):
+    return round(value, 2) if isinstance(value, float) else value
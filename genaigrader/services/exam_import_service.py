@@ -0,0 +1,471 @@
+import csv
+import io
+import itertools
+import json
+import os
+import re
+import string
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, List, Tuple
+from genaigrader.services.exam_service import ExamFormatError, iter_exam_questions
+
+# Characters read to guess the format of a file whose extension does not settle it
+SNIFF_SIZE = 8192
+# Characters read at a time from JSON arrays
+JSON_CHUNK_SIZE = 65536
+
+OPTION_LABELS = string.ascii_lowercase
+
+
+@dataclass(frozen=True)
+class ExamImporter:
+    """
+    A question bank format.
+
+    parse reads a text file and yields the question-data records that
+    persist_exam_and_questions consumes ({'statement', 'options',
+    'correct_option'}, options labelled "a) ...", "b) ..."), appending the
+    errors of the invalid questions to a list instead of stopping.
+    sniff tells whether the first SNIFF_SIZE characters of a file look like
+    this format.
+    """
+    name: str
+    extensions: Tuple[str, ...]
+    parse: Callable[[io.TextIOBase, List[str]], Iterator[Dict]]
+    sniff: Callable[[str], bool]
+
+
+# Registered importers by name. Sniffing tries them in registration order, so
+# the plain text format, which accepts anything, is registered last.
+IMPORTERS: Dict[str, ExamImporter] = {}
+
+
+def register_importer(importer):
+    IMPORTERS[importer.name] = importer
+    return importer
+
+
+def accepted_extensions():
+    """Extensions of every registered format, e.g. for the accept attribute of a file input."""
+    return sorted({extension for importer in IMPORTERS.values() for extension in importer.extensions})
+
+
+def detect_importer(filename, text):
+    """
+    Picks the importer of a file by its extension, or by sniffing its first
+    characters when no format or several formats (e.g. plain text and
+    Aiken, both .txt) use that extension.
+
+    Parameters:
+    - filename: Name of the file, possibly empty.
+    - text: The file in text mode; it is rewound after sniffing.
+    """
+    extension = os.path.splitext(filename or "")[1].lower()
+    candidates = [importer for importer in IMPORTERS.values() if extension in importer.extensions]
+    if len(candidates) == 1:
+        return candidates[0]
+    candidates = candidates or list(IMPORTERS.values())
+    if not text.seekable():
+        return candidates[-1]
+    head = text.read(SNIFF_SIZE)
+    text.seek(0)
+    return next((importer for importer in candidates if importer.sniff(head)), candidates[-1])
+
+
+def import_exam(file, filename=None, exam_format=None, encoding="utf-8-sig") -> List[Dict]:
+    """
+    Reads a question bank in any registered format in a single pass.
+
+    Parameters:
+    - file: File-like object in text mode, or in binary mode (e.g. an UploadedFile) to be decoded with `encoding`.
+    - filename: Name used to detect the format. Defaults to the name of the file.
+    - exam_format: Name of a registered importer, to skip the detection.
+
+    Returns:
+    - list: Question-data records, as consumed by persist_exam_and_questions.
+
+    Raises:
+    - ExamFormatError: With every error of the file, if there is any.
+    - ValueError: If exam_format is not a registered importer.
+    """
+    if exam_format is not None and exam_format not in IMPORTERS:
+        raise ValueError(f"Unknown exam format: {exam_format}")
+
+    # newline='' keeps the line breaks of quoted CSV cells; the line parsers strip them anyway
+    text = file if isinstance(file, io.TextIOBase) else io.TextIOWrapper(file, encoding=encoding, newline="")
+    errors = []
+    try:
+        if exam_format is None:
+            importer = detect_importer(filename or getattr(file, "name", ""), text)
+        else:
+            importer = IMPORTERS[exam_format]
+        questions_data = list(importer.parse(text, errors))
+    finally:
+        if text is not file:
+            text.detach()  # Leaves the file open for its owner
+
+    if not questions_data and not errors:
+        errors.append("File contains no valid questions")
+    if errors:
+        raise ExamFormatError(errors)
+    return questions_data
+
+
+def build_question(statement, labels, texts, answer, location, errors):
+    """
+    Builds the record of a question read from a structured format.
+
+    Parameters:
+    - statement: Question text.
+    - labels: Letter of each option in the source, lowercase; they are relabelled a), b)... in order.
+    - texts: Text of each option.
+    - answer: Correct option: its letter, its text or its position (int, from 0).
+    - location: Where the question is, for the error messages, e.g. "Line 12".
+    - errors: List where the error is appended if the question is invalid.
+
+    Returns:
+    - dict: The record, or None if the question is invalid.
+    """
+    statement = str(statement or "").strip()
+    if not statement:
+        errors.append(f"{location}: Question missing statement")
+        return None
+    if len(texts) < 2:
+        errors.append(f"{location}: Minimum 2 options required. Question: '{statement[:30]}...'")
+        return None
+    if len(texts) > len(OPTION_LABELS):
+        errors.append(f"{location}: At most {len(OPTION_LABELS)} options are supported. Question: '{statement[:30]}...'")
+        return None
+
+    if isinstance(answer, int) and not isinstance(answer, bool):
+        correct_index = answer if 0 <= answer < len(texts) else None
+    else:
+        answer = str(answer or "").strip()
+        if answer.lower() in labels:
+            correct_index = labels.index(answer.lower())
+        else:
+            correct_index = texts.index(answer) if answer and answer in texts else None
+    if correct_index is None:
+        errors.append(f"{location}: Invalid correct option '{answer}'. Valid options: {labels}")
+        return None
+
+    return {
+        'statement': statement,
+        'options': [f"{label}) {text}" for label, text in zip(OPTION_LABELS, texts)],
+        'correct_option': OPTION_LABELS[correct_index],
+    }
+
+
+# Moodle GIFT: "::Title:: Question {=right ~wrong ~wrong}", questions separated by blank lines
+
+GIFT_FORMAT_MARKER = re.compile(r"^\[(?:html|moodle|plain|markdown)\]\s*")
+GIFT_WEIGHT = re.compile(r"^%(-?\d+(?:\.\d+)?)%")
+GIFT_TRUE_FALSE = {"T": 0, "TRUE": 0, "F": 1, "FALSE": 1}
+
+
+def _gift_unescape(text):
+    return re.sub(r"\\(.)", lambda match: "\n" if match.group(1) == "n" else match.group(1), text)
+
+
+def _gift_find(text, characters, start=0):
+    """Index of the first of `characters` at or after start that is not escaped, or -1."""
+    position = start
+    while position < len(text):
+        if text[position] == "\\":
+            position += 2
+            continue
+        if text[position] in characters:
+            return position
+        position += 1
+    return -1
+
+
+def _gift_answers(body):
+    """Splits the answers of a GIFT question into (marker, text) pairs, without their feedback."""
+    answers = []
+    position = _gift_find(body, "=~")
+    if position == -1 or body[:position].strip():
+        return None
+    while position != -1:
+        following = _gift_find(body, "=~", position + 1)
+        answer = body[position + 1:] if following == -1 else body[position + 1:following]
+        feedback = _gift_find(answer, "#")
+        answers.append((body[position], answer if feedback == -1 else answer[:feedback]))
+        position = following
+    return answers
+
+
+def gift_question(block, location, errors):
+    """Record of a GIFT question block, or None if it is invalid or not a multiple choice or true/false question."""
+    text = block.strip()
+    if text.startswith("::"):
+        title_end = text.find("::", 2)
+        text = text[title_end + 2:] if title_end != -1 else text
+    opening = _gift_find(text, "{")
+    closing = _gift_find(text, "}", opening + 1) if opening != -1 else -1
+    if opening == -1 or closing == -1:
+        errors.append(f"{location}: Question without answers")
+        return None
+
+    statement = GIFT_FORMAT_MARKER.sub("", text[:opening].strip())
+    after = text[closing + 1:].strip()
+    if after:  # Missing word format: the answers go in a blank of the statement
+        statement = f"{statement} _____ {after}"
+    statement = _gift_unescape(statement).strip()
+    body = text[opening + 1:closing].strip()
+
+    true_false = _gift_unescape(body.split("#")[0]).strip().upper()
+    if true_false in GIFT_TRUE_FALSE:
+        return build_question(statement, ["a", "b"], ["True", "False"], GIFT_TRUE_FALSE[true_false], location, errors)
+
+    answers = None if body.startswith("#") else _gift_answers(body)  # "#" starts a numeric question
+    if not answers or any("->" in answer for _, answer in answers):  # "->" pairs a matching question
+        errors.append(f"{location}: Only multiple choice and true/false questions are supported")
+        return None
+
+    texts, correct = [], []
+    for marker, answer in answers:
+        answer = answer.strip()
+        weight = GIFT_WEIGHT.match(answer)
+        if weight:
+            answer = answer[weight.end():]
+        if marker == "=" or (weight and float(weight.group(1)) == 100):
+            correct.append(len(texts))
+        texts.append(_gift_unescape(answer).strip())
+    if len(correct) != 1 or len(texts) == len(correct):
+        errors.append(f"{location}: Only multiple choice questions with one correct answer are supported")
+        return None
+    return build_question(statement, list(OPTION_LABELS[:len(texts)]), texts, correct[0], location, errors)
+
+
+def iter_gift_questions(text, errors):
+    block, start = [], None
+    for line_number, line in enumerate(itertools.chain(text, [""]), 1):
+        stripped = line.strip()
+        if stripped.startswith("//") or stripped.startswith("$CATEGORY:"):
+            continue
+        if stripped:
+            block.append(line.rstrip("\r\n"))
+            start = start or line_number
+        elif block:
+            question = gift_question("\n".join(block), f"Line {start}", errors)
+            if question is not None:
+                yield question
+            block, start = [], None
+
+
+register_importer(ExamImporter(
+    name="gift", extensions=(".gift",), parse=iter_gift_questions,
+    sniff=lambda head: re.search(r"\{[^{}]*[=~][^{}]*\}|\{\s*(?:T|F|TRUE|FALSE)\s*\}", head) is not None,
+))
+
+
+# Moodle Aiken: a statement, lettered options ("A. ..." or "A) ...") and "ANSWER: A"
+
+AIKEN_OPTION = re.compile(r"([A-Za-z])[.)]\s+(.*)")
+AIKEN_ANSWER = re.compile(r"ANSWER:\s*(\S*)\s*$", re.IGNORECASE)
+
+
+def iter_aiken_questions(text, errors):
+    statement, labels, texts, start = [], [], [], None
+    for line_number, line in enumerate(text, 1):
+        stripped = line.strip()
+        if not stripped:
+            continue
+        answer = AIKEN_ANSWER.match(stripped)
+        option = AIKEN_OPTION.fullmatch(stripped)
+        if answer:
+            question = build_question("\n".join(statement), labels, texts, answer.group(1), f"Line {start or line_number}",
+                                      errors)
+            if question is not None:
+                yield question
+            statement, labels, texts, start = [], [], [], None
+        elif option:
+            labels.append(option.group(1).lower())
+            texts.append(option.group(2))
+            start = start or line_number
+        elif texts:
+            errors.append(f"Line {line_number}: Expected an option or an ANSWER line")
+            statement, labels, texts, start = [stripped], [], [], line_number  # The next question starts here
+        else:
+            statement.append(stripped)
+            start = start or line_number
+    if statement or texts:
+        errors.append("Invalid format: incomplete final question")
+
+
+register_importer(ExamImporter(
+    name="aiken", extensions=(".txt",), parse=iter_aiken_questions,
+    sniff=lambda head: re.search(r"^\s*ANSWER:\s*[A-Za-z]\s*$", head, re.MULTILINE) is not None,
+))
+
+
+# JSON and JSON Lines: objects with a statement (or question), options (a list,
+# or an object by letter) and correct_option (or answer: a letter, option text or position)
+
+def json_question(item, location, errors):
+    if not isinstance(item, dict):
+        errors.append(f"{location}: Expected an object")
+        return None
+    statement = item.get("statement", item.get("question"))
+    options = item.get("options", item.get("choices")) or []
+    answer = next((item[key] for key in ("correct_option", "answer", "correct") if key in item), None)
+    if isinstance(options, dict):
+        labels = [str(label).strip().lower() for label in options]
+        texts = [str(text).strip() for text in options.values()]
+    else:
+        labels = list(OPTION_LABELS[:len(options)])
+        # Options already labelled with their letter, as in the plain text format, keep their text only
+        texts = [
+            str(text).strip().removeprefix(f"{label})").removeprefix(f"{label.upper()})").strip()
+            for label, text in zip(labels, options)
+        ]
+    return build_question(statement, labels, texts, answer, location, errors)
+
+
+def _json_array_items(text, chunk_size=JSON_CHUNK_SIZE):
+    """
+    Yields the items of a JSON array (or of the "questions" array of a JSON
+    object) as they are decoded, reading the file chunk by chunk.
+    """
+    decoder = json.JSONDecoder()
+    buffer = text.read(chunk_size).lstrip()
+    if buffer.startswith("{"):
+        document = json.loads(buffer + text.read())  # Only the array of a bare list is streamed
+        yield from document.get("questions", [])
+        return
+    if not buffer.startswith("["):
+        raise json.JSONDecodeError("Expected a list of questions", buffer, 0)
+
+    position, eof = 1, False
+    while True:
+        while True:
+            while position < len(buffer) and (buffer[position].isspace() or buffer[position] == ","):
+                position += 1
+            if position < len(buffer) or eof:
+                break
+            more = text.read(chunk_size)
+            buffer, position, eof = buffer[position:] + more, 0, not more
+        if position >= len(buffer):
+            raise json.JSONDecodeError("Unterminated list of questions", buffer, position)
+        if buffer[position] == "]":
+            return
+        try:
+            item, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            more = text.read(chunk_size)  # The item goes on in the next chunk
+            buffer, position, eof = buffer[position:] + more, 0, not more
+            continue
+        yield item
+        position = end
+
+
+def iter_json_questions(text, errors):
+    number = 0
+    try:
+        for number, item in enumerate(_json_array_items(text), 1):
+            question = json_question(item, f"Question {number}", errors)
+            if question is not None:
+                yield question
+    except json.JSONDecodeError as e:
+        errors.append(f"Invalid JSON after question {number}: {e.msg}")
+
+
+def iter_json_lines_questions(text, errors):
+    for line_number, line in enumerate(text, 1):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+        except json.JSONDecodeError as e:
+            errors.append(f"Line {line_number}: Invalid JSON: {e.msg}")
+            continue
+        question = json_question(item, f"Line {line_number}", errors)
+        if question is not None:
+            yield question
+
+
+def _sniff_json_lines(head):
+    first_line = head.lstrip().split("\n", 1)[0]
+    try:
+        item = json.loads(first_line)
+    except json.JSONDecodeError:
+        return False
+    return isinstance(item, dict) and ("statement" in item or "question" in item)
+
+
+register_importer(ExamImporter(
+    name="jsonl", extensions=(".jsonl",), parse=iter_json_lines_questions, sniff=_sniff_json_lines,
+))
+register_importer(ExamImporter(
+    name="json", extensions=(".json",), parse=iter_json_questions, sniff=lambda head: head.lstrip()[:1] in ("[", "{"),
+))
+
+
+# CSV: a header row, then one question per row. The header names the statement
+# column (statement or question), the answer column (correct_option, answer or
+# correct) and the option columns (a, b, ... or option_a, ... or option1, ...).
+
+CSV_STATEMENT_COLUMNS = ("statement", "question")
+CSV_ANSWER_COLUMNS = ("correct_option", "correct_answer", "answer", "correct")
+CSV_OPTION_COLUMN = re.compile(r"(?:option_?)?([a-z])|option_?(\d+)")
+
+
+def _csv_columns(header):
+    """(statement column, answer column, [(label, column)] of the options) of a CSV header."""
+    names = [re.sub(r"\s+", "_", name.strip().lower()) for name in header]
+    statement = next((names.index(name) for name in CSV_STATEMENT_COLUMNS if name in names), None)
+    answer = next((names.index(name) for name in CSV_ANSWER_COLUMNS if name in names), None)
+    options = []
+    for column, name in enumerate(names):
+        match = CSV_OPTION_COLUMN.fullmatch(name)
+        if match and column not in (statement, answer):
+            number = match.group(2)
+            label = match.group(1) or (OPTION_LABELS[int(number) - 1] if 0 < int(number) <= len(OPTION_LABELS) else None)
+            if label:
+                options.append((label, column))
+    return statement, answer, options
+
+
+def iter_csv_questions(text, errors):
+    lines = iter(text)
+    first_line = next(lines, "")
+    try:
+        dialect = csv.Sniffer().sniff(first_line, delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.reader(itertools.chain([first_line], lines), dialect)
+    header = next(reader, [])
+    statement_column, answer_column, option_columns = _csv_columns(header)
+    if statement_column is None or answer_column is None or not option_columns:
+        errors.append("Line 1: The CSV header needs a question, an answer and option columns")
+        return
+
+    for row in reader:
+        if not any(cell.strip() for cell in row):
+            continue
+        cells = [cell.strip() for cell in row] + [""] * (len(header) - len(row))
+        options = [(label, cells[column]) for label, column in option_columns if cells[column]]
+        question = build_question(
+            cells[statement_column], [label for label, _ in options], [text for _, text in options],
+            cells[answer_column], f"Line {reader.line_num}", errors,
+        )
+        if question is not None:
+            yield question
+
+
+def _sniff_csv(head):
+    header = [name.strip().strip('"').lower() for name in re.split(r"[,;\t]", head.split("\n", 1)[0])]
+    return len(header) > 1 and any(name in header for name in CSV_STATEMENT_COLUMNS)
+
+
+register_importer(ExamImporter(name="csv", extensions=(".csv",), parse=iter_csv_questions, sniff=_sniff_csv))
+
+
+# Plain text, the format of exam_service. It accepts anything, so it goes after every other format.
+
+register_importer(ExamImporter(
+    name="text", extensions=(".txt",), parse=iter_exam_questions, sniff=lambda head: True,
+))
@@ -0,0 +1,145 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from django.db.models import Prefetch
+from genaigrader.models import Question, QuestionOption
+
+# Number of compiled exams kept in memory; the least recently used are dropped first.
+MAX_CACHED_EXAM_PACKS = 64
+
+_packs_lock = threading.Lock()
+_packs = OrderedDict()
+# Bumped on every invalidation, so a pack compiled while its exam changed is not cached
+_generation = 0
+
+
+@dataclass(frozen=True, slots=True)
+class CompiledQuestion:
+    """
+    Read-only snapshot of a question with everything needed to ask and grade it.
+
+    `option_letters` holds (letter, option id) pairs in prompt order.
+    """
+    id: int
+    statement: str
+    question_prompt: str
+    correct_option_id: int
+    correct_option_content: str
+    correct_letter: str
+    option_letters: tuple
+
+    def option_id_for(self, letter):
+        """Returns the id of the option with the given letter, or None."""
+        if letter:
+            for option_letter, option_id in self.option_letters:
+                if option_letter == letter:
+                    return option_id
+        return None
+
+
+@dataclass(frozen=True, slots=True)
+class CompiledExam:
+    """All the questions of an exam, compiled once and shared by every evaluation of it."""
+    exam_id: int
+    questions: tuple
+
+
+def option_letter(content):
+    """Answer letter of an option such as "b) Paris": its lowercased first character."""
+    return content.strip().lower()[:1]
+
+
+def render_question_prompt(statement, option_contents):
+    """
+    Renders the question part of a prompt.
+
+    Parameters:
+    - statement: Question statement.
+    - option_contents: Option texts, already in the order they are shown.
+
+    Returns:
+    - str: The statement followed by one option per line.
+    """
+    return statement + "\n" + "".join(f"{content}\n" for content in option_contents)
+
+
+def compile_question(question):
+    """
+    Builds the CompiledQuestion of a Question. Compiled questions are returned as they are.
+
+    Uses the question's prefetched options and correct option when available.
+    """
+    if isinstance(question, CompiledQuestion):
+        return question
+
+    options = sorted(question.questionoption_set.all(), key=lambda option: option.content)
+    correct_option = question.correct_option
+    return CompiledQuestion(
+        id=question.id,
+        statement=question.statement,
+        question_prompt=render_question_prompt(question.statement, [option.content for option in options]),
+        correct_option_id=correct_option.id,
+        correct_option_content=correct_option.content,
+        correct_letter=option_letter(correct_option.content),
+        option_letters=tuple((option_letter(option.content), option.id) for option in options),
+    )
+
+
+def compile_exam(exam_id):
+    """
+    Loads an exam's questions and options in two queries and compiles them.
+
+    Returns:
+    - CompiledExam: Questions in id order, which is the order they were uploaded in.
+    """
+    questions = (
+        Question.objects.filter(exam_id=exam_id)
+        .select_related('correct_option')
+        .prefetch_related(Prefetch('questionoption_set', queryset=QuestionOption.objects.order_by('content')))
+        .order_by('id')
+    )
+    return CompiledExam(exam_id=exam_id, questions=tuple(compile_question(question) for question in questions))
+
+
+def get_exam_pack(exam):
+    """
+    Returns the compiled form of an exam, building it on first use.
+
+    The same CompiledExam is reused by every repetition, model and batch task
+    until the exam, one of its questions or one of their options changes
+    (see genaigrader.signals).
+
+    Parameters:
+    - exam: Exam instance or id.
+
+    Returns:
+    - CompiledExam
+    """
+    exam_id = getattr(exam, 'id', exam)
+    with _packs_lock:
+        pack = _packs.get(exam_id)
+        if pack is not None:
+            _packs.move_to_end(exam_id)
+            return pack
+        generation = _generation
+
+    pack = compile_exam(exam_id)
+    with _packs_lock:
+        if generation != _generation:
+            return pack
+        _packs[exam_id] = pack
+        _packs.move_to_end(exam_id)
+        while len(_packs) > MAX_CACHED_EXAM_PACKS:
+            _packs.popitem(last=False)
+    return pack
+
+
+def invalidate_exam_pack(exam_id=None):
+    """Drops the compiled form of an exam, or of every exam if no id is given."""
+    global _generation
+    with _packs_lock:
+        _generation += 1
+        if exam_id is None:
+            _packs.clear()
+        else:
+            _packs.pop(exam_id, None)
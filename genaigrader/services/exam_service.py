@@ -1,6 +1,22 @@
-from typing import List, Dict
-from ..models import Exam
-import re
+from typing import Dict, Iterable, Iterator, List, Optional
+from ..models import Exam, Question, QuestionOption
+import hashlib
+import io
+import json
+import string
+
+# An option line starts with one of these letters and a parenthesis: "a) Paris".
+# Checked with two character tests, about twice as fast as matching a regex on every line.
+OPTION_LETTERS = frozenset(string.ascii_letters)
+
+
+class ExamFormatError(ValueError):
+    """Invalid exam file. Holds every error found, one message per entry of `errors`."""
+
+    def __init__(self, errors):
+        self.errors = list(errors)
+        super().__init__("\n".join(self.errors))
+
 
 def create_exam(uploaded_file, course, user, request):
     exam_name = request.POST.get("user_exam", "").strip()
@@ -11,87 +27,178 @@ def create_exam(uploaded_file, course, user, request):
         user=user
     )  # Returns unsaved instance
 
-def process_exam_file(file_path) -> List[Dict]:
-    """Process file and validate format, returns clean data without DB interaction"""
-    questions_data = []
+
+def iter_exam_questions(lines: Iterable, errors: Optional[List[str]] = None) -> Iterator[Dict]:
+    """
+    Parses exam lines lazily, yielding each question as soon as its correct
+    option is read.
+
+    Invalid questions are not yielded: their errors are appended to `errors`
+    and parsing goes on with the next question, so that a single pass finds
+    every error of the file.
+
+    Parameters:
+    - lines: Iterable of text lines, e.g. a file opened in text mode.
+    - errors: List where the error messages are appended.
+
+    Yields:
+    - dict: {'statement', 'options', 'correct_option'} of each valid question.
+    """
+    if errors is None:
+        errors = []
     statement = []
     current_question = None
+    letters = None
+    valid = True
     state = "statement"
     line_number = 0
     has_content = False
+    question_count = 0
+
+    for line in lines:
+        line_number += 1
+        stripped_line = line.strip()
+        if not stripped_line:
+            if state == "options":
+                # Transition to correct answer
+                if len(current_question['options']) < 2:
+                    errors.append(
+                        f"Line {line_number}: Minimum 2 options required. Question: '{current_question['statement'][:30]}...'"
+                    )
+                    valid = False
+                state = "correct"
+            continue  # Blank lines are ignored elsewhere
+        has_content = True
+
+        is_option = stripped_line[1:2] == ")" and stripped_line[0] in OPTION_LETTERS
+        if state == "statement":
+            if not is_option:
+                statement.append(stripped_line)
+                continue
+            valid = bool(statement)
+            if not valid:
+                errors.append(f"Line {line_number}: Question missing statement")
+            current_question = {
+                'statement': "\n".join(statement),
+                'options': [stripped_line],
+                'correct_option': None
+            }
+            letters = {stripped_line[0].lower()}
+            state = "options"
+            statement = []
+
+        elif state == "options" and is_option:
+            current_question['options'].append(stripped_line)
+            letters.add(stripped_line[0].lower())
+
+        else:
+            # Correct answer, right after the options or after a blank line
+            correct_option = stripped_line.lower()
+            if correct_option not in letters:
+                errors.append(
+                    f"Line {line_number}: Invalid correct option '{correct_option}'. "
+                    f"Valid options: {[opt[0].lower() for opt in current_question['options']]}"
+                )
+            elif valid:
+                current_question['correct_option'] = correct_option
+                question_count += 1
+                yield current_question
+            current_question = None
+            state = "statement"
+
+    # Final file validation
+    if not has_content:
+        errors.append("File is completely empty")
+    elif state != "statement":
+        errors.append("Invalid format: incomplete final question")
+    elif not question_count and not errors:
+        errors.append("File contains no valid questions")
+
 
+def parse_exam(file, encoding="utf-8") -> List[Dict]:
+    """
+    Parses and validates an exam from a file-like object, e.g. an
+    UploadedFile, without writing it to disk.
+
+    Parameters:
+    - file: File-like object in text mode, or in binary mode to be decoded with `encoding`.
+
+    Raises:
+    - ExamFormatError: With every error of the file, if there is any.
+    """
+    errors = []
+    if isinstance(file, io.TextIOBase):
+        questions_data = list(iter_exam_questions(file, errors))
+    else:
+        text = io.TextIOWrapper(file, encoding=encoding)
+        try:
+            questions_data = list(iter_exam_questions(text, errors))
+        finally:
+            text.detach()  # Leaves the file open for its owner
+    if errors:
+        raise ExamFormatError(errors)
+    return questions_data
+
+
+def process_exam_file(file_path) -> List[Dict]:
+    """Process file and validate format, returns clean data without DB interaction"""
     with open(file_path, "r", encoding="utf-8") as f:
-        for line in f:
-            line_number += 1
-            stripped_line = line.strip()
-            if stripped_line:
-                has_content = True
-
-            if state == "statement":
-                if stripped_line and re.match(r'^[a-zA-Z]\)', stripped_line):
-                    if not statement:  # Validate that there is a statement
-                        raise ValueError(f"Line {line_number}: Question missing statement")
-                    
-                    current_question = {
-                        'statement': "\n".join(statement).strip(),
-                        'options': [stripped_line],
-                        'correct_option': None
-                    }
-                    state = "options"
-                    statement = []
-                else:
-                    if stripped_line:  # Ignore blank lines in the statement
-                        statement.append(stripped_line)
-
-            elif state == "options":
-                if not stripped_line:
-                    # Transition to correct answer
-                    if len(current_question['options']) < 2:
-                        raise ValueError(
-                            f"Line {line_number}: Minimum 2 options required. Question: '{current_question['statement'][:30]}...'"
-                        )
-                    state = "correct"
-                else:
-                    if re.match(r'^[a-zA-Z]\)', stripped_line):
-                        current_question['options'].append(stripped_line)
-                    else:
-                        # Process as correct answer
-                        correct_option = stripped_line.lower().strip()
-                        option_letters = [opt.split(')')[0].strip().lower() for opt in current_question['options']]
-                        
-                        if correct_option not in option_letters:
-                            raise ValueError(
-                                f"Line {line_number}: Invalid correct option '{correct_option}'. Valid options: {option_letters}"
-                            )
-                        
-                        current_question['correct_option'] = correct_option
-                        questions_data.append(current_question)
-                        current_question = None
-                        state = "statement"
-
-            elif state == "correct":
-                if stripped_line:
-                    correct_option = stripped_line.lower().strip()
-                    option_letters = [opt.split(')')[0].strip().lower() for opt in current_question['options']]
-                    
-                    if correct_option not in option_letters:
-                        raise ValueError(
-                            f"Line {line_number}: Invalid correct option '{correct_option}'. Valid options: {option_letters}"
-                        )
-                    
-                    current_question['correct_option'] = correct_option
-                    questions_data.append(current_question)
-                    current_question = None
-                    state = "statement"
-
-        # Final file validation
-        if not has_content:
-            raise ValueError("File is completely empty")
-        
-        if state != "statement":
-            raise ValueError("Invalid format: incomplete final question")
-        
-        if not questions_data:
-            raise ValueError("File contains no valid questions")
-
-    return questions_data
\ No newline at end of file
+        return parse_exam(f)
+
+
+def _normalized_question(statement, options, correct_option):
+    """A question as compared between uploads: whitespace collapsed and options in order."""
+    return json.dumps([
+        " ".join(statement.split()),
+        sorted(" ".join(option.split()) for option in options),
+        correct_option,
+    ])
+
+
+def exam_content_hash(questions_data) -> str:
+    """
+    Content hash of the question set of an exam: the same questions give the
+    same hash whatever their order, spacing or file format.
+
+    Parameters:
+    - questions_data: Question-data records, as consumed by persist_exam_and_questions.
+
+    Returns:
+    - str: Hex SHA-256 digest.
+    """
+    digest = hashlib.sha256()
+    questions = sorted(
+        _normalized_question(q_data['statement'], q_data['options'], q_data['correct_option'])
+        for q_data in questions_data
+    )
+    for question in questions:
+        digest.update(question.encode("utf-8"))
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
+def stored_questions_data(exam_ids) -> Dict[int, List[Dict]]:
+    """
+    Question-data records of saved exams, in two queries, e.g. to hash them
+    with exam_content_hash.
+
+    Returns:
+    - dict: List of records by exam id; exams without questions are left out.
+    """
+    questions = Question.objects.filter(exam_id__in=exam_ids).values_list(
+        'id', 'exam_id', 'statement', 'correct_option__content'
+    )
+    options = {}
+    for question_id, content in QuestionOption.objects.filter(question__exam_id__in=exam_ids).values_list(
+        'question_id', 'content'
+    ):
+        options.setdefault(question_id, []).append(content)
+
+    exams = {}
+    for question_id, exam_id, statement, correct_content in questions:
+        exams.setdefault(exam_id, []).append({
+            'statement': statement,
+            'options': options.get(question_id, []),
+            'correct_option': correct_content.split(')')[0].strip().lower() if correct_content else None,
+        })
+    return exams
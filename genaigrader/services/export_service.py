@@ -0,0 +1,105 @@
+import csv
+from django.http import StreamingHttpResponse
+from genaigrader.models import Evaluation
+
+# Rows fetched from the database at a time while exporting
+EXPORT_CHUNK_SIZE = 2000
+# Rows written to the response in each chunk
+ROWS_PER_CHUNK = 500
+# Excel only detects UTF-8 files starting with a byte order mark
+UTF8_BOM = '\ufeff'
+
+EVALUATION_HEADER = ['Course', 'Exam', 'Date', 'Model', 'Prompt', 'Grade', 'Time (s)']
+QUESTION_HEADER = [
+    'Course', 'Exam', 'Evaluation', 'Date', 'Model', 'Question', 'Answer', 'Correct answer', 'Correct'
+]
+
+
+class Echo:
+    """File-like object whose write returns the value, so csv.writer can produce rows one by one."""
+
+    def write(self, value):
+        return value
+
+
+def csv_chunks(header, rows):
+    """
+    Encodes a CSV file chunk by chunk, so it can be streamed without being
+    held in memory.
+
+    Parameters:
+    - header: Column names.
+    - rows: Iterable of rows.
+
+    Yields:
+    - bytes: The UTF-8 encoded CSV (with a byte order mark for Excel), ROWS_PER_CHUNK rows at a time.
+    """
+    writer = csv.writer(Echo(), delimiter=',', quoting=csv.QUOTE_ALL)
+    chunk = [UTF8_BOM, writer.writerow(header)]
+    for row in rows:
+        chunk.append(writer.writerow(row))
+        if len(chunk) >= ROWS_PER_CHUNK:
+            yield ''.join(chunk).encode('utf-8')
+            chunk = []
+    if chunk:
+        yield ''.join(chunk).encode('utf-8')
+
+
+def streaming_csv_response(filename, header, rows):
+    """StreamingHttpResponse downloading the rows as a CSV file."""
+    response = StreamingHttpResponse(csv_chunks(header, rows), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def _decimal(value):
+    return str(value).replace('.', ',')  # Decimal comma, as expected by the spreadsheets of the users
+
+
+def _date(value):
+    return value.strftime("%d/%m/%Y %H:%M:%S")
+
+
+def evaluation_rows(evaluations, with_course=True):
+    """
+    Export rows of finished evaluations (see EVALUATION_HEADER), read in
+    chunks of EXPORT_CHUNK_SIZE without building model instances.
+
+    Parameters:
+    - evaluations: Evaluation queryset, already ordered.
+    - with_course: If False, leaves out the course column.
+    """
+    rows = evaluations.filter(status=Evaluation.DONE).values_list(
+        'exam__course__name', 'exam__description', 'ev_date', 'model__description', 'prompt', 'grade', 'time'
+    )
+    for course, exam, date, model, prompt, grade, time in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        row = [exam, _date(date), model, prompt, _decimal(grade), _decimal(round(time, 2))]
+        yield [course] + row if with_course else row
+
+
+def question_evaluation_rows(question_evaluations):
+    """
+    Export rows of the answers of finished evaluations (see QUESTION_HEADER),
+    joined to their question, model and exam in the same query and read in
+    chunks of EXPORT_CHUNK_SIZE. Answers saved before the chosen option was
+    recorded are left out.
+
+    Parameters:
+    - question_evaluations: QuestionEvaluation queryset.
+    """
+    rows = (
+        question_evaluations.filter(evaluation__status=Evaluation.DONE, answer_recorded=True)
+        .order_by('evaluation__exam__course__name', 'evaluation__exam__description', 'evaluation_id', 'id')
+        .values_list(
+            'evaluation__exam__course__name', 'evaluation__exam__description', 'evaluation_id',
+            'evaluation__ev_date', 'evaluation__model__description', 'question__statement',
+            'question_option__content', 'question__correct_option__content',
+            'question_option_id', 'question__correct_option_id',
+        )
+    )
+    for *columns, option_id, correct_option_id in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        course, exam, evaluation_id, date, model, statement, answer, correct_answer = columns
+        correct = option_id is not None and option_id == correct_option_id
+        yield [course, exam, evaluation_id, _date(date), model, statement, answer or '', correct_answer or '',
+               'Yes' if correct else 'No']
+
@@ -1,8 +1,35 @@
+import hashlib
 import os
+import tempfile
+from django.conf import settings
+
 
 def save_uploaded_file(uploaded_file):
-    file_path = os.path.join("uploaded_files", uploaded_file.name)
-    with open(file_path, "wb") as f:
-        for chunk in uploaded_file.chunks():
-            f.write(chunk)
+    """
+    Stores a raw upload under the SHA-256 of its content, keeping its
+    extension, so that files with the same name no longer overwrite each
+    other and the same file is only stored once.
+
+    Returns:
+    - str: Path of the stored file.
+    """
+    directory = settings.UPLOADED_FILES_DIR
+    os.makedirs(directory, exist_ok=True)
+    digest = hashlib.sha256()
+    with tempfile.NamedTemporaryFile(dir=directory, suffix=".part", delete=False) as f:
+        try:
+            for chunk in uploaded_file.chunks():
+                digest.update(chunk)
+                f.write(chunk)
+        except BaseException:
+            f.close()
+            os.remove(f.name)
+            raise
+
+    extension = os.path.splitext(uploaded_file.name)[1].lower()
+    file_path = os.path.join(directory, digest.hexdigest() + extension)
+    if os.path.exists(file_path):
+        os.remove(f.name)
+    else:
+        os.replace(f.name, file_path)
     return file_path
@@ -1,26 +1,140 @@
-from collections import defaultdict
-from genaigrader.services.confidence_service import compute_averages
-
-def process_evaluations_for_graphics(evaluations):
-    model_values = defaultdict(lambda: {'grades': [], 'times': [], 'model': None})
-    for evaluation in evaluations:
-        model_desc = evaluation.model.description
-        model_values[model_desc]['grades'].append(evaluation.grade)
-        model_values[model_desc]['times'].append(evaluation.time)
-        # Store the model object (only need to do this once per model)
-        if model_values[model_desc]['model'] is None:
-            model_values[model_desc]['model'] = evaluation.model
-    return model_values
-
-def compute_model_statistics(model_values):
-    model_average_grades, _ = compute_averages(model_values, 'grades')
-    model_average_times, _ = compute_averages(model_values, 'times')
-    
-    # Create a simple mapping for sorting
-    model_map = {data['model'].description: data['model']
-                 for data in model_values.values()}
-
-    return (
-        sorted(model_average_grades, key=lambda x: model_map[x['model__description']].get_sort_key()),
-        sorted(model_average_times, key=lambda x: model_map[x['model__description']].get_sort_key())
+import numpy as np
+from django.db.models import Count, F, Q
+from genaigrader.models import Course, Evaluation, EvaluationStatistic, Model, QuestionEvaluation
+from genaigrader.services.comparison_service import course_comparisons
+from genaigrader.services.confidence_service import intervals_from_moments, merge_moments, wilson_intervals
+
+def statistics_table_model_statistics(statistics, by_course=False, models=None):
+    """
+    Grade and time averages with confidence intervals per model, with the
+    models sorted by Model.get_sort_key. They are computed from the
+    EvaluationStatistic rows (one per exam and model) instead of every
+    evaluation: the moments of the exams are merged per model, and per
+    course if by_course.
+
+    Parameters:
+    - statistics: EvaluationStatistic queryset.
+    - by_course: If True, computes them per course instead of for all the rows.
+    - models: Dict of the Model objects by id. Loaded in one query if not given.
+
+    Returns:
+    - dict: (model_averages, time_averages) by course id, or under None if not by_course.
+    """
+    rows = np.array(list(statistics.values_list(
+        'course_id', 'model_id', 'count', 'grade_mean', 'time_mean', 'grade_m2', 'time_m2'
+    )), dtype=float).reshape(-1, 7)
+    if len(rows) == 0:
+        return {}
+    model_ids = rows[:, 1].astype(np.int64)
+    courses = rows[:, 0].astype(np.int64) if by_course else np.zeros_like(model_ids)
+    groups, group_index = np.unique(np.column_stack([courses, model_ids]), axis=0, return_inverse=True)
+    counts, means, m2 = merge_moments(group_index.ravel(), rows[:, 2], rows[:, 3:5], rows[:, 5:7], len(groups))
+    lower, upper = intervals_from_moments(counts, means, m2)
+    return _chart_statistics(groups, means, lower, upper, by_course, models)
+
+def _chart_statistics(groups, means, lower, upper, by_course, models):
+    """Formats the grade and time intervals of (course id, model id) groups for the charts."""
+    if models is None:
+        models = Model.objects.in_bulk(np.unique(groups[:, 1]).tolist())
+    groups = groups.tolist()
+    statistics = {}
+    # Rows in the order of the charts: per group, models sorted by their sort key
+    for row in sorted(range(len(groups)), key=lambda row: (groups[row][0], models[groups[row][1]].get_sort_key())):
+        course_id, model_id = groups[row]
+        model_averages, time_averages = statistics.setdefault(course_id if by_course else None, ([], []))
+        for metric, averages in ((0, model_averages), (1, time_averages)):
+            averages.append({
+                'model__description': models[model_id].description,
+                'avg': round(float(means[row, metric]), 2),
+                'yMin': round(float(lower[row, metric]), 2),
+                'yMax': round(float(upper[row, metric]), 2),
+            })
+    return statistics
+
+def question_accuracy(exam):
+    """
+    How often each question of an exam was answered correctly in its
+    finished evaluations, with Wilson intervals, from one aggregate query.
+    Answers saved before the chosen option was recorded are left out.
+
+    Returns:
+    - dict: By question id, 'answers' and the 'accuracy', 'low' and 'high'
+      percentages. Questions never answered are left out.
+    """
+    rows = list(
+        QuestionEvaluation.objects.filter(
+            question__exam=exam, evaluation__status=Evaluation.DONE, answer_recorded=True
+        )
+        .values('question_id')
+        .annotate(answers=Count('id'), correct=Count('id', filter=Q(question_option=F('question__correct_option'))))
+        .order_by().values_list('question_id', 'answers', 'correct')
     )
+    if not rows:
+        return {}
+    question_ids, answers, correct = zip(*rows)
+    accuracy, lower, upper = wilson_intervals(correct, answers)
+    return {
+        question_id: {
+            'answers': answers[i],
+            'accuracy': round(float(accuracy[i]) * 100, 1),
+            'low': round(float(lower[i]) * 100, 1),
+            'high': round(float(upper[i]) * 100, 1),
+        }
+        for i, question_id in enumerate(question_ids)
+    }
+
+def analysis_statistics(user):
+    """
+    Data of the analysis dashboard: the model averages of each course of the
+    user and of all of them, from the statistics table, and the paired
+    question-level comparisons of their models (see comparison_service).
+
+    Returns:
+    - dict: 'course_data', 'overall_model_averages', 'overall_time_averages'
+      and 'overall_comparisons'.
+    """
+    courses = Course.objects.filter(user=user).values('id', 'name')
+
+    # One statistics row per exam and model, instead of every evaluation
+    statistics = EvaluationStatistic.objects.filter(user=user)
+    models = Model.objects.in_bulk(statistics.values_list('model_id', flat=True).distinct())
+    course_statistics = statistics_table_model_statistics(statistics, by_course=True, models=models)
+    overall_model_averages, overall_time_averages = (
+        statistics_table_model_statistics(statistics, models=models).get(None, ([], []))
+    )
+
+    comparisons = course_comparisons(user)
+
+    course_data = []
+    for course in courses:
+        model_averages, time_averages = course_statistics.get(course['id'], ([], []))
+        course_data.append({
+            'course': {'id': course['id'], 'name': course['name']},
+            'model_averages': model_averages,
+            'time_averages': time_averages,
+            'comparisons': comparisons.get(course['id'], []),
+        })
+    return {
+        'course_data': course_data,
+        'overall_model_averages': overall_model_averages,
+        'overall_time_averages': overall_time_averages,
+        'overall_comparisons': comparisons.get(None, []),
+    }
+
+def exam_statistics(exam):
+    """
+    Statistics of the exam details page: the model averages of the exam and
+    the accuracy of each question (see question_accuracy).
+
+    Returns:
+    - dict: 'model_averages', 'time_averages' and 'question_accuracy'.
+    """
+    model_averages, time_averages = statistics_table_model_statistics(
+        EvaluationStatistic.objects.filter(exam=exam)
+    ).get(None, ([], []))
+    return {
+        'model_averages': model_averages,
+        'time_averages': time_averages,
+        'question_accuracy': question_accuracy(exam),
+    }
+
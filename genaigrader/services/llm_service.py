@@ -1,9 +1,13 @@
+from genaigrader.services.exam_pack_service import CompiledQuestion, render_question_prompt
+
+
 def generate_prompt(question, user_prompt):
     """
     Generates a structured prompt to be sent to the language model.
 
     Parameters:
-    - question: Question instance containing the statement and options.
+    - question: CompiledQuestion, whose question part is already rendered, or
+      Question instance containing the statement and options.
     - user_prompt: Optional user-defined instruction to prepend to the prompt.
 
     Returns:
@@ -17,10 +21,12 @@ def generate_prompt(question, user_prompt):
         "Sólo debes decirme la opción, por ejemplo 'a', absolutamente nada más.\n"
     )
 
-    question_prompt_part = question.statement + "\n"
-
-    for option in question.questionoption_set.all().order_by('content'):
-        question_prompt_part += f"{option.content}\n"
+    if isinstance(question, CompiledQuestion):
+        question_prompt_part = question.question_prompt
+    else:
+        # Sorted in Python so that prefetched options don't trigger a query
+        options = sorted(question.questionoption_set.all(), key=lambda option: option.content)
+        question_prompt_part = render_question_prompt(question.statement, [option.content for option in options])
 
     prompt = user_prompt_part + question_prompt_part
 
@@ -0,0 +1,114 @@
+import hashlib
+import json
+import threading
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+from genaigrader.models import CachedResponse
+
+# How many new entries are stored between two eviction passes.
+EVICTION_INTERVAL = 100
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+_puts_since_eviction = 0
+
+
+def get_cache_stats():
+    """Returns the process-wide hit/miss counters of the response cache."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _count(hit):
+    with _stats_lock:
+        _stats['hits' if hit else 'misses'] += 1
+
+
+def make_cache_key(model, prompt, params):
+    """
+    Builds the cache key for a prompt sent to a model.
+
+    Parameters:
+    - model: Model instance. Its id, name and API URL identify it.
+    - prompt: Full prompt text.
+    - params: Dict with the decoding parameters sent along with the prompt.
+
+    Returns:
+    - str: Hex SHA-256 digest.
+    """
+    identity = {
+        'model': [model.id, model.description, model.api_url],
+        'prompt': hashlib.sha256(prompt.encode('utf-8')).hexdigest(),
+        'params': params,
+    }
+    return hashlib.sha256(json.dumps(identity, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def evict_least_recently_used(max_entries=None):
+    """
+    Deletes the least recently used entries so that at most `max_entries` remain.
+
+    Returns:
+    - int: Number of deleted entries.
+    """
+    if max_entries is None:
+        max_entries = settings.LLM_RESPONSE_CACHE_MAX_ENTRIES
+    cutoff = (CachedResponse.objects.order_by('-last_used_at', '-id')
+              .values_list('last_used_at', 'id')[max_entries:max_entries + 1])
+    if not cutoff:
+        return 0
+    last_used_at, entry_id = cutoff[0]
+    deleted, _ = CachedResponse.objects.filter(
+        Q(last_used_at__lt=last_used_at) | Q(last_used_at=last_used_at, id__lte=entry_id)
+    ).delete()
+    return deleted
+
+
+class ResponseCache:
+    """
+    Persistent cache of model answers used by a single evaluation.
+
+    Keeps its own hit/miss counters so they can be reported at the end of
+    the evaluation; the process-wide totals are available from get_cache_stats().
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, prompt, params):
+        """
+        Looks up a cached answer.
+
+        Returns:
+        - str | None: The cached answer, or None on a miss.
+        """
+        key = make_cache_key(self.model, prompt, params)
+        entry = CachedResponse.objects.filter(key=key).values_list('id', 'response').first()
+        if entry is None:
+            self.misses += 1
+            _count(hit=False)
+            return None
+
+        entry_id, response = entry
+        CachedResponse.objects.filter(id=entry_id).update(last_used_at=timezone.now(), hits=F('hits') + 1)
+        self.hits += 1
+        _count(hit=True)
+        return response
+
+    def put(self, prompt, params, response):
+        """Stores an answer, evicting old entries from time to time to bound the cache size."""
+        global _puts_since_eviction
+        CachedResponse.objects.update_or_create(
+            key=make_cache_key(self.model, prompt, params),
+            defaults={'model': self.model, 'response': response, 'last_used_at': timezone.now()},
+        )
+        with _stats_lock:
+            _puts_since_eviction += 1
+            evict = _puts_since_eviction >= EVICTION_INTERVAL
+            if evict:
+                _puts_since_eviction = 0
+        if evict:
+            evict_least_recently_used()
@@ -0,0 +1,287 @@
+import logging
+import math
+import threading
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, F, Q
+from genaigrader.llm_api import ollama_model_name
+from genaigrader.models import BatchTask
+
+# Resource kinds
+LOCAL = 'local'
+EXTERNAL = 'external'
+
+# Task orders
+QUEUE_ORDER = 'queue'  # Submission order: oldest job first, model by model
+SHORTEST_FIRST = 'sjf'  # Shortest estimated task first
+DEADLINE_ORDER = 'deadline'  # Earliest job deadline first; jobs without deadline last
+TASK_ORDERS = (QUEUE_ORDER, SHORTEST_FIRST, DEADLINE_ORDER)
+
+
+def task_resource(model, ollama_host=None):
+    """
+    Returns the resource a model runs on: the Ollama host running local
+    models (settings.OLLAMA_HOST by default), or the external endpoint
+    identified by its API URL.
+
+    Returns:
+    - tuple: (kind, key).
+    """
+    if model.is_external:
+        return EXTERNAL, model.api_url
+    return LOCAL, ollama_host or settings.OLLAMA_HOST
+
+
+class ResourceScheduler:
+    """
+    Decides which queued batch tasks can start, given what is already running.
+
+    The worker's Ollama host has a single slot: it holds one model in memory,
+    so it runs one evaluation at a time and prefers tasks of the model it ran
+    last, to avoid swapping models. Only tasks of the models pulled on it
+    (`local_models`, all if None) are taken; the others are left to workers
+    on other hosts. Each external endpoint has `external_slots` slots, so
+    evaluations of remote models run side by side with each other and with
+    the local one.
+
+    Repetitions of a pair in an adaptive job run one at a time, since each
+    one decides whether the next ones are needed.
+
+    Tasks are considered in `order` (one of TASK_ORDERS). Shortest-job-first
+    needs `estimate`, a callable returning the estimated seconds of a task
+    (see estimator_service.task_seconds).
+    """
+
+    def __init__(self, external_slots=None, order=None, estimate=None, ollama_host=None, local_models=None):
+        self.external_slots = external_slots or settings.EXTERNAL_ENDPOINT_SLOTS
+        self.order = order or settings.BATCH_TASK_ORDER
+        if self.order not in TASK_ORDERS:
+            raise ValueError(f"Unknown task order: {self.order}")
+        if self.order == SHORTEST_FIRST and estimate is None:
+            raise ValueError("Shortest-job-first scheduling needs an estimate")
+        self.estimate = estimate
+        self.ollama_host = ollama_host
+        self.local_models = local_models  # Names of the models pulled on the Ollama host
+        self.busy = Counter()  # Running tasks per resource
+        self.loaded_model = {}  # Last model started on each local resource
+        self.running_pairs = Counter()  # Running tasks per exam-model pair of adaptive jobs
+
+    def resource(self, task):
+        return task_resource(task.model, self.ollama_host)
+
+    def can_run(self, task):
+        """Whether this worker can run the task: external models always, local ones if pulled."""
+        if task.model.is_external or self.local_models is None:
+            return True
+        return ollama_model_name(task.model.description) in self.local_models
+
+    def capacity(self, resource):
+        return 1 if resource[0] == LOCAL else self.external_slots
+
+    def sort_key(self, task):
+        """Key ordering the tasks in the scheduler's order, ties broken by queue order."""
+        queue_key = (task.job_id, task.position)
+        if self.order == SHORTEST_FIRST:
+            return (self.estimate(task),) + queue_key
+        if self.order == DEADLINE_ORDER:
+            deadline = task.job.deadline
+            return (deadline is None, deadline.timestamp() if deadline else math.inf) + queue_key
+        return queue_key
+
+    @property
+    def queue_ordering(self):
+        """Database ordering of the queued tasks, so the candidates include the most urgent ones."""
+        if self.order == DEADLINE_ORDER:
+            return (F('job__deadline').asc(nulls_last=True), 'job_id', 'position')
+        return ('job_id', 'position')
+
+    @property
+    def queue_filter(self):
+        """Database filter of the queued tasks this worker can run (see can_run)."""
+        if self.local_models is None:
+            return Q()
+        names = set(self.local_models) | {f'{name}:latest' for name in self.local_models}
+        return Q(model__api_url__isnull=False, model__api_key__isnull=False) | Q(model__description__in=names)
+
+    def select(self, candidates, limit=None):
+        """
+        Picks the tasks to start now.
+
+        Parameters:
+        - candidates: Queued tasks (with their job and model loaded).
+        - limit: Maximum number of tasks to pick, e.g. the idle worker threads.
+
+        Returns:
+        - list: Tasks to start, in the order they should be started.
+        """
+        by_resource = {}
+        pairs = set(self.running_pairs)
+        for task in sorted(candidates, key=self.sort_key):
+            if not self.can_run(task):
+                continue
+            pair = _adaptive_pair(task)
+            if pair is not None:
+                if pair in pairs:
+                    continue  # Waits for the previous repetition of its pair
+                pairs.add(pair)
+            by_resource.setdefault(self.resource(task), []).append(task)
+
+        picks = []
+        for resource, tasks in by_resource.items():
+            free = self.capacity(resource) - self.busy[resource]
+            if free <= 0:
+                continue
+            if resource[0] == LOCAL:
+                loaded = self.loaded_model.get(resource)
+                same_model = [task for task in tasks if task.model_id == loaded]
+                # Keep the loaded model busy while it has work; otherwise follow the
+                # order (the queue order is model by model).
+                picks.extend((same_model or tasks)[:free])
+            else:
+                picks.extend(tasks[:free])
+
+        # Start them in order
+        picks.sort(key=self.sort_key)
+        return picks[:limit] if limit is not None else picks
+
+    def start(self, task):
+        resource = self.resource(task)
+        self.busy[resource] += 1
+        if resource[0] == LOCAL:
+            self.loaded_model[resource] = task.model_id
+        if (pair := _adaptive_pair(task)) is not None:
+            self.running_pairs[pair] += 1
+
+    def finish(self, task):
+        self.busy[self.resource(task)] -= 1
+        if (pair := _adaptive_pair(task)) is not None:
+            self.running_pairs[pair] -= 1
+            if not self.running_pairs[pair]:
+                del self.running_pairs[pair]
+
+
+def _adaptive_pair(task):
+    """The exam-model pair of a task of an adaptive job, or None."""
+    if task.job.target_half_width is None:
+        return None
+    return task.job_id, task.exam_id, task.model_id
+
+
+def queued_tasks(limit=500, ordering=('job_id', 'position'), where=Q()):
+    """
+    The first `limit` queued tasks matching `where`, by default in queue order
+    (oldest job first), annotated with the question count of their exam.
+    """
+    return list(
+        BatchTask.objects.filter(where, status=BatchTask.QUEUED)
+        .select_related('job', 'exam', 'model').annotate(question_count=Count('exam__question'))
+        .order_by(*ordering)[:limit]
+    )
+
+
+def _candidates(scheduler):
+    return queued_tasks(ordering=scheduler.queue_ordering, where=scheduler.queue_filter)
+
+
+class Heartbeat(threading.Thread):
+    """
+    Background thread calling `beat` every `interval` seconds until stopped,
+    e.g. to renew the leases of the tasks a worker is running. The first
+    beat happens after one interval.
+    """
+
+    def __init__(self, beat, interval):
+        super().__init__(name="batch-heartbeat", daemon=True)
+        self.beat = beat
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self.stopped.wait(self.interval):
+                try:
+                    self.beat()
+                except Exception:
+                    logging.exception("Batch worker heartbeat failed")
+        finally:
+            connection.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def _run_in_thread(run_task, task):
+    try:
+        run_task(task)
+    except Exception:
+        logging.exception(f"Batch task {task.id} crashed")
+    finally:
+        # Each thread has its own database connection
+        connection.close()
+
+
+def dispatch(worker, run_task, claim_task, scheduler=None, threads=None, poll_interval=2.0, once=False):
+    """
+    Runs queued batch tasks concurrently across the available resources.
+
+    Parameters:
+    - worker: Worker name recorded in the claimed tasks.
+    - run_task: Callable that runs a claimed task (in a worker thread).
+    - claim_task: Callable (task, worker) -> bool that claims a queued task.
+    - scheduler: ResourceScheduler to use. Defaults to a new one.
+    - threads: Maximum number of tasks running at once. Defaults to settings.BATCH_WORKER_THREADS.
+      With 1, tasks run in the calling thread.
+    - poll_interval: Seconds to wait before checking an empty queue again.
+    - once: If True, return as soon as the queue is empty and nothing is running.
+    """
+    scheduler = scheduler or ResourceScheduler()
+    threads = threads or settings.BATCH_WORKER_THREADS
+    if threads == 1:
+        _dispatch_sequentially(worker, run_task, claim_task, scheduler, poll_interval, once)
+        return
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=threads, thread_name_prefix="batch-task") as executor:
+        while True:
+            started = 0
+            idle_threads = threads - len(running)
+            if idle_threads > 0:
+                for task in scheduler.select(_candidates(scheduler), limit=idle_threads):
+                    if not claim_task(task, worker):
+                        continue  # Claimed by another worker in the meantime
+                    scheduler.start(task)
+                    running[executor.submit(_run_in_thread, run_task, task)] = task
+                    started += 1
+
+            if not running:
+                if once:
+                    return
+                time.sleep(poll_interval)
+                continue
+
+            # Wake up when a task finishes, or from time to time to pick up new tasks
+            done, _ = wait(list(running), timeout=0 if started else poll_interval, return_when=FIRST_COMPLETED)
+            for future in done:
+                scheduler.finish(running.pop(future))
+
+
+def _dispatch_sequentially(worker, run_task, claim_task, scheduler, poll_interval, once):
+    """Single-threaded dispatch: tasks run one after another in the calling thread."""
+    while True:
+        picks = scheduler.select(_candidates(scheduler), limit=1)
+        if not picks:
+            if once:
+                return
+            time.sleep(poll_interval)
+            continue
+        task = picks[0]
+        if claim_task(task, worker):
+            scheduler.start(task)
+            try:
+                run_task(task)
+            finally:
+                scheduler.finish(task)
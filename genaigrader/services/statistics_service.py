@@ -0,0 +1,138 @@
+import numpy as np
+from django.db import IntegrityError, transaction
+from genaigrader.models import Evaluation, EvaluationStatistic, Exam
+from genaigrader.services.confidence_service import grouped_moments
+from genaigrader.services.dashboard_cache_service import bump_data_version
+
+# Metrics kept for each (exam, model) pair: Evaluation field -> EvaluationStatistic field prefix
+METRICS = ('grade', 'time')
+
+
+def welford_add(count, mean, m2, value):
+    """
+    Adds a value to running statistics (Welford's algorithm).
+
+    Returns:
+    - tuple: Updated (count, mean, m2).
+    """
+    count += 1
+    delta = value - mean
+    mean += delta / count
+    return count, mean, m2 + delta * (value - mean)
+
+
+def welford_remove(count, mean, m2, value):
+    """
+    Removes a value previously added to running statistics; the inverse of welford_add.
+
+    Returns:
+    - tuple: Updated (count, mean, m2).
+    """
+    if count <= 1:
+        return 0, 0.0, 0.0
+    new_mean = (count * mean - value) / (count - 1)
+    m2 -= (value - mean) * (value - new_mean)
+    return count - 1, new_mean, max(m2, 0.0)  # Guard against rounding below zero
+
+
+def statistic_values(evaluation):
+    """What an evaluation contributes to the statistics: its pair and metrics, or None if it does not count."""
+    if evaluation['status'] != Evaluation.DONE:
+        return None
+    return evaluation['exam_id'], evaluation['model_id'], tuple(evaluation[metric] for metric in METRICS)
+
+
+def update_statistics(old, new):
+    """
+    Moves the contribution of an evaluation from its previous state to its new one.
+
+    Parameters:
+    - old: statistic_values of the evaluation before the change, or None.
+    - new: statistic_values of the evaluation after the change, or None.
+    """
+    if old == new:
+        return  # E.g. a checkpoint of a running evaluation
+    with transaction.atomic():
+        users = set()
+        if old is not None:
+            users.add(_apply(old, welford_remove))
+        if new is not None:
+            users.add(_apply(new, welford_add))
+        for user_id in users - {None}:
+            bump_data_version(user_id)
+
+
+def _apply(values, operation):
+    """Applies a Welford operation to the statistic of a pair; returns its user id, or None if it is gone."""
+    exam_id, model_id, metrics = values
+    statistic = _locked_statistic(exam_id, model_id, create=operation is welford_add)
+    if statistic is None:
+        return None  # Already gone, e.g. its exam is being deleted
+
+    count = statistic.count
+    for metric, value in zip(METRICS, metrics):
+        count, mean, m2 = operation(
+            statistic.count, getattr(statistic, f'{metric}_mean'), getattr(statistic, f'{metric}_m2'), value
+        )
+        setattr(statistic, f'{metric}_mean', mean)
+        setattr(statistic, f'{metric}_m2', m2)
+    statistic.count = count
+
+    if count == 0:
+        statistic.delete()
+    else:
+        statistic.save()
+    return statistic.user_id
+
+
+def _locked_statistic(exam_id, model_id, create):
+    """
+    The statistic of a pair, locked until the end of the transaction, or None.
+
+    With `create`, a missing statistic is inserted empty first; the new row
+    stays locked by this transaction. Evaluations of a new pair may finish at
+    the same time (e.g. in a batch worker), so the insert can lose the race on
+    the unique constraint: the statistic the other transaction inserted is then
+    read and locked instead.
+    """
+    statistics = EvaluationStatistic.objects.select_for_update().filter(exam_id=exam_id, model_id=model_id)
+    statistic = statistics.first()
+    if statistic is None and create:
+        exam = Exam.objects.values('course_id', 'course__user_id').get(id=exam_id)
+        try:
+            with transaction.atomic():  # Savepoint: a lost race must not roll back the caller's transaction
+                return EvaluationStatistic.objects.create(
+                    exam_id=exam_id, model_id=model_id, course_id=exam['course_id'], user_id=exam['course__user_id']
+                )
+        except IntegrityError:
+            statistic = statistics.first()
+    return statistic
+
+
+def rebuild_statistics():
+    """
+    Recomputes every statistic from the finished evaluations.
+
+    Returns:
+    - int: Number of statistic rows written.
+    """
+    rows = list(
+        Evaluation.objects.filter(status=Evaluation.DONE)
+        .values_list('exam_id', 'model_id', 'exam__course_id', 'exam__course__user_id', *METRICS)
+    )
+    with transaction.atomic():
+        EvaluationStatistic.objects.all().delete()
+        if not rows:
+            return 0
+        values = np.array(rows, dtype=float)
+        pairs, group_index = np.unique(values[:, :4].astype(np.int64), axis=0, return_inverse=True)
+        counts, means, m2 = grouped_moments(group_index.ravel(), values[:, 4:], len(pairs))
+        EvaluationStatistic.objects.bulk_create([
+            EvaluationStatistic(
+                exam_id=exam_id, model_id=model_id, course_id=course_id, user_id=user_id, count=int(counts[i]),
+                **{f'{metric}_mean': float(means[i, m]) for m, metric in enumerate(METRICS)},
+                **{f'{metric}_m2': float(m2[i, m]) for m, metric in enumerate(METRICS)},
+            )
+            for i, (exam_id, model_id, course_id, user_id) in enumerate(pairs.tolist())
+        ])
+    return len(pairs)
@@ -1,112 +1,369 @@
+import itertools
 import json
 import logging
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from django.conf import settings
 from django.db import transaction
 from django.utils import timezone
+from genaigrader.llm_api import GenerationAborted
 from genaigrader.models import Evaluation, QuestionEvaluation
+from genaigrader.services.exam_pack_service import compile_question, get_exam_pack
 from genaigrader.services.llm_service import generate_prompt
+from genaigrader.services.response_cache_service import ResponseCache
 
 # Set logging level to INFO
 logging.basicConfig(level=logging.INFO)
 
-def stream_responses(questions, user_prompt, llm, total_questions, exam):
+# Appended to the user's instruction to build the prompt stored with each evaluation.
+EVALUATION_INSTRUCTIONS = (
+    " Te voy a pasar una pregunta de test y tienes que responderme con qué opción es la correcta. "
+    "Sólo debes decirme la opción, por ejemplo 'a', absolutamente nada más.\n"
+)
+
+# Default number of answered questions between two saves of a running evaluation.
+CHECKPOINT_EVERY = 10
+
+def stream_responses(questions, user_prompt, llm, total_questions, exam, concurrency=None, ordered=True,
+                     early_stop=True, use_cache=False, checkpoint_every=CHECKPOINT_EVERY):
     """
     Streams evaluation results for each question, yielding JSON-encoded progress updates.
 
     Parameters:
-    - questions: List of Question objects to be evaluated.
+    - questions: Questions to be evaluated, preferably the CompiledQuestions of
+      get_exam_pack(exam); Question objects are compiled on the fly.
     - user_prompt: Custom instruction provided by the user.
     - llm: An instance of LlmApi, encapsulating model configuration and interaction.
     - total_questions: Total number of questions to evaluate.
     - exam: The Exam object associated with this evaluation.
+    - concurrency: Maximum number of questions sent to the model at once.
+      Defaults to the model's max_concurrency.
+    - ordered: Only used when concurrency > 1. If True, progress events are
+      emitted in question order; otherwise each one is emitted as soon as
+      its answer arrives.
+    - early_stop: If True, stop reading each model response as soon as the
+      answer letter is known.
+    - use_cache: If True, answers already in the persistent response cache
+      are reused instead of asking the model again, and new answers are stored.
+    - checkpoint_every: Number of answered questions between two saves of the
+      running evaluation. If a question fails, the answers already received
+      are kept and the evaluation can be continued with resume_evaluation.
 
     Yields:
     - str: Server-sent event JSON containing progress and evaluation details.
+      Events sent right after a checkpoint, and the last one, carry the
+      evaluation_id of the saved evaluation.
     """
-    correct_count = 0
-    total_evaluation_time = 0.0
-    question_evaluations = []  # Store question evaluations temporarily
-
     evaluation = Evaluation(
-        prompt=(
-            user_prompt +
-            " Te voy a pasar una pregunta de test y tienes que responderme con qué opción es la correcta. "
-            "Sólo debes decirme la opción, por ejemplo 'a', absolutamente nada más.\n"
-        ),
+        prompt=user_prompt + EVALUATION_INSTRUCTIONS,
         ev_date=timezone.now(),
         grade=0,
         model=llm.model_obj, 
         exam=exam,
-        time=0.0
+        time=0.0,
+        status=Evaluation.RUNNING
+    )
+    yield from _run_evaluation(
+        evaluation, questions, user_prompt, llm, total_questions, concurrency, ordered, early_stop, use_cache,
+        checkpoint_every
     )
 
-    for index, question in enumerate(questions):
-        start_time = time.monotonic()
 
-        try:
-            progress = process_question(
-                correct_count,
-                index,
-                question,
-                user_prompt,
-                llm,
-                total_questions,
-                evaluation,
-                question_evaluations
-            )
-        except Exception as e:
-            logging.error(f"Error processing question {index + 1}: {e}")
-            error_json = {
-                "error": str(e),
-                "processed_questions": index + 1,
-                "total_questions": total_questions,
-                "correct_count": correct_count
-            }
-            yield f"data: {json.dumps(error_json)}\n\n"
-            return # Terminate the evaluation if an error occurs
+def resume_evaluation(evaluation, llm, concurrency=None, ordered=True, early_stop=True, use_cache=False,
+                      checkpoint_every=CHECKPOINT_EVERY):
+    """
+    Continues an interrupted evaluation with its unanswered questions.
+
+    Questions that already have a saved QuestionEvaluation are not asked
+    again; their stored answers count towards the grade. Concurrent runs save
+    answers in completion order, so the answered questions need not be the
+    first ones of the exam.
+
+    Parameters:
+    - evaluation: Evaluation in the running state.
+    - llm: An instance of LlmApi for the evaluation's model.
+    - The remaining parameters are the same as in stream_responses.
+
+    Yields:
+    - str: Server-sent event JSON, as in stream_responses. Question numbers are
+      positions in the whole exam, and counters include the questions answered
+      before the interruption.
+
+    Raises:
+    - ValueError: If the evaluation is already finished.
+    """
+    if evaluation.status != Evaluation.RUNNING:
+        raise ValueError(f"Evaluation {evaluation.id} is already finished")
+
+    questions = get_exam_pack(evaluation.exam_id).questions
+    answered = dict(evaluation.questionevaluation_set.values_list('question_id', 'question_option_id'))
+    correct_count = sum(
+        1 for question in questions
+        if question.id in answered and answered[question.id] == question.correct_option_id
+    )
+    positions = [index for index, question in enumerate(questions) if question.id not in answered]
+    remaining = [questions[index] for index in positions]
+    logging.info(f"Resuming evaluation {evaluation.id}: {len(remaining)} of {len(questions)} questions left")
+
+    user_prompt = evaluation.prompt.removesuffix(EVALUATION_INSTRUCTIONS)
+    yield from _run_evaluation(
+        evaluation, remaining, user_prompt, llm, len(questions), concurrency, ordered, early_stop, use_cache,
+        checkpoint_every, already_processed=len(questions) - len(remaining), correct_count=correct_count,
+        positions=positions
+    )
+
+
+def _run_evaluation(evaluation, questions, user_prompt, llm, total_questions, concurrency, ordered, early_stop,
+                    use_cache, checkpoint_every, already_processed=0, correct_count=0, positions=None):
+    """
+    Asks the model the given questions, streams the progress and checkpoints `evaluation`.
+
+    `already_processed` and `correct_count` describe the questions answered
+    in earlier runs of the same evaluation, and `positions` holds the index in
+    the exam of each of the given questions (their own index by default).
+    """
+    if positions is None:
+        positions = range(len(questions))
+    if concurrency is None:
+        concurrency = getattr(llm.model_obj, 'max_concurrency', 1) or 1
+    questions = [compile_question(question) for question in questions]
+    previous_time = evaluation.time
+    total_evaluation_time = 0.0
+    question_evaluations = []  # Answers not checkpointed yet
+    cache = ResponseCache(llm.model_obj) if use_cache else None
+
+    def checkpoint(done=False):
+        _save_checkpoint(
+            evaluation, question_evaluations, correct_count, total_questions,
+            previous_time + total_evaluation_time, done
+        )
+
+    if concurrency > 1:
+        results = _process_questions_concurrently(
+            questions, user_prompt, llm, total_questions, question_evaluations, concurrency, ordered, early_stop,
+            cache
+        )
+    else:
+        results = _process_questions_sequentially(
+            questions, user_prompt, llm, total_questions, question_evaluations, early_stop, cache
+        )
 
-        end_time = time.monotonic()
-        question_time = end_time - start_time
-        total_evaluation_time += question_time
+    evaluation_start = time.monotonic()
+    processed = 0
 
-        correct_count = progress['correct_count']
-        progress['time'] = round(question_time, 2)
+    try:
+        for progress, question_time in results:
+            processed += 1
+            if concurrency > 1:
+                # Questions overlap in time, so the evaluation lasts as long as
+                # the wall clock says, not the sum of per-question times.
+                total_evaluation_time = time.monotonic() - evaluation_start
+            else:
+                total_evaluation_time += question_time
 
-        if index == len(questions) - 1:
-            progress['total_time'] = round(total_evaluation_time, 2)
+            if progress['response']['is_correct']:
+                correct_count += 1
+            progress['question_number'] = positions[progress['question_number'] - 1] + 1
+            progress['processed_questions'] = already_processed + processed
+            progress['correct_count'] = correct_count
+            progress['time'] = round(question_time, 2)
 
-        yield f"data: {json.dumps(progress)}\n\n"
+            if processed == len(questions):
+                checkpoint(done=True)
+                progress['total_time'] = round(previous_time + total_evaluation_time, 2)
+                progress['evaluation_id'] = evaluation.id
+                if cache:
+                    progress['cache_hits'] = cache.hits
+                    progress['cache_misses'] = cache.misses
+            elif processed % checkpoint_every == 0:
+                checkpoint()
+                progress['evaluation_id'] = evaluation.id  # Saved from now on, so it can be resumed
 
-    # All questions processed successfully, now save everything in a transaction
+            yield f"data: {json.dumps(progress)}\n\n"
+    except QuestionProcessingError as e:
+        logging.error(f"Error processing question {positions[e.index] + 1}: {e.cause}")
+        if question_evaluations:
+            checkpoint()
+        error_json = {
+            "error": str(e.cause),
+            "processed_questions": already_processed + processed + 1,
+            "total_questions": total_questions,
+            "correct_count": correct_count,
+            # Set when there are saved answers to resume from
+            "evaluation_id": evaluation.id,
+        }
+        yield f"data: {json.dumps(error_json)}\n\n"
+        return # Terminate the evaluation if an error occurs
+    except GeneratorExit:
+        # The client went away: keep the answers that were already paid for.
+        if question_evaluations:
+            checkpoint()
+        raise
+
+    if not questions:
+        # Every question had been answered before an interruption; only the status is missing.
+        checkpoint(done=True)
+
+
+def _save_checkpoint(evaluation, question_evaluations, correct_count, total_questions, elapsed, done):
+    """
+    Saves the evaluation with its current grade and time, and the answers in
+    `question_evaluations`, which is then emptied.
+    """
     with transaction.atomic():
         evaluation.grade = round((correct_count / total_questions * 10), 2) if total_questions > 0 else 0.0
-        evaluation.time = round(total_evaluation_time, 2)
+        evaluation.time = round(elapsed, 2)
+        evaluation.status = Evaluation.DONE if done else Evaluation.RUNNING
         evaluation.save()
 
         for q_eval in question_evaluations:
             q_eval.evaluation = evaluation
-            q_eval.save()
+        QuestionEvaluation.objects.bulk_create(question_evaluations, batch_size=settings.BULK_BATCH_SIZE)
+    question_evaluations.clear()
+
+class QuestionProcessingError(Exception):
+    """Wraps an exception raised while processing the question at `index`."""
+
+    def __init__(self, index, cause):
+        super().__init__(str(cause))
+        self.index = index
+        self.cause = cause
 
-def process_question(correct_count, index, question, user_prompt, llm, total_questions, evaluation, question_evaluations):
+
+def _process_questions_sequentially(questions, user_prompt, llm, total_questions, question_evaluations, early_stop,
+                                    cache):
     """
-    Processes a single question using the provided LlmApi instance and updates evaluation state.
+    Processes questions one after another.
+
+    Yields:
+    - tuple: (progress dict, seconds spent on the question).
+
+    Raises:
+    - QuestionProcessingError: If a question fails. No further questions are processed.
+    """
+    for index, question in enumerate(questions):
+        start_time = time.monotonic()
+        try:
+            progress = process_question(
+                0, index, question, user_prompt, llm, total_questions, None, question_evaluations,
+                early_stop=early_stop, cache=cache
+            )
+        except Exception as e:
+            raise QuestionProcessingError(index, e) from e
+        yield progress, time.monotonic() - start_time
+
+
+def _process_questions_concurrently(questions, user_prompt, llm, total_questions, question_evaluations,
+                                    concurrency, ordered, early_stop, cache):
+    """
+    Sends up to `concurrency` questions to the model at the same time.
+
+    Prompts are rendered, the cache consulted and answers graded in the
+    calling thread, so worker threads never touch the database; they only
+    wait on the model.
+
+    Yields:
+    - tuple: (progress dict, seconds the model took to answer), in question
+      order if `ordered` is True, otherwise in completion order.
+
+    Raises:
+    - QuestionProcessingError: If a question fails. Pending questions are cancelled.
+    """
+    questions = list(questions)
+    prompts = [generate_prompt(question, user_prompt) for question in questions]
+    params = answer_limits(llm.model_obj)
+    cached = {}
+    if cache:
+        for index, prompt_data in enumerate(prompts):
+            response = cache.get(prompt_data['prompt'], params)
+            if response is not None:
+                cached[index] = response
+
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="question")
+    try:
+        futures = {
+            executor.submit(_timed_answer, llm, prompt_data['prompt'], early_stop): index
+            for index, prompt_data in enumerate(prompts)
+            if index not in cached
+        }
+        # Cached answers are represented by their index, pending ones by their future.
+        if ordered:
+            pending = sorted(list(futures) + list(cached), key=lambda item: futures.get(item, item))
+        else:
+            # as_completed is consumed lazily, so each answer is emitted as soon as it arrives
+            pending = itertools.chain(cached, as_completed(futures))
+
+        for item in pending:
+            if item in cached:
+                index, response, aborted, question_time = item, cached[item], None, 0.0
+            else:
+                index = futures[item]
+                try:
+                    response, aborted, question_time = item.result()
+                except Exception as e:
+                    raise QuestionProcessingError(index, e) from e
+                if cache and response:
+                    cache.put(prompts[index]['prompt'], params, response)
+
+            progress = grade_response(
+                index, questions[index], prompts[index], response, total_questions, question_evaluations, aborted
+            )
+            progress['cached'] = index in cached
+            yield progress, question_time
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _timed_answer(llm, prompt, early_stop):
+    start_time = time.monotonic()
+    response, aborted = answer_question(llm, prompt, early_stop)
+    return response, aborted, time.monotonic() - start_time
+
+
+def answer_question(llm, prompt, early_stop=True):
+    """
+    Like get_model_answer, but a model that goes over its thinking budget or
+    question timeout leaves the question unanswered instead of failing the evaluation.
+
+    Returns:
+    - tuple: (answer letter or "", reason the answer was aborted or None).
+    """
+    try:
+        return get_model_answer(llm, prompt, early_stop), None
+    except GenerationAborted as e:
+        logging.warning(f"Question left unanswered: {e}")
+        return "", e.reason
+
+
+def get_model_answer(llm, prompt, early_stop=True):
+    """
+    Sends the prompt to the model and extracts the answer letter.
 
     Parameters:
-    - correct_count: Number of correct answers so far.
-    - index: Index of the current question.
-    - question: The Question object to be evaluated.
-    - user_prompt: Instructional prefix to influence model behavior.
-    - llm: An instance of LlmApi to generate the model response.
-    - total_questions: Total number of questions in the session.
-    - evaluation: The Evaluation database object to associate with results.
-    - question_evaluations: List to store question evaluations temporarily.
+    - llm: An instance of LlmApi.
+    - prompt: Full prompt text.
+    - early_stop: If True, the response stream is closed as soon as the first
+      non-thinking character arrives, so the model stops generating.
 
     Returns:
-    - dict: A dictionary containing processed question data and result.
+    - str: The lowercased first character of the model's answer, or "" if it gave none.
     """
-    prompt_data = generate_prompt(question, user_prompt)
-    logging.info(f"Question prompt: {prompt_data['prompt']}")
-    llm_response_list = list(llm.generate_response(prompt_data['prompt']))
+    response_stream = llm.generate_response(prompt, **answer_limits(llm.model_obj))
+
+    if early_stop:
+        try:
+            for line in response_stream:
+                if line.strip():
+                    logging.info(f"LLM response (stopped early): {line}\n")
+                    return line.strip().lower()[0]
+        finally:
+            close = getattr(response_stream, 'close', None)
+            if close:
+                close()
+        logging.info("LLM response: <empty>\n")
+        return ""
+
+    llm_response_list = list(response_stream)
     logging.info(f"LLM response: {''.join(llm_response_list)}\n")
 
     if not llm_response_list:
@@ -114,31 +371,99 @@ def process_question(correct_count, index, question, user_prompt, llm, total_que
         # is qwen3.06b: it get's stuck in an infinite loop in the thiking
         # phase and, in the end, it doesn't generate the "</thinking>" tag
         # and, therefore, it doesn't return any response.
-        response = ""
-    else:
-        response = llm_response_list[0].strip().lower()[0]
+        return ""
+    return llm_response_list[0].strip().lower()[0]
+
+
+def answer_limits(model):
+    """
+    Generation limits to send along with the prompt for the given model.
+
+    Returns:
+    - dict: Keyword arguments for LlmApi.generate_response (empty if the model has no answer limit).
+    """
+    max_answer_tokens = getattr(model, 'max_answer_tokens', None)
+    if not max_answer_tokens:
+        return {}
+    # No stop sequence is sent: the model would also stop on it inside its
+    # reasoning. The answer ends the stream after the <think> block instead
+    # (see early_stop in get_model_answer).
+    return {'max_tokens': max_answer_tokens}
+
+
+def grade_response(index, question, prompt_data, response, total_questions, question_evaluations, aborted=None):
+    """
+    Compares the model's answer with the correct option and records a QuestionEvaluation
+    with the option the model chose (None if it gave no valid answer).
+
+    Parameters:
+    - question: CompiledQuestion being graded.
+    - aborted: Reason the model's answer was cut short ('timeout', 'thinking_budget'), if it was.
 
-    is_correct = (response == question.correct_option.content.strip().lower()[0])
+    Returns:
+    - dict: Progress data for this question. "correct_count" and
+      "processed_questions" are filled in by the caller.
+    """
+    is_correct = bool(response) and response == question.correct_letter
 
     question_eval = QuestionEvaluation(
-        question=question,
-        question_option=question.correct_option
+        question_id=question.id,
+        question_option_id=question.option_id_for(response)
     )
     question_evaluations.append(question_eval)
 
-    if is_correct:
-        correct_count += 1
-
     return {
+        "question_number": index + 1,
         "processed_questions": index + 1,
         "total_questions": total_questions,
-        "correct_count": correct_count,
+        "correct_count": int(is_correct),
         "response": {
             "question_prompt": prompt_data['question_prompt'],
             "user_prompt": prompt_data['user_prompt'],
             "prompt": prompt_data['prompt'],
             "response": response,
-            "correct_option": question.correct_option.content,
+            "correct_option": question.correct_option_content,
             "is_correct": is_correct,
+            "aborted": aborted,
         }
-    }
\ No newline at end of file
+    }
+
+
+def process_question(correct_count, index, question, user_prompt, llm, total_questions, evaluation, question_evaluations,
+                     early_stop=True, cache=None):
+    """
+    Processes a single question using the provided LlmApi instance and updates evaluation state.
+
+    Parameters:
+    - correct_count: Number of correct answers so far.
+    - index: Index of the current question.
+    - question: The Question or CompiledQuestion to be evaluated.
+    - user_prompt: Instructional prefix to influence model behavior.
+    - llm: An instance of LlmApi to generate the model response.
+    - total_questions: Total number of questions in the session.
+    - evaluation: The Evaluation database object to associate with results.
+    - question_evaluations: List to store question evaluations temporarily.
+    - early_stop: If True, stop reading the model response once the answer letter is known.
+    - cache: Optional ResponseCache to read the answer from and store it in.
+
+    Returns:
+    - dict: A dictionary containing processed question data and result.
+    """
+    question = compile_question(question)
+    prompt_data = generate_prompt(question, user_prompt)
+    logging.info(f"Question prompt: {prompt_data['prompt']}")
+
+    params = answer_limits(llm.model_obj)
+    response = cache.get(prompt_data['prompt'], params) if cache else None
+    cached = response is not None
+    aborted = None
+    if not cached:
+        response, aborted = answer_question(llm, prompt_data['prompt'], early_stop)
+        # Empty answers usually mean the model got stuck; don't make that permanent.
+        if cache and response:
+            cache.put(prompt_data['prompt'], params, response)
+
+    progress = grade_response(index, question, prompt_data, response, total_questions, question_evaluations, aborted)
+    progress['cached'] = cached
+    progress['correct_count'] += correct_count
+    return progress
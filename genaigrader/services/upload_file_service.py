@@ -1,9 +1,14 @@
+import itertools
+import json
+from django.conf import settings
 from django.http import StreamingHttpResponse, HttpResponse
 from django.db import transaction
-from genaigrader.models import Question, QuestionOption
+from genaigrader.models import Exam, Question, QuestionOption
 from genaigrader.services.file_service import save_uploaded_file
-from genaigrader.services.exam_service import process_exam_file, create_exam
+from genaigrader.services.exam_service import create_exam, exam_content_hash
+from genaigrader.services.exam_import_service import import_exam
 from genaigrader.services.course_service import get_or_create_course
+from genaigrader.services.exam_pack_service import get_exam_pack
 from genaigrader.services.model_service import get_or_create_model
 from genaigrader.services.stream_service import stream_responses
 from genaigrader.llm_api import LlmApi
@@ -18,48 +23,109 @@ def validate_model(request):
 
 
 def parse_and_validate_file(uploaded_file):
-    """Save the incoming file, parse exam content, and validate formatting."""
-    path = save_uploaded_file(uploaded_file)
-    questions_data = process_exam_file(path)
-    return questions_data
+    """Parse the incoming file as it is read, in any registered exam format, and validate its formatting."""
+    return import_exam(uploaded_file, uploaded_file.name)
+
+
+def persist_exam_and_questions(uploaded_file, course, user, request, questions_data, batch_size=None, content_hash=None):
+    """
+    Atomically create an Exam and its Questions and Options in the database.
+
+    Questions and options are inserted with bulk_create and the correct options
+    set with a single bulk_update, so the number of queries depends on the
+    batch size rather than on the number of questions.
+
+    Parameters:
+    - questions_data: Parsed questions, as returned by import_exam.
+    - batch_size: Rows per INSERT/UPDATE statement. Defaults to settings.BULK_BATCH_SIZE.
+    - content_hash: exam_content_hash of the questions, if already computed.
+
+    Returns:
+    - Exam: The saved exam.
+
+    Raises:
+    - ValueError: If a question has less than 2 options or no valid correct option.
+      Nothing is saved in that case.
+    """
+    if batch_size is None:
+        batch_size = settings.BULK_BATCH_SIZE
+
+    correct_indexes = []
+    for q_data in questions_data:
+        if len(q_data['options']) < 2:
+            raise ValueError(
+                f"Question '{q_data['statement'][:30]}...' has less than 2 options"
+            )
 
+        letters = [opt_content.split(')')[0].strip().lower() for opt_content in q_data['options']]
+        if q_data['correct_option'] not in letters:
+            raise ValueError(
+                f"Question '{q_data['statement'][:30]}...' has no valid correct option"
+            )
+        # The last option with that letter wins, as it always has
+        correct_indexes.append(len(letters) - 1 - letters[::-1].index(q_data['correct_option']))
 
-def persist_exam_and_questions(uploaded_file, course, user, request, questions_data):
-    """Atomically create an Exam and its Questions and Options in the database."""
     with transaction.atomic():
         exam = create_exam(uploaded_file, course, user, request)
+        exam.content_hash = content_hash or exam_content_hash(questions_data)
         exam.save()
 
-        for q_data in questions_data:
-            if len(q_data['options']) < 2:
-                raise ValueError(
-                    f"Question '{q_data['statement'][:30]}...' has less than 2 options"
-                )
+        questions = Question.objects.bulk_create(
+            [Question(statement=q_data['statement'], exam=exam) for q_data in questions_data],
+            batch_size=batch_size
+        )
 
-            question = Question.objects.create(
-                statement=q_data['statement'],
-                exam=exam
-            )
+        options = [
+            [QuestionOption(content=opt_content, question=question) for opt_content in q_data['options']]
+            for question, q_data in zip(questions, questions_data)
+        ]
+        QuestionOption.objects.bulk_create(
+            [option for question_options in options for option in question_options],
+            batch_size=batch_size
+        )
 
-            correct_option = None
-            for opt_content in q_data['options']:
-                option = QuestionOption.objects.create(
-                    content=opt_content,
-                    question=question
-                )
-                letter = opt_content.split(')')[0].strip().lower()
-                if letter == q_data['correct_option']:
-                    correct_option = option
+        for question, question_options, correct_index in zip(questions, options, correct_indexes):
+            question.correct_option = question_options[correct_index]
+        Question.objects.bulk_update(questions, ['correct_option'], batch_size=batch_size)
 
-            if not correct_option:
-                raise ValueError(
-                    f"Question '{q_data['statement'][:30]}...' has no valid correct option"
-                )
+    return exam
 
-            question.correct_option = correct_option
-            question.save()
 
-    return exam
+def find_uploaded_exam(course, content_hash):
+    """Exam of the course with the same questions, uploaded before, or None."""
+    return Exam.objects.filter(course=course, content_hash=content_hash).order_by('id').first()
+
+
+def get_or_persist_exam(uploaded_file, course, user, request, questions_data):
+    """
+    Links a re-upload to the exam of the course with the same questions, so
+    its evaluations add to the earlier results of that exam; otherwise saves
+    a new exam (see persist_exam_and_questions).
+
+    Returns:
+    - tuple: (exam, created).
+    """
+    content_hash = exam_content_hash(questions_data)
+    exam = find_uploaded_exam(course, content_hash)
+    if exam is not None:
+        return exam, False
+    return persist_exam_and_questions(
+        uploaded_file, course, user, request, questions_data, content_hash=content_hash
+    ), True
+
+
+def reused_exam_event(exam, exam_name):
+    """
+    Server-sent event telling the user that the upload was linked to an exam
+    uploaded before, and that the exam name typed in the form was not used.
+    """
+    notice = (
+        f"This file has the same questions as the exam '{exam.description}' of the course "
+        f"'{exam.course.name}', uploaded before: the evaluation was added to that exam"
+    )
+    if exam_name and exam_name != exam.description:
+        notice += f" instead of creating '{exam_name}'"
+    return f"data: {json.dumps({'notice': notice + '.', 'exam_id': exam.id})}\n\n"
 
 
 def handle_file_upload(request):
@@ -77,21 +143,23 @@ def handle_file_upload(request):
 
         # Step 3: file parsing and validation
         questions_data = parse_and_validate_file(uploaded_file)
+        save_uploaded_file(uploaded_file)
 
-        # Step 4: persist to DB
-        exam = persist_exam_and_questions(
-            uploaded_file, course, request.user, request, questions_data
-        )
+        # Step 4: persist to DB, unless the course already has this exam
+        exam, created = get_or_persist_exam(uploaded_file, course, request.user, request, questions_data)
 
         # Step 5: stream LLM response
         user_prompt = request.POST.get('user_prompt', '')
         stream = stream_responses(
-            Question.objects.filter(exam=exam),
+            get_exam_pack(exam).questions,
             user_prompt,
             llm,
             len(questions_data),
-            exam
+            exam,
+            use_cache=request.POST.get('use_cache') == 'on'
         )
+        if not created:
+            stream = itertools.chain([reused_exam_event(exam, request.POST.get('user_exam', '').strip())], stream)
         return StreamingHttpResponse(stream, content_type='text/event-stream')
 
     except Exception as e:
@@ -0,0 +1,107 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.dispatch import receiver
+from genaigrader.models import Course, Evaluation, Exam, Model, Question, QuestionOption
+from genaigrader.services.dashboard_cache_service import bump_data_version
+from genaigrader.services.exam_pack_service import invalidate_exam_pack
+from genaigrader.services.statistics_service import statistic_values, update_statistics
+
+# Evaluation fields the statistics depend on
+STATISTIC_FIELDS = ('status', 'exam_id', 'model_id', 'grade', 'time')
+UNKNOWN = object()
+
+
+def _deleted_with(origin, models):
+    """Whether a post_delete is part of the delete of one of `models`, or of a queryset of them."""
+    return isinstance(origin, models) or getattr(origin, 'model', None) in models
+
+
+def _bump_exam_owner(exam_id):
+    user_id = Exam.objects.filter(id=exam_id).values_list('user_id', flat=True).first()
+    if user_id is not None:
+        bump_data_version(user_id)
+
+
+@receiver([post_save, post_delete], sender=Exam)
+def exam_changed(sender, instance, **kwargs):
+    invalidate_exam_pack(instance.id)
+    if kwargs['signal'] is post_delete:
+        # Once for the exam, instead of once for each of its questions and options
+        bump_data_version(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=Question)
+def question_changed(sender, instance, created=False, **kwargs):
+    if kwargs['signal'] is post_delete:
+        if not _deleted_with(kwargs.get('origin'), (Exam, Course, User)):
+            invalidate_exam_pack(instance.exam_id)
+            _bump_exam_owner(instance.exam_id)  # Its answers are deleted with it
+        return  # Otherwise the exam (or course, or user) being deleted takes care of it
+    invalidate_exam_pack(instance.exam_id)
+    if not created:
+        # The correct option may have changed, and with it the question accuracy;
+        # new questions have no answers yet.
+        bump_data_version()
+
+
+@receiver([post_save, post_delete], sender=QuestionOption)
+def question_option_changed(sender, instance, **kwargs):
+    if kwargs['signal'] is post_delete:
+        if not _deleted_with(kwargs.get('origin'), (Question, Exam, Course, User)):
+            # Options are only deleted one by one (e.g. in the admin), so the queries are affordable
+            exam_id = Question.objects.filter(id=instance.question_id).values_list('exam_id', flat=True).first()
+            invalidate_exam_pack(exam_id)
+            if exam_id is not None:  # Otherwise the question went with its correct option, and bumped itself
+                _bump_exam_owner(exam_id)  # Its answers are deleted with it
+        return  # Deleted with its question or exam, whose receivers take care of it
+    # Finding the exam would cost a query per option, which adds up when a
+    # whole exam is uploaded; options rarely change, so drop every pack instead.
+    invalidate_exam_pack()
+
+
+@receiver([post_save, post_delete], sender=Course)
+def course_changed(sender, instance, **kwargs):
+    bump_data_version(instance.user_id)  # Course names and lists are part of the analysis dashboard
+
+
+@receiver([post_save, post_delete], sender=Model)
+def model_changed(sender, instance, created=False, **kwargs):
+    if kwargs['signal'] is post_delete or not created:
+        bump_data_version()  # Model names and their order appear in every dashboard
+
+
+def _statistic_values(evaluation):
+    return statistic_values({field: getattr(evaluation, field) for field in STATISTIC_FIELDS})
+
+
+@receiver(post_init, sender=Evaluation)
+def evaluation_loaded(sender, instance, **kwargs):
+    # What the stored row contributes, so that saving it does not need to read it back
+    if instance.pk is None:
+        instance._stored_statistic_values = None
+    elif instance.get_deferred_fields() & set(STATISTIC_FIELDS):
+        instance._stored_statistic_values = UNKNOWN  # Looked up on save instead of loading the fields now
+    else:
+        instance._stored_statistic_values = _statistic_values(instance)
+
+
+@receiver(pre_save, sender=Evaluation)
+def evaluation_saving(sender, instance, raw=False, **kwargs):
+    if not raw and getattr(instance, '_stored_statistic_values', UNKNOWN) is UNKNOWN:
+        stored = Evaluation.objects.filter(pk=instance.pk).values(*STATISTIC_FIELDS).first()
+        instance._stored_statistic_values = statistic_values(stored) if stored else None
+
+
+@receiver(post_save, sender=Evaluation)
+def evaluation_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    current = _statistic_values(instance)
+    update_statistics(instance._stored_statistic_values, current)
+    instance._stored_statistic_values = current
+
+
+@receiver(post_delete, sender=Evaluation)
+def evaluation_deleted(sender, instance, **kwargs):
+    # Also sent for the evaluations deleted in cascade with their exam, model, course or user
+    update_statistics(_statistic_values(instance), None)
@@ -1,7 +1,7 @@
 import unittest
 from unittest.mock import Mock, patch
 from genaigrader.llm_api import LlmApi
-from genaigrader.views.batch_evaluations_view import validate_exam, validate_model, extract_summary
+from genaigrader.services.batch_service import extract_summary, repetitions_settled, validate_exam, validate_model
 
 
 class ValidateExamTestCase(unittest.TestCase):
@@ -31,7 +31,7 @@ class ValidateExamTestCase(unittest.TestCase):
 
 class ValidateModelTestCase(unittest.TestCase):
 
-    @patch('genaigrader.views.batch_evaluations_view.LlmApi')
+    @patch('genaigrader.services.batch_service.LlmApi')
     def test_validate_model_success(self, mock_llmapi_class):
         """Should return a valid LlmApi instance when validation passes."""
         mock_llm = Mock()
@@ -42,7 +42,7 @@ class ValidateModelTestCase(unittest.TestCase):
         result = validate_model(model)
         self.assertEqual(result, mock_llm)
 
-    @patch('genaigrader.views.batch_evaluations_view.LlmApi')
+    @patch('genaigrader.services.batch_service.LlmApi')
     def test_validate_model_failure(self, mock_llmapi_class):
         """Should raise ValueError when model validation fails."""
         mock_llm = Mock()
@@ -79,5 +79,14 @@ class ExtractSummaryTestCase(unittest.TestCase):
         self.assertIsNone(result)
 
 
+class AdaptiveRepetitionsTestCase(unittest.TestCase):
+
+    def test_repetitions_settled(self):
+        """A single grade never settles; identical grades settle; spread-out grades do not."""
+        self.assertFalse(repetitions_settled([8.0], 0.5))
+        self.assertTrue(repetitions_settled([8.0, 8.0], 0.5))
+        self.assertFalse(repetitions_settled([6.0, 8.0, 7.0], 0.5))
+
+
 if __name__ == '__main__':
     unittest.main()
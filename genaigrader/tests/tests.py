@@ -28,11 +28,68 @@ class ExamViewTest(TestCase):
         response = self.client.get(reverse("evaluate"))
         self.assertNotContains(response, "Sistemas Operativos")
 
-from genaigrader.services.confidence_service import confidence_interval
+import numpy as np
+from genaigrader.services.confidence_service import (
+    bootstrap_intervals, confidence_interval, grouped_confidence_intervals, t_quantile, wilson_intervals
+)
 
 class ConfidenceServiceTest(TestCase):
     def test_averages_two_values(self):
         data = [5,10]
         mean, cinf, csup = confidence_interval(data, 0.95)
         self.assertEqual(mean, 7.5)
-        
\ No newline at end of file
+        
+
+    def test_grouped_intervals_match_confidence_interval(self):
+        rng = np.random.default_rng(0)
+        sizes = [1, 2, 5, 30, 31, 80]
+        groups = [rng.uniform(0, 10, size=n) for n in sizes]
+        group_index = np.repeat(np.arange(len(sizes)), sizes)
+
+        counts, means, lower, upper = grouped_confidence_intervals(group_index, np.concatenate(groups), len(sizes))
+
+        self.assertEqual(counts.tolist(), sizes)
+        for i, data in enumerate(groups):
+            expected = confidence_interval(list(data))
+            self.assertTrue(np.allclose((means[i, 0], lower[i, 0], upper[i, 0]), expected))
+
+    def test_t_quantiles_match_the_tables_for_any_level(self):
+        # Published two-sided critical values
+        for confidence, df, expected in [(0.95, 1, 12.7062), (0.95, 29, 2.0452), (0.99, 5, 4.0321),
+                                         (0.90, 10, 1.8125), (0.80, 7, 1.4149), (0.999, 3, 12.9240)]:
+            self.assertAlmostEqual(t_quantile((1 + confidence) / 2, df), expected, places=4)
+        self.assertAlmostEqual(t_quantile(0.975, 10 ** 6), 1.95996, places=4)
+        self.assertAlmostEqual(t_quantile(0.025, 12), -t_quantile(0.975, 12))
+
+    def test_large_samples_use_the_t_distribution(self):
+        data = list(np.random.default_rng(1).uniform(0, 10, size=40))
+        mean, _, upper = confidence_interval(data, 0.95)
+        margin = t_quantile(0.975, 39) * np.std(data, ddof=1) / np.sqrt(40)
+        self.assertAlmostEqual(upper - mean, margin)
+
+    def test_wilson_intervals(self):
+        proportions, lower, upper = wilson_intervals([0, 8, 3], [10, 10, 0])
+        self.assertEqual(proportions[1], 0.8)
+        self.assertAlmostEqual(lower[1], 0.4902, places=4)
+        self.assertAlmostEqual(upper[1], 0.9433, places=4)
+        self.assertAlmostEqual(lower[0], 0.0)
+        self.assertGreater(upper[0], 0.0)  # Not empty for a proportion of 0
+        self.assertTrue(np.isnan(proportions[2]))
+        self.assertEqual((lower[2], upper[2]), (0.0, 1.0))
+
+    def test_bootstrap_intervals_cover_the_mean_of_each_group(self):
+        rng = np.random.default_rng(0)
+        values = np.column_stack([rng.exponential(5, 120), rng.uniform(0, 10, 120)])
+        group_index = np.repeat([0, 1, 2], [60, 50, 10])
+
+        counts, means, lower, upper = bootstrap_intervals(group_index, values, 3, resamples=500, seed=1)
+
+        _, t_means, t_lower, t_upper = grouped_confidence_intervals(group_index, values, 3)
+        self.assertEqual(counts.tolist(), [60, 50, 10])
+        self.assertTrue(np.allclose(means, t_means))
+        self.assertTrue(np.all((lower < means) & (means < upper)))
+        # Close to the t-intervals for these sample sizes
+        self.assertTrue(np.allclose(upper - lower, t_upper - t_lower, rtol=0.35))
+        repeated = bootstrap_intervals(group_index, values, 3, resamples=500, seed=1)
+        self.assertTrue(np.array_equal(repeated[2], lower))
+
@@ -1,10 +1,15 @@
+from unittest.mock import patch
+from django.core.cache import cache
 from django.test import TestCase, Client
 from django.urls import reverse
 from django.contrib.auth.models import User
-from genaigrader.models import Course, Exam, Evaluation, Model
+from genaigrader.models import Course, Exam, Evaluation, Model, Question, QuestionOption
+from genaigrader.services import graphics_service
+from genaigrader.services.dashboard_cache_service import data_etag, data_version
 
 class AnalysisViewTestWithoutDataTest(TestCase):
     def setUp(self):
+        cache.clear()  # Cached dashboards are keyed by ids that the test database reuses
         # Create a test user and log in
         self.client = Client()
         self.user = User.objects.create_user(username='testuser', password='password')
@@ -33,6 +38,7 @@ class AnalysisViewTestWithoutDataTest(TestCase):
 
 class AnalysisViewTestWithDataTest(TestCase):
     def setUp(self):
+        cache.clear()  # Cached dashboards are keyed by ids that the test database reuses
         self.client = Client()
         self.user = User.objects.create_user(username='testuser', password='password')
         self.client.login(username='testuser', password='password')
@@ -41,6 +47,7 @@ class AnalysisViewTestWithDataTest(TestCase):
         course = Course.objects.create(name='Test Course', user=self.user)
         model = Model.objects.create(description='Test Model')
         exam = Exam.objects.create(course=course, description='Test Exam', user=self.user)
+        self.exam = exam
 
         # Create evaluations
         Evaluation.objects.create(exam=exam, model=model, prompt="Test prompt 1", ev_date="2024-01-01 10:00:00", grade=8.0, time=10.0)
@@ -57,4 +64,88 @@ class AnalysisViewTestWithDataTest(TestCase):
 
         # Check that the expected model description appears in the model averages
         model_descriptions = [d['model__description'] for d in response.context['overall_model_averages']]
-        self.assertIn('Test Model', model_descriptions)
\ No newline at end of file
+        self.assertIn('Test Model', model_descriptions)
+
+    def test_statistics_are_grouped_per_course(self):
+        other_course = Course.objects.create(name='Other Course', user=self.user)
+        other_exam = Exam.objects.create(course=other_course, description='Other Exam', user=self.user)
+        model = Model.objects.get(description='Test Model')
+        Evaluation.objects.create(exam=other_exam, model=model, prompt="p", ev_date="2024-01-03 10:00:00", grade=4.0, time=30.0)
+
+        response = self.client.get(reverse('analysis'))
+
+        averages = {course['course']['name']: course['model_averages'][0]['avg'] for course in response.context['course_data']}
+        self.assertEqual(averages, {'Test Course': 8.5, 'Other Course': 4.0})
+        self.assertEqual(response.context['overall_model_averages'][0]['avg'], 7.0)
+        self.assertEqual(response.context['overall_time_averages'][0]['avg'], 17.33)
+
+    def test_dashboard_is_cached_until_the_data_changes(self):
+        with patch('genaigrader.views.analysis_view.analysis_statistics',
+                   wraps=graphics_service.analysis_statistics) as build:
+            self.client.get(reverse('analysis'))
+            self.client.get(reverse('analysis'))
+            self.assertEqual(build.call_count, 1)
+
+            Evaluation.objects.create(exam=self.exam, model=Model.objects.get(), prompt="p",
+                                      ev_date="2024-01-03 10:00:00", grade=4.0, time=30.0)
+            response = self.client.get(reverse('analysis'))
+
+        self.assertEqual(build.call_count, 2)
+        self.assertEqual(response.context['overall_model_averages'][0]['avg'], 7.0)
+
+    def test_json_variant_answers_unchanged_data_with_304(self):
+        response = self.client.get(reverse('analysis_data'))
+        etag = response['ETag']
+        self.assertEqual(response.json()['overall_model_averages'][0]['avg'], 8.5)
+
+        # Session, user and data version
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('analysis_data'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        Model.objects.filter(description='Test Model').get().delete()
+        response = self.client.get(reverse('analysis_data'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['overall_model_averages'], [])
+
+    def test_deleting_an_exam_bumps_its_owner_once(self):
+        exam = Exam.objects.create(course=self.exam.course, description='Deleted Exam', user=self.user)
+        for i in range(2):
+            question = Question.objects.create(statement=f"Question {i}?", exam=exam)
+            options = [QuestionOption.objects.create(content=f"{letter}) x", question=question) for letter in "abc"]
+            question.correct_option = options[0]
+            question.save()
+        before = data_version(self.user.id)
+        global_before = data_version(None)
+
+        exam.delete()
+
+        self.assertEqual(data_version(self.user.id), before + 1)
+        self.assertEqual(data_version(None), global_before)
+
+    def test_deleting_an_option_bumps_its_exam_owner(self):
+        question = Question.objects.create(statement="Question?", exam=self.exam)
+        option = QuestionOption.objects.create(content="b) y", question=question)
+        before = data_version(self.user.id)
+
+        option.delete()
+
+        self.assertEqual(data_version(self.user.id), before + 1)
+
+    def test_exam_statistics_of_other_users_are_not_visible(self):
+        other = User.objects.create_user(username='other', password='password')
+        self.client.login(username='other', password='password')
+        url = reverse('exam_statistics_data', args=[self.exam.id])
+
+        self.assertEqual(self.client.get(url).status_code, 404)
+        # An ETag that would match the other user's data version must not turn the 404 into a 304
+        etag = data_etag(other.id, f'exam-{self.exam.id}')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 404)
+
+
+    def test_context_includes_the_model_comparisons(self):
+        response = self.client.get(reverse('analysis'))
+
+        self.assertEqual(response.context['overall_comparisons'], [])  # A single model
+        self.assertEqual(response.context['course_data'][0]['comparisons'], [])
@@ -1,3 +1,4 @@
+from unittest.mock import patch
 from django.test import TestCase, Client
 from django.contrib.auth.models import User
 from django.urls import reverse
@@ -25,3 +26,73 @@ class DeleteModelViewTest(TestCase):
         self.assertEqual(response.json()['status'], 'error')
         self.assertIn('Permission denied', response.json()['message'])
         self.assertTrue(Model.objects.filter(id=self.model_instance.id).exists())
+
+
+class UpdateModelInvalidatesValidationCacheTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='user', password='userpass')
+        self.model_instance = Model.objects.create(
+            description='gpt', api_url='https://old.example.com/v1', api_key='old-key', user=self.user
+        )
+
+    @patch('genaigrader.views.api_views.invalidate_validation_cache')
+    def test_update_forgets_old_credentials(self, mock_invalidate):
+        self.client.login(username='user', password='userpass')
+        response = self.client.put(
+            reverse('update_model', args=[self.model_instance.id]),
+            data='description=gpt&api_url=https://new.example.com/v1&api_key=new-key',
+            content_type='application/x-www-form-urlencoded',
+        )
+        self.assertEqual(response.status_code, 200)
+        mock_invalidate.assert_called_once_with('https://old.example.com/v1', 'old-key')
+
+
+class ModelLimitsTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='user', password='userpass')
+        self.client.login(username='user', password='userpass')
+
+    def test_model_form_sets_and_clears_answer_limits(self):
+        response = self.client.post(
+            reverse('create_model'),
+            data='description=gpt&api_url=https://api.example.com/v1&api_key=key&max_answer_tokens=8'
+                 '&thinking_budget=&question_timeout=2.5',
+            content_type='application/x-www-form-urlencoded',
+        )
+        model = Model.objects.get(id=response.json()['model']['id'])
+        self.assertEqual((model.max_answer_tokens, model.thinking_budget, model.question_timeout), (8, None, 2.5))
+
+        self.client.put(
+            reverse('update_model', args=[model.id]),
+            data='description=gpt&api_url=https://api.example.com/v1&api_key=key&max_answer_tokens=',
+            content_type='application/x-www-form-urlencoded',
+        )
+        model.refresh_from_db()
+        self.assertEqual((model.max_answer_tokens, model.question_timeout), (None, 2.5))
+
+    def test_model_form_rejects_invalid_concurrency(self):
+        for value in ('0', '-2', 'two', '1.5'):
+            response = self.client.post(
+                reverse('create_model'),
+                data=f'description=gpt&api_url=https://api.example.com/v1&api_key=key&max_concurrency={value}',
+                content_type='application/x-www-form-urlencoded',
+            )
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json()['status'], 'error')
+        self.assertFalse(Model.objects.exists())
+
+        model = Model.objects.create(
+            description='gpt', api_url='https://api.example.com/v1', api_key='key', max_concurrency=3, user=self.user
+        )
+        for value in ('0', 'two'):
+            response = self.client.put(
+                reverse('update_model', args=[model.id]),
+                data=f'description=other&api_url=https://api.example.com/v1&api_key=key&max_concurrency={value}',
+                content_type='application/x-www-form-urlencoded',
+            )
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('concurrency', response.json()['message'])
+        model.refresh_from_db()
+        self.assertEqual((model.description, model.max_concurrency), ('gpt', 3))
@@ -0,0 +1,245 @@
+import io
+import json
+from datetime import timedelta
+from unittest.mock import Mock, patch
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.utils import timezone
+from genaigrader.models import BatchJob, BatchTask, Course, Evaluation, Exam, Model, Question, QuestionOption
+from genaigrader.services.batch_job_service import (
+    claim_task, renew_leases, requeue_expired_tasks, requeue_tasks_of, run_batch_task, submit_batch_job
+)
+from genaigrader.services.exam_pack_service import invalidate_exam_pack
+from genaigrader.services.scheduler_service import queued_tasks
+
+
+def claim_next_task(worker):
+    """Claims the first queued task for `worker`, as a worker without a scheduler would."""
+    return next((task for task in queued_tasks() if claim_task(task, worker)), None)
+
+
+class BatchJobTest(TestCase):
+    def setUp(self):
+        invalidate_exam_pack()
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.client = Client()
+        self.client.login(username='testuser', password='password')
+        course = Course.objects.create(name='Test Course', user=self.user)
+        self.exams = [Exam.objects.create(course=course, description=f'Exam {i}', user=self.user) for i in range(2)]
+        for exam in self.exams:
+            question = Question.objects.create(statement="Capital of France?", exam=exam)
+            question.correct_option = QuestionOption.objects.create(content="a) Paris", question=question)
+            QuestionOption.objects.create(content="b) Rome", question=question)
+            question.save()
+        self.models = [Model.objects.create(description=f'model{i}:1b') for i in range(2)]
+
+    def _llm_answering(self, mock_llmapi, answer="a"):
+        def make_llm(model, **kwargs):
+            llm = Mock()
+            llm.model_obj = model
+            llm.generate_response.side_effect = lambda prompt: iter([answer])
+            return llm
+        mock_llmapi.side_effect = make_llm
+
+    def _events(self, job):
+        return [json.loads(data) for data in job.events.order_by('id').values_list('data', flat=True)]
+
+    def test_submit_queues_one_task_per_evaluation_model_first(self):
+        job = submit_batch_job(self.user, self.exams, self.models, 2, "prompt")
+
+        tasks = list(job.tasks.order_by('position').values_list('model__description', 'exam__description', 'repetition'))
+        self.assertEqual(tasks[:3], [('model0:1b', 'Exam 0', 1), ('model0:1b', 'Exam 0', 2), ('model0:1b', 'Exam 1', 1)])
+        self.assertEqual(len(tasks), 8)
+        self.assertTrue(all(task.status == BatchTask.QUEUED for task in job.tasks.all()))
+        self.assertEqual(job.status, BatchJob.QUEUED)
+
+    @patch('genaigrader.services.batch_service.LlmApi')
+    def test_post_submits_a_job_without_running_it(self, mock_llmapi):
+        response = self.client.post('/batch-evaluations/', {
+            'exams[]': [self.exams[0].id], 'models[]': [self.models[0].id], 'repetitions': 3,
+        })
+
+        data = response.json()
+        job = BatchJob.objects.get(id=data['job_id'])
+        self.assertEqual(job.tasks.count(), 3)
+        self.assertEqual(data['events_url'], f'/batch-jobs/{job.id}/events/')
+        mock_llmapi.assert_not_called()
+
+    def test_each_task_is_claimed_once(self):
+        job = submit_batch_job(self.user, self.exams[:1], self.models[:1], 2, "")
+
+        first = claim_next_task('worker-a')
+        second = claim_next_task('worker-b')
+
+        self.assertEqual((first.position, first.worker, first.status), (0, 'worker-a', BatchTask.RUNNING))
+        self.assertEqual((second.position, second.worker), (1, 'worker-b'))
+        self.assertIsNone(claim_next_task('worker-a'))
+        job.refresh_from_db()
+        self.assertEqual(job.status, BatchJob.RUNNING)
+
+    @patch('genaigrader.services.batch_service.LlmApi')
+    def test_running_every_task_finishes_the_job(self, mock_llmapi):
+        self._llm_answering(mock_llmapi)
+        job = submit_batch_job(self.user, self.exams[:1], self.models[:1], 2, "")
+
+        while (task := claim_next_task('worker')) is not None:
+            run_batch_task(task)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, BatchJob.DONE)
+        self.assertEqual(set(job.tasks.values_list('status', flat=True)), {BatchTask.DONE})
+        self.assertEqual(
+            set(job.tasks.values_list('evaluation_id', flat=True)), set(Evaluation.objects.values_list('id', flat=True))
+        )
+        events = self._events(job)
+        self.assertEqual(events[0]['progress'].split(' - ')[0], 'Eval 1/2')
+        self.assertEqual(sum('eval_result' in event for event in events), 2)
+        self.assertEqual(events[-1], {'done': True})
+
+    @patch('genaigrader.services.batch_service.LlmApi')
+    def test_invalid_model_fails_its_task_only(self, mock_llmapi):
+        mock_llmapi.return_value.validate.side_effect = ValueError("model not found")
+        job = submit_batch_job(self.user, self.exams[:1], self.models[:1], 1, "")
+
+        run_batch_task(claim_next_task('worker'))
+
+        task = job.tasks.get()
+        self.assertEqual(task.status, BatchTask.FAILED)
+        self.assertIn("model not found", task.error)
+        self.assertEqual(BatchJob.objects.get(id=job.id).status, BatchJob.DONE)
+
+    @patch('genaigrader.services.batch_service.LlmApi')
+    def test_adaptive_job_skips_repetitions_of_settled_pairs(self, mock_llmapi):
+        self._llm_answering(mock_llmapi)
+        job = submit_batch_job(self.user, self.exams[:1], self.models[:1], 5, "", target_half_width=0.5)
+
+        while (task := claim_next_task('worker')) is not None:
+            run_batch_task(task)
+
+        statuses = list(job.tasks.order_by('position').values_list('status', flat=True))
+        self.assertEqual(statuses, [BatchTask.DONE] * 2 + [BatchTask.SKIPPED] * 3)
+        events = self._events(job)
+        self.assertEqual(next(event['adaptive']['saved'] for event in events if 'adaptive' in event), 3)
+        self.assertEqual(events[-1], {'done': True, 'repetitions_saved': 3})
+
+    def test_adaptive_jobs_cannot_use_the_response_cache(self):
+        with self.assertRaises(ValueError):
+            submit_batch_job(self.user, self.exams[:1], self.models[:1], 5, "", use_cache=True, target_half_width=0.5)
+
+        response = self.client.post('/batch-evaluations/', {
+            'exams[]': [self.exams[0].id], 'models[]': [self.models[0].id], 'repetitions': 5,
+            'target_half_width': '0.5', 'use_cache': 'on',
+        })
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(BatchJob.objects.exists())
+
+    def test_restarted_worker_requeues_its_unfinished_tasks(self):
+        submit_batch_job(self.user, self.exams[:1], self.models, 1, "")
+        claim_next_task('worker-a')
+        claim_next_task('worker-b')
+
+        self.assertEqual(requeue_tasks_of('worker-a'), 1)
+
+        self.assertEqual(claim_next_task('worker-a').position, 0)
+
+    @patch('genaigrader.services.batch_service.LlmApi')
+    def test_worker_command_runs_the_queue(self, mock_llmapi):
+        self._llm_answering(mock_llmapi)
+        job = submit_batch_job(self.user, self.exams, self.models[:1], 1, "")
+
+        call_command('run_batch_worker', '--once', '--threads', '1', '--name', 'test-worker',
+                     '--local-models', 'model0:1b', '--ollama-host', 'http://gpu-2:11434', stdout=io.StringIO())
+
+        self.assertEqual(BatchJob.objects.get(id=job.id).status, BatchJob.DONE)
+        self.assertEqual(Evaluation.objects.count(), 2)
+        self.assertEqual(mock_llmapi.call_args.kwargs, {'ollama_host': 'http://gpu-2:11434'})
+
+    def test_worker_leaves_models_not_pulled_on_its_host(self):
+        job = submit_batch_job(self.user, self.exams[:1], self.models[1:], 1, "")
+
+        call_command('run_batch_worker', '--once', '--threads', '1', '--local-models', 'model0:1b', stdout=io.StringIO())
+
+        self.assertEqual(job.tasks.get().status, BatchTask.QUEUED)
+
+    def test_expired_leases_are_requeued(self):
+        submit_batch_job(self.user, self.exams[:1], self.models, 1, "")
+        lost = claim_next_task('worker-a')
+        alive = claim_next_task('worker-b')
+        BatchTask.objects.update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(renew_leases('worker-b'), 1)
+        self.assertEqual(requeue_expired_tasks(), 1)
+
+        self.assertEqual(BatchTask.objects.get(id=lost.id).status, BatchTask.QUEUED)
+        self.assertEqual(BatchTask.objects.get(id=alive.id).worker, 'worker-b')
+
+    @patch('genaigrader.services.batch_service.LlmApi')
+    def test_worker_that_lost_its_lease_does_not_overwrite_the_new_owner(self, mock_llmapi):
+        self._llm_answering(mock_llmapi)
+        submit_batch_job(self.user, self.exams[:1], self.models[:1], 1, "")
+        stale = claim_next_task('worker-a')
+        BatchTask.objects.update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+        requeue_expired_tasks()
+        claim_next_task('worker-b')
+
+        run_batch_task(stale)
+
+        task = BatchTask.objects.get(id=stale.id)
+        self.assertEqual((task.status, task.worker), (BatchTask.RUNNING, 'worker-b'))
+        self.assertFalse(Evaluation.objects.exists())
+
+    @patch('genaigrader.services.batch_service.LlmApi')
+    def test_requeued_task_continues_its_evaluation(self, mock_llmapi):
+        self._llm_answering(mock_llmapi)
+        submit_batch_job(self.user, self.exams[:1], self.models[:1], 1, "")
+        task = claim_next_task('worker-a')
+        interrupted = Evaluation.objects.create(
+            prompt="", ev_date=timezone.now(), grade=0, time=0.0, model=self.models[0], exam=self.exams[0],
+            status=Evaluation.RUNNING
+        )
+        BatchTask.objects.filter(id=task.id).update(evaluation=interrupted)
+        requeue_tasks_of('worker-a')
+
+        run_batch_task(claim_next_task('worker-b'))
+
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.evaluation_id), (BatchTask.DONE, interrupted.id))
+        self.assertEqual(list(Evaluation.objects.values_list('id', 'status', 'grade')),
+                         [(interrupted.id, Evaluation.DONE, 10.0)])
+
+    @patch('genaigrader.services.batch_service.LlmApi')
+    def test_events_endpoint_replays_the_job_and_resumes_from_last_event(self, mock_llmapi):
+        self._llm_answering(mock_llmapi)
+        job = submit_batch_job(self.user, self.exams[:1], self.models[:1], 1, "")
+        run_batch_task(claim_next_task('worker'))
+
+        response = self.client.get(f'/batch-jobs/{job.id}/events/')
+        chunks = response.content.decode().strip().split('\n\n')
+
+        self.assertEqual(len(chunks), job.events.count())
+        self.assertEqual(chunks[-1].split('\n')[1], 'data: {"done": true}')
+        second_id = int(chunks[1].split('\n')[0].removeprefix('id: '))
+
+        response = self.client.get(f'/batch-jobs/{job.id}/events/', HTTP_LAST_EVENT_ID=str(second_id))
+        self.assertEqual(len(response.content.decode().strip().split('\n\n')), len(chunks) - 2)
+        last_id = chunks[-1].split('\n')[0].removeprefix('id: ')
+        self.assertEqual(self.client.get(f'/batch-jobs/{job.id}/events/?after={last_id}').content, b'')
+
+    def test_malformed_numbers_are_rejected(self):
+        for field, value in (('repetitions', 'three'), ('target_half_width', '0,5')):
+            response = self.client.post('/batch-evaluations/', {
+                'exams[]': [self.exams[0].id], 'models[]': [self.models[0].id], field: value,
+            })
+
+            self.assertEqual(response.status_code, 400)
+            self.assertIn(repr(value), response.json()['message'])
+        self.assertFalse(BatchJob.objects.exists())
+
+    def test_jobs_of_other_users_are_not_visible(self):
+        other = User.objects.create_user(username='other', password='password')
+        job = submit_batch_job(other, self.exams[:1], self.models[:1], 1, "")
+
+        self.assertEqual(self.client.get(f'/batch-jobs/{job.id}/').status_code, 404)
+        self.assertEqual(self.client.get(f'/batch-jobs/{job.id}/events/').status_code, 404)
@@ -0,0 +1,114 @@
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from genaigrader.models import Course, Evaluation, Exam, Model, Question, QuestionEvaluation, QuestionOption
+from genaigrader.services.comparison_service import (
+    bootstrap_differences, correctness_matrix, course_comparisons, holm_adjust, mcnemar_tests
+)
+
+
+def answer_rows(*models):
+    """Rows of answer_rows for models given as lists of per-question correctness."""
+    return np.array([
+        (1, model_id, question, correct)
+        for model_id, answers in enumerate(models) for question, correct in enumerate(answers)
+    ], dtype=np.int64)
+
+
+class ComparisonTest(TestCase):
+    def test_exact_mcnemar_with_few_discordant_questions(self):
+        # A alone right on 10 questions, B alone on 2, both right on 8
+        a = [1] * 10 + [0] * 2 + [1] * 8
+        b = [0] * 10 + [1] * 2 + [1] * 8
+
+        only_a, only_b, shared, p_values = mcnemar_tests(correctness_matrix(answer_rows(a, b)))
+
+        self.assertEqual((only_a[0, 1], only_b[0, 1], shared[0, 1]), (10, 2, 20))
+        self.assertAlmostEqual(p_values[0, 1], 2 * (1 + 12 + 66) / 2 ** 12)
+        self.assertAlmostEqual(p_values[1, 0], p_values[0, 1])
+
+    def test_chi_square_mcnemar_with_many_discordant_questions(self):
+        a = [1] * 40 + [0] * 20
+        b = [0] * 40 + [1] * 20
+
+        _, _, _, p_values = mcnemar_tests(correctness_matrix(answer_rows(a, b)))
+
+        self.assertAlmostEqual(p_values[0, 1], 0.014171, places=5)  # (|40 - 20| - 1)^2 / 60 = 6.02
+
+    def test_repetitions_count_as_expected_discordant_answers(self):
+        # Model 0 answered twice: once right and once wrong on the only question
+        rows = np.array([(1, 0, 0, 1), (1, 0, 0, 0), (1, 1, 0, 0)])
+
+        only_a, only_b, _, _ = mcnemar_tests(correctness_matrix(rows))
+
+        self.assertEqual((only_a[0, 1], only_b[0, 1]), (0.5, 0.0))
+
+    def test_bootstrap_compares_every_pair_on_their_shared_questions(self):
+        rng = np.random.default_rng(0)
+        strong, weak = (rng.random(300) < 0.9).astype(int), (rng.random(300) < 0.5).astype(int)
+        rows = answer_rows(strong, weak, strong)
+        rows = np.vstack([rows, [(1, 3, 1000, 1)]])  # A model sharing no question
+
+        differences, lower, upper, p_values = bootstrap_differences(correctness_matrix(rows), resamples=500)
+
+        self.assertAlmostEqual(differences[0, 1], strong.mean() - weak.mean())
+        self.assertTrue(lower[0, 1] > 0 and p_values[0, 1] < 0.01)
+        self.assertEqual((differences[0, 2], lower[0, 2], upper[0, 2], p_values[0, 2]), (0, 0, 0, 1))
+        self.assertTrue(np.isnan(differences[0, 3]) and np.isnan(p_values[0, 3]))
+        repeated = bootstrap_differences(correctness_matrix(rows), resamples=500)
+        self.assertTrue(np.array_equal(repeated[1], lower, equal_nan=True))
+
+    def test_holm_adjustment(self):
+        self.assertTrue(np.allclose(holm_adjust([0.01, 0.04, 0.03]), [0.03, 0.06, 0.06]))
+
+
+class CourseComparisonTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='password')
+        course = Course.objects.create(name='Course', user=self.user)
+        exam = Exam.objects.create(description='Exam', course=course, user=self.user)
+        self.course = course
+        self.questions = []
+        for i in range(30):
+            question = Question.objects.create(statement=f"Question {i}", exam=exam)
+            question.correct_option = QuestionOption.objects.create(content="a) right", question=question)
+            question.save()
+            QuestionOption.objects.create(content="b) wrong", question=question)
+            self.questions.append(question)
+        strong = Model.objects.create(description='strong:7b')
+        weak = Model.objects.create(description='weak:1b')
+        for model, right in ((strong, 28), (weak, 10)):
+            evaluation = Evaluation.objects.create(
+                prompt='', ev_date=timezone.now(), grade=right / 3, time=1.0, model=model, exam=exam
+            )
+            QuestionEvaluation.objects.bulk_create([
+                QuestionEvaluation(
+                    evaluation=evaluation, question=question,
+                    question_option=question.correct_option if i < right else question.questionoption_set.last()
+                )
+                for i, question in enumerate(self.questions)
+            ])
+
+    def test_models_of_each_course_are_compared(self):
+        comparisons = course_comparisons(self.user)
+
+        self.assertEqual(comparisons[self.course.id], comparisons[None])
+        comparison = comparisons[None][0]
+        self.assertEqual((comparison['model_a'], comparison['model_b']), ('strong:7b', 'weak:1b'))
+        self.assertEqual((comparison['questions'], comparison['accuracy_a'], comparison['accuracy_b']), (30, 93.3, 33.3))
+        self.assertEqual((comparison['only_a'], comparison['only_b']), (18.0, 0.0))
+        self.assertTrue(comparison['significant'])
+        self.assertLess(comparison['lower'], comparison['difference'])
+
+    def test_analysis_page_shows_the_comparisons(self):
+        cache.clear()
+        self.client.login(username='testuser', password='password')
+
+        response = self.client.get(reverse('analysis'))
+
+        self.assertContains(response, 'Paired model comparisons', count=2)  # The course and all courses
+        self.assertContains(response, '<tr class="significant">', count=2)
+
@@ -0,0 +1,83 @@
+from django.contrib.auth.models import User
+from django.test import Client, TestCase
+from django.utils import timezone
+from genaigrader.models import Course, Evaluation, Exam, Model, Question, QuestionEvaluation, QuestionOption
+from genaigrader.services.estimator_service import estimate_batch, invalidate_latency_model, load_latency_model
+from genaigrader.services.exam_pack_service import invalidate_exam_pack
+
+
+class EstimatorTest(TestCase):
+    def setUp(self):
+        invalidate_exam_pack()
+        invalidate_latency_model()
+        self.user = User.objects.create_user(username='testuser', password='password')
+        course = Course.objects.create(name='Test Course', user=self.user)
+        self.exam = Exam.objects.create(course=course, description='Exam', user=self.user)
+        self.questions = []
+        for i in range(4):
+            question = Question.objects.create(statement=f"Question {i}?", exam=self.exam)
+            question.correct_option = QuestionOption.objects.create(content="a) Yes", question=question)
+            QuestionOption.objects.create(content="b) No", question=question)
+            question.save()
+            self.questions.append(question)
+        self.local = Model.objects.create(description='local:1b')
+        self.other_local = Model.objects.create(description='other:1b')
+        self.remote = Model.objects.create(
+            description='remote', api_url='https://api.example.com/v1', api_key='key', user=self.user
+        )
+
+    def _evaluation(self, model, seconds, answered=4, status=Evaluation.DONE):
+        evaluation = Evaluation.objects.create(
+            prompt='', ev_date=timezone.now(), grade=10, time=seconds, model=model, exam=self.exam, status=status
+        )
+        QuestionEvaluation.objects.bulk_create([
+            QuestionEvaluation(evaluation=evaluation, question=question) for question in self.questions[:answered]
+        ])
+
+    def test_latency_is_per_question_per_model(self):
+        self._evaluation(self.local, 8)  # 2 s/question
+        self._evaluation(self.local, 16)  # 4 s/question
+        self._evaluation(self.local, 4, answered=1)  # 4 s/question
+        self._evaluation(self.local, 100, status=Evaluation.RUNNING)  # Ignored
+
+        with self.assertNumQueries(1):
+            latency_model = load_latency_model()
+
+        stats, basis = latency_model.stats_for(self.local.id)
+        self.assertEqual((stats.evaluations, basis), (3, 'history'))
+        self.assertAlmostEqual(stats.mean, 10 / 3)
+        self.assertAlmostEqual(stats.std, 1.1547, places=4)
+
+    def test_models_without_history_use_all_models(self):
+        self._evaluation(self.local, 8)
+        latency_model = load_latency_model()
+
+        self.assertEqual(latency_model.estimate(self.other_local.id, 10)['basis'], 'global')
+        self.assertEqual(latency_model.estimate(self.other_local.id, 10)['seconds'], 20)
+
+    def test_batch_estimate_spreads_work_over_resources(self):
+        self._evaluation(self.local, 8)
+        self._evaluation(self.remote, 40)
+        latency_model = load_latency_model()
+
+        estimate = estimate_batch([self.exam], [self.local, self.remote], 2, latency_model=latency_model,
+                                  external_slots=2)
+
+        self.assertEqual(estimate['evaluations'], 4)
+        self.assertEqual(estimate['total']['seconds'], 96)  # 2 x 8 s local + 2 x 40 s remote
+        self.assertEqual(estimate['wall']['seconds'], 40)  # The two remote repetitions run together
+        self.assertGreater(estimate['prompt_tokens'], 0)
+
+    def test_estimate_view(self):
+        self._evaluation(self.local, 8)
+        client = Client()
+        client.login(username='testuser', password='password')
+
+        response = client.post('/batch-evaluations/estimate/', {
+            'exams[]': [self.exam.id], 'models[]': [self.local.id], 'repetitions': 3,
+        })
+
+        data = response.json()
+        self.assertEqual(data['total']['seconds'], 24)
+        self.assertEqual(data['tasks'][0]['basis'], 'history')
+        self.assertEqual(data['unknown_evaluations'], 0)
@@ -1,9 +1,19 @@
+import io
+import json
+import os
+import tempfile
 from django.test import TestCase
 
 from django.core.files.uploadedfile import SimpleUploadedFile
 from unittest.mock import patch
-from genaigrader.models import Course, Exam, Question
-from genaigrader.services.exam_service import process_exam_file
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from genaigrader.models import Course, Exam, Question, QuestionOption
+from genaigrader.services.exam_service import (
+    ExamFormatError, exam_content_hash, iter_exam_questions, parse_exam, process_exam_file, stored_questions_data
+)
+from genaigrader.services.file_service import save_uploaded_file
+from genaigrader.services.upload_file_service import persist_exam_and_questions
 from genaigrader.views.evaluate_views import upload_file
 from django.test.client import RequestFactory
 from django.contrib.auth.models import User
@@ -47,10 +57,21 @@ d) None of the above
 d)
 """
 
+def use_temporary_upload_dir(test_case):
+    """Stores the uploads of a test in a temporary directory."""
+    directory = tempfile.TemporaryDirectory()
+    test_case.addCleanup(directory.cleanup)
+    override = test_case.settings(UPLOADED_FILES_DIR=directory.name)
+    override.enable()
+    test_case.addCleanup(override.disable)
+    return directory.name
+
+
 class UploadFileTestCase(TestCase):
     def setUp(self):
         self.factory = RequestFactory()
         self.user = self._create_user()
+        self.upload_dir = use_temporary_upload_dir(self)
 
     def _create_user(self):
         return User.objects.create_user(username="testuser", password="password")
@@ -105,6 +126,36 @@ class UploadFileTestCase(TestCase):
         self.assertEqual(Exam.objects.count(), 1)
         self.assertEqual(Question.objects.count(), 1)
 
+    def test_reupload_to_the_same_course_reuses_the_exam(self):
+        course = Course.objects.create(name="Test Course", user=self.user)
+        reordered = VALID_EXAM_FILE_CONTENT.replace("a) A special file.\n", "") + "\n"
+        reordered = reordered.replace("What's the PATH?\n", "What's the PATH?\na) A special file.\n")
+
+        for content, exam_name in ((VALID_EXAM_FILE_CONTENT, "First"), (reordered, "Second")):
+            request = self.factory.post(
+                "/upload_file/", {"course_id": course.id, "model": "Test Model", "user_exam": exam_name}
+            )
+            request.FILES["file"] = SimpleUploadedFile("renamed.txt", content.encode())
+            request.user = self.user
+            response = upload_file(request)
+            self.assertEqual(response.status_code, 200)
+
+        notice = json.loads(next(iter(response.streaming_content)).decode().removeprefix("data: "))
+        self.assertEqual(notice["exam_id"], Exam.objects.get().id)
+        self.assertIn("'First' of the course 'Test Course'", notice["notice"])
+        self.assertIn("instead of creating 'Second'", notice["notice"])
+        self.assertEqual(Exam.objects.count(), 1)
+        self.assertEqual(Question.objects.count(), 1)
+        self.assertEqual(len(os.listdir(self.upload_dir)), 2)
+
+    def test_raw_uploads_are_stored_by_content(self):
+        first = save_uploaded_file(SimpleUploadedFile("exam.TXT", b"content"))
+        second = save_uploaded_file(SimpleUploadedFile("other.txt", b"content"))
+
+        self.assertEqual(first, second)
+        self.assertEqual(os.path.basename(first), "ed7002b439e9ac845f22357d822bac1444730fbdb6016d3ec9432297b9ec9f73.txt")
+        self.assertEqual(os.listdir(self.upload_dir), [os.path.basename(first)])
+
     def __test_updload_file_invalid_exam_file(self, file_content):
         """This test case checks the behavior when an invalid exam file is uploaded.
         It should return a 400 status code and not create any exam or questions."""
@@ -151,4 +202,98 @@ class TestExamService(TestCase):
         with self.assertRaises(ValueError):
             process_exam_file(file_path)
 
+    def test_parse_exam_reads_binary_file_objects(self):
+        questions = parse_exam(SimpleUploadedFile("exam.txt", VALID_EXAM_FILE_CONTENT.encode()))
+
+        self.assertEqual(questions, [{
+            'statement': "What's the PATH?",
+            'options': [
+                "a) A special file.",
+                "b) A file that contains the path to a directory.",
+                "c) A file that contains the path to a file.",
+                "d) An environment variable.",
+            ],
+            'correct_option': "a",
+        }])
+
+    def test_every_error_is_reported_with_its_line(self):
+        content = "a) No statement\nb) two\n\na\n\nOnly one option?\na) one\n\na\n\nBad answer?\na) x\nb) y\nz\n\nFine?\na) x\nb) y\nb\n"
+
+        with self.assertRaises(ExamFormatError) as context:
+            parse_exam(io.StringIO(content))
+
+        self.assertEqual(context.exception.errors, [
+            "Line 1: Question missing statement",
+            "Line 8: Minimum 2 options required. Question: 'Only one option?...'",
+            "Line 14: Invalid correct option 'z'. Valid options: ['a', 'b']",
+        ])
+
+    def test_content_hash_ignores_question_order_and_spacing(self):
+        questions = parse_exam(io.StringIO("First?\na) x\nb) y\na\n\nSecond?\na) x\nb) y\nb\n"))
+        same = parse_exam(io.StringIO("Second?\nb)   y\na) x\n\nb\n\n  First?\na) x\nb) y\na\n"))
+        other = parse_exam(io.StringIO("First?\na) x\nb) y\nb\n\nSecond?\na) x\nb) y\nb\n"))
+
+        self.assertEqual(exam_content_hash(questions), exam_content_hash(same))
+        self.assertNotEqual(exam_content_hash(questions), exam_content_hash(other))
+
+    def test_questions_are_yielded_as_they_are_read(self):
+        def lines():
+            yield from ["First?\n", "a) x\n", "b) y\n", "a\n"]
+            raise AssertionError("Read past the first question")
 
+        self.assertEqual(next(iter_exam_questions(lines()))['statement'], "First?")
+
+
+class PersistExamTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="password")
+        self.course = Course.objects.create(name="Test Course", user=self.user)
+        self.request = RequestFactory().post("/upload_file/", {"user_exam": "Bulk exam"})
+
+    def _questions_data(self, count):
+        return [
+            {
+                'statement': f"Question {i}",
+                'options': ["a) one", "b) two", "c) three"],
+                'correct_option': "abc"[i % 3],
+            }
+            for i in range(count)
+        ]
+
+    def _persist(self, questions_data, batch_size=None):
+        uploaded_file = SimpleUploadedFile("exam.txt", b"")
+        with CaptureQueriesContext(connection) as queries:
+            exam = persist_exam_and_questions(
+                uploaded_file, self.course, self.user, self.request, questions_data, batch_size=batch_size
+            )
+        return exam, len(queries)
+
+    def test_questions_and_correct_options_are_saved(self):
+        exam, _ = self._persist(self._questions_data(7), batch_size=3)
+
+        questions = Question.objects.filter(exam=exam).select_related('correct_option').order_by('id')
+        self.assertEqual([q.statement for q in questions], [f"Question {i}" for i in range(7)])
+        self.assertEqual([q.correct_option.content[0] for q in questions], list("abcabca"))
+        self.assertTrue(all(q.correct_option.question_id == q.id for q in questions))
+        self.assertEqual(QuestionOption.objects.filter(question__exam=exam).count(), 21)
+
+    def test_saved_exams_hash_like_their_upload(self):
+        questions_data = self._questions_data(5)
+        exam, _ = self._persist(questions_data)
+
+        self.assertEqual(exam.content_hash, exam_content_hash(questions_data))
+        self.assertEqual(exam_content_hash(stored_questions_data([exam.id])[exam.id]), exam.content_hash)
+
+    def test_query_count_does_not_grow_with_the_number_of_questions(self):
+        _, small = self._persist(self._questions_data(10), batch_size=1000)
+        _, large = self._persist(self._questions_data(100), batch_size=1000)
+
+        self.assertEqual(small, large)
+
+    def test_invalid_question_saves_nothing(self):
+        questions_data = self._questions_data(3)
+        questions_data[2]['correct_option'] = "z"
+
+        with self.assertRaises(ValueError):
+            self._persist(questions_data)
+        self.assertEqual(Exam.objects.count(), 0)
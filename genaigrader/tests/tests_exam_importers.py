@@ -0,0 +1,125 @@
+import io
+import json
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+from django.test.client import RequestFactory
+from genaigrader.models import Question
+from genaigrader.services.exam_import_service import IMPORTERS, _json_array_items, detect_importer, import_exam
+from genaigrader.services.exam_service import ExamFormatError
+from genaigrader.tests.tests_exam_files import use_temporary_upload_dir
+from genaigrader.views.evaluate_views import upload_file
+
+GIFT_BANK = """// Geography
+$CATEGORY: geography
+
+::Capital:: Capital of \\{France\\}? {
+~Rome # No
+=Paris
+~%50%Lyon
+}
+
+The Seine flows through Paris.{T}
+
+How many regions? {#13}
+"""
+
+AIKEN_BANK = """Capital of France?
+A. Rome
+B) Paris
+ANSWER: B
+"""
+
+PARIS = {'statement': "Capital of France?", 'options': ["a) Rome", "b) Paris"], 'correct_option': "b"}
+
+
+def _import(content, filename):
+    return import_exam(SimpleUploadedFile(filename, content.encode()), filename)
+
+
+class ExamImporterTest(TestCase):
+    def test_format_is_picked_by_extension_or_content(self):
+        def detected(content, filename):
+            return detect_importer(filename, io.StringIO(content)).name
+
+        self.assertEqual(detected(AIKEN_BANK, "bank.gift"), "gift")
+        self.assertEqual(detected(AIKEN_BANK, "bank.txt"), "aiken")
+        self.assertEqual(detected("Capital?\na) Rome\nb) Paris\n\nb\n", "exam.txt"), "text")
+        self.assertEqual(detected(GIFT_BANK, "bank"), "gift")
+        self.assertEqual(detected('[{"question": "Q"}]', ""), "json")
+        self.assertEqual(detected('{"question": "Q"}\n{"question": "R"}\n', "bank.dat"), "jsonl")
+        self.assertEqual(detected("question;a;b;answer\n", "export"), "csv")
+        self.assertEqual(list(IMPORTERS)[-1], "text")
+
+    def test_gift_questions_and_errors(self):
+        with self.assertRaises(ExamFormatError) as context:
+            _import(GIFT_BANK, "bank.gift")
+        self.assertEqual(context.exception.errors, ["Line 12: Only multiple choice and true/false questions are supported"])
+
+        questions = _import(GIFT_BANK.rsplit("\n\n", 1)[0], "bank.gift")
+        self.assertEqual(questions, [
+            {'statement': "Capital of {France}?", 'options': ["a) Rome", "b) Paris", "c) Lyon"], 'correct_option': "b"},
+            {'statement': "The Seine flows through Paris.", 'options': ["a) True", "b) False"], 'correct_option': "a"},
+        ])
+
+    def test_aiken(self):
+        self.assertEqual(_import(AIKEN_BANK + "\n" + AIKEN_BANK, "bank.txt"), [PARIS, PARIS])
+
+    def test_json_list_object_and_lines(self):
+        records = [
+            {"question": "Capital of France?", "options": ["Rome", "Paris"], "answer": "b"},
+            {"statement": "Capital of France?", "options": {"A": "Rome", "B": "Paris"}, "correct_option": "Paris"},
+            {"question": "Capital of France?", "options": ["a) Rome", "b) Paris"], "answer": 1},
+        ]
+
+        self.assertEqual(_import(json.dumps(records), "bank.json"), [PARIS] * 3)
+        self.assertEqual(_import(json.dumps({"questions": records}), "bank.json"), [PARIS] * 3)
+        self.assertEqual(_import("\n".join(map(json.dumps, records)), "bank.jsonl"), [PARIS] * 3)
+
+    def test_json_arrays_are_read_in_chunks(self):
+        records = [{"question": f"Question {i}?", "options": ["x", "y"], "answer": i % 2} for i in range(500)]
+        content = json.dumps(records, indent=2)
+
+        items = list(_json_array_items(io.StringIO(content), chunk_size=100))
+
+        self.assertEqual(items, records)
+
+    def test_csv_with_semicolons_and_multiline_cells(self):
+        content = '\ufeffQuestion;Option A;Option B;Option C;Answer\n"Capital of\nFrance?";Rome;Paris;;B\nBad;x;y;z;d\n'
+
+        with self.assertRaises(ExamFormatError) as context:
+            _import(content, "bank.csv")
+
+        self.assertEqual(context.exception.errors, ["Line 4: Invalid correct option 'd'. Valid options: ['a', 'b', 'c']"])
+        questions = _import(content.rsplit("Bad", 1)[0], "bank.csv")
+        self.assertEqual(questions, [dict(PARIS, statement="Capital of\nFrance?")])
+
+    def test_every_invalid_question_is_reported(self):
+        records = [
+            {"question": "", "options": ["x", "y"], "answer": "a"},
+            {"question": "One option", "options": ["x"], "answer": "a"},
+            {"question": "Capital of France?", "options": ["Rome", "Paris"], "answer": "Lyon"},
+        ]
+
+        with self.assertRaises(ExamFormatError) as context:
+            _import(json.dumps(records), "bank.json")
+
+        self.assertEqual(context.exception.errors, [
+            "Question 1: Question missing statement",
+            "Question 2: Minimum 2 options required. Question: 'One option...'",
+            "Question 3: Invalid correct option 'Lyon'. Valid options: ['a', 'b']",
+        ])
+
+    def test_upload_imports_other_formats(self):
+        use_temporary_upload_dir(self)
+        request = RequestFactory().post("/upload_file/", {
+            "course_choice": "new", "new_course": "Geography", "model": "Test Model",
+        })
+        request.FILES["file"] = SimpleUploadedFile("bank.txt", AIKEN_BANK.encode())
+        request.user = User.objects.create_user(username="testuser", password="password")
+
+        response = upload_file(request)
+
+        self.assertEqual(response.status_code, 200)
+        question = Question.objects.select_related('correct_option').get()
+        self.assertEqual((question.statement, question.correct_option.content), ("Capital of France?", "b) Paris"))
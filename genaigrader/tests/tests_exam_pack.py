@@ -0,0 +1,78 @@
+import dataclasses
+import json
+from unittest.mock import Mock
+from django.contrib.auth.models import User
+from django.test import TestCase
+from genaigrader.models import Course, Exam, Evaluation, Model, Question, QuestionOption
+from genaigrader.services.exam_pack_service import get_exam_pack, invalidate_exam_pack
+from genaigrader.services.llm_service import generate_prompt
+from genaigrader.services.stream_service import stream_responses
+
+
+class ExamPackTest(TestCase):
+    def setUp(self):
+        invalidate_exam_pack()
+        user = User.objects.create_user(username='testuser', password='password')
+        course = Course.objects.create(name='Test Course', user=user)
+        self.model = Model.objects.create(description='Test Model')
+        self.exam = Exam.objects.create(course=course, description='Test Exam', user=user)
+        for i in range(20):
+            question = Question.objects.create(statement=f"Question {i}", exam=self.exam)
+            # Created out of order: prompts list options sorted by content
+            option_b = QuestionOption.objects.create(content="b) no", question=question)
+            QuestionOption.objects.create(content="a) yes", question=question)
+            question.correct_option = option_b
+            question.save()
+
+    def test_pack_is_built_with_two_queries_and_then_reused(self):
+        with self.assertNumQueries(2):
+            pack = get_exam_pack(self.exam)
+        with self.assertNumQueries(0):
+            self.assertIs(get_exam_pack(self.exam.id), pack)
+
+        self.assertEqual(len(pack.questions), 20)
+        question = pack.questions[0]
+        self.assertEqual(question.question_prompt, "Question 0\na) yes\nb) no\n")
+        self.assertEqual(question.correct_letter, "b")
+        self.assertEqual(question.option_id_for("b"), question.correct_option_id)
+        self.assertIsNone(question.option_id_for("z"))
+
+    def test_compiled_questions_are_read_only(self):
+        question = get_exam_pack(self.exam).questions[0]
+
+        with self.assertRaises(dataclasses.FrozenInstanceError):
+            question.correct_letter = "a"
+        self.assertFalse(hasattr(question, '__dict__'))
+
+    def test_prompt_matches_the_one_rendered_from_the_model(self):
+        question = Question.objects.filter(exam=self.exam).order_by('id').first()
+        compiled = get_exam_pack(self.exam).questions[0]
+
+        self.assertEqual(generate_prompt(compiled, "Be brief."), generate_prompt(question, "Be brief."))
+
+    def test_changes_to_the_exam_invalidate_the_pack(self):
+        pack = get_exam_pack(self.exam)
+
+        option = QuestionOption.objects.filter(question__exam=self.exam).first()
+        option.content = "a) changed"
+        option.save()
+        self.assertIsNot(get_exam_pack(self.exam), pack)
+
+        pack = get_exam_pack(self.exam)
+        Question.objects.filter(exam=self.exam).first().delete()
+        self.assertEqual(len(get_exam_pack(self.exam).questions), 19)
+
+    def test_evaluating_a_pack_does_not_query_questions(self):
+        questions = get_exam_pack(self.exam).questions
+        llm = Mock()
+        llm.model_obj = self.model
+        llm.generate_response.side_effect = lambda prompt: iter(["b"])
+
+        # Only the two checkpoints hit the database: savepoint, evaluation, bulk insert, release;
+        # finishing the evaluation also adds it to the statistics (savepoint, statistic, exam, insert
+        # in its own savepoint and release, update, data version, release)
+        with self.assertNumQueries(17):
+            events = [json.loads(e[6:]) for e in stream_responses(questions, "", llm, 20, self.exam)]
+
+        self.assertEqual(events[-1]['correct_count'], 20)
+        self.assertEqual(Evaluation.objects.get().questionevaluation_set.filter(question_option__isnull=False).count(), 20)
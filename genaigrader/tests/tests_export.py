@@ -0,0 +1,117 @@
+import csv
+import io
+import tempfile
+import unittest
+from datetime import datetime, timezone as dt_timezone
+from unittest.mock import patch
+from django.contrib.auth.models import User
+from django.test import Client, TestCase
+from django.urls import reverse
+from genaigrader.models import Course, Evaluation, Exam, Model, Question, QuestionEvaluation, QuestionOption
+from genaigrader.services import columnar_export_service
+from genaigrader.services.columnar_export_service import TABLES, table_batches, table_querysets, write_tables
+from genaigrader.services.comparison_service import answer_rows
+from genaigrader.services.graphics_service import question_accuracy
+
+
+class ExportTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.client = Client()
+        self.client.login(username='testuser', password='password')
+        self.course = Course.objects.create(name='Course', user=self.user)
+        exam = Exam.objects.create(description='Exam', course=self.course, user=self.user)
+        question = Question.objects.create(statement="Capital of France?", exam=exam)
+        question.correct_option = QuestionOption.objects.create(content="a) Paris", question=question)
+        question.save()
+        wrong = QuestionOption.objects.create(content="b) Rome", question=question)
+        model = Model.objects.create(description='model:1b')
+        date = datetime(2024, 1, 2, 12, 30, tzinfo=dt_timezone.utc)
+        for grade, option in ((10.0, question.correct_option), (0.0, wrong)):
+            evaluation = Evaluation.objects.create(
+                prompt='Prompt, "quoted"', ev_date=date, grade=grade, time=12.345, model=model, exam=exam
+            )
+            QuestionEvaluation.objects.create(evaluation=evaluation, question=question, question_option=option)
+        Evaluation.objects.create(prompt='', ev_date=date, grade=5.0, time=1.0, model=model, exam=exam,
+                                  status=Evaluation.RUNNING)
+
+    def _rows(self, response):
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content).decode('utf-8')
+        self.assertTrue(content.startswith('\ufeff'))
+        return list(csv.reader(io.StringIO(content.removeprefix('\ufeff'))))
+
+    def test_all_evaluations_are_streamed(self):
+        rows = self._rows(self.client.get(reverse('export_all_evaluations')))
+
+        self.assertEqual(rows[0], ['Course', 'Exam', 'Date', 'Model', 'Prompt', 'Grade', 'Time (s)'])
+        self.assertEqual(rows[1], ['Course', 'Exam', '02/01/2024 12:30:00', 'model:1b', 'Prompt, "quoted"', '10,0', '12,35'])
+        self.assertEqual(len(rows), 3)  # The running evaluation is left out
+
+    def test_course_evaluations_are_streamed_in_chunks(self):
+        with patch('genaigrader.services.export_service.ROWS_PER_CHUNK', 2):
+            response = self.client.get(reverse('export_course_evaluations', args=[self.course.id]))
+            chunks = list(response.streaming_content)
+
+        self.assertEqual(len(chunks), 2)
+        rows = list(csv.reader(io.StringIO(b''.join(chunks).decode('utf-8').removeprefix('\ufeff'))))
+        self.assertEqual(rows[0], ['Exam', 'Date', 'Model', 'Prompt', 'Grade', 'Time (s)'])
+        self.assertEqual([row[4] for row in rows[1:]], ['10,0', '0,0'])
+
+    def test_answers_are_exported_one_row_per_question(self):
+        rows = self._rows(self.client.get(reverse('export_course_question_evaluations', args=[self.course.id])))
+
+        self.assertEqual(rows[0][-4:], ['Question', 'Answer', 'Correct answer', 'Correct'])
+        self.assertEqual([row[-3:] for row in rows[1:]], [['a) Paris', 'a) Paris', 'Yes'], ['b) Rome', 'a) Paris', 'No']])
+        self.assertEqual(len(self._rows(self.client.get(reverse('export_question_evaluations')))), 3)
+
+    def test_legacy_answers_are_left_out(self):
+        QuestionEvaluation.objects.filter(question_option__content="b) Rome").update(answer_recorded=False)
+        exam = Exam.objects.get()
+
+        rows = self._rows(self.client.get(reverse('export_course_question_evaluations', args=[self.course.id])))
+        batches = list(table_batches(table_querysets(self.user)['answers'], dict(TABLES)['answers']))
+
+        self.assertEqual([row[-3:] for row in rows[1:]], [['a) Paris', 'a) Paris', 'Yes']])
+        self.assertEqual(batches[0]['correct'], [True])
+        self.assertEqual(answer_rows(QuestionEvaluation.objects.all()).shape, (1, 4))
+        self.assertEqual(list(question_accuracy(exam).values())[0]['answers'], 1)
+
+    def test_courses_of_other_users_cannot_be_exported(self):
+        User.objects.create_user(username='other', password='password')
+        self.client.login(username='other', password='password')
+
+        self.assertEqual(self.client.get(reverse('export_course_question_evaluations', args=[self.course.id])).status_code, 404)
+        self.assertEqual(len(self._rows(self.client.get(reverse('export_question_evaluations')))), 1)
+
+    def test_columnar_tables_are_read_in_batches(self):
+        columns = dict(TABLES)
+        querysets = table_querysets(self.user)
+
+        batches = list(table_batches(querysets['answers'], columns['answers'], batch_size=1))
+        evaluations = list(table_batches(querysets['evaluations'], columns['evaluations']))
+
+        self.assertEqual([batch['correct'] for batch in batches], [[True], [False]])
+        self.assertEqual(evaluations[0]['grade'], [10.0, 0.0])  # Floats, not comma-decimal strings
+        self.assertEqual(evaluations[0]['course_id'], [self.course.id] * 2)
+
+    def test_columnar_export_needs_pyarrow(self):
+        with patch('genaigrader.views.course_views.arrow_available', return_value=False):
+            response = self.client.get(reverse('export_columnar_data'))
+
+        self.assertEqual(response.status_code, 501)
+
+    @unittest.skipUnless(columnar_export_service.arrow_available(), "pyarrow is not installed")
+    def test_columnar_files_keep_their_types(self):
+        import pyarrow as pa
+
+        with tempfile.TemporaryDirectory() as directory:
+            paths = write_tables(self.user, directory, columnar_export_service.ARROW, batch_size=1)
+            with pa.ipc.open_file(paths[-2]) as reader:
+                evaluations = reader.read_all()
+
+        self.assertEqual(len(paths), len(TABLES))
+        self.assertEqual(evaluations.num_rows, 2)
+        self.assertEqual(evaluations.schema.field('grade').type, pa.float64())
+        self.assertEqual(evaluations.schema.field('date').type, pa.timestamp('us', tz='UTC'))
+
@@ -0,0 +1,330 @@
+import unittest
+import openai
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, Mock, patch
+from genaigrader.llm_api import (
+    LlmApi, QuestionTimeout, ThinkingBudgetExceeded, ThinkingFilter, VALIDATION_CACHE_TTL, close_async_clients,
+    invalidate_validation_cache
+)
+
+
+def make_model(is_external=False):
+    return SimpleNamespace(
+        description='test-model',
+        is_external=is_external,
+        api_url='https://api.example.com/v1' if is_external else None,
+        api_key='secret' if is_external else None,
+    )
+
+
+async def async_iter(items):
+    for item in items:
+        yield item
+
+
+class FakeAsyncStream:
+    """Stands in for openai.AsyncStream: async iterable with an async close()."""
+
+    def __init__(self, items):
+        self.items = items
+        self.closed = False
+
+    async def __aiter__(self):
+        for item in self.items:
+            yield item
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeStream:
+    """Stands in for openai.Stream, recording how many chunks were read."""
+
+    def __init__(self, items):
+        self.items = items
+        self.consumed = 0
+        self.closed = False
+
+    def __iter__(self):
+        for item in self.items:
+            self.consumed += 1
+            yield item
+
+    def close(self):
+        self.closed = True
+
+
+def openai_chunk(content):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))])
+
+
+class ThinkingFilterTest(unittest.TestCase):
+
+    def test_plain_output_is_split_into_non_blank_lines(self):
+        thinking_filter = ThinkingFilter()
+        self.assertEqual(thinking_filter.feed("a\n\nb"), ["a", "b"])
+
+    def test_thinking_block_is_hidden(self):
+        thinking_filter = ThinkingFilter()
+        lines = []
+        for chunk in ["<think>let me", " think</thi", "nk>\n", "c"]:
+            lines += thinking_filter.feed(chunk)
+        self.assertEqual(lines, ["c"])
+
+    def _run(self, chunks):
+        thinking_filter = ThinkingFilter()
+        lines = []
+        for chunk in chunks:
+            lines += thinking_filter.feed(chunk)
+        return lines + thinking_filter.flush(), thinking_filter
+
+    def test_opening_tag_split_across_chunks(self):
+        lines, _ = self._run(["<th", "ink>reasoning", "</think>", "a"])
+        self.assertEqual(lines, ["a"])
+
+    def test_thinking_block_after_leading_text(self):
+        lines, _ = self._run(["\n\n", "<think>", "hmm", "</think>b"])
+        self.assertEqual(lines, ["b"])
+
+    def test_partial_tag_at_end_of_stream_is_flushed(self):
+        lines, _ = self._run(["answer: a <th"])
+        self.assertEqual(lines, ["answer: a ", "<th"])
+
+    def test_unclosed_thinking_block_yields_nothing(self):
+        lines, thinking_filter = self._run(["<think>", "looping"] + [" forever"] * 10)
+        self.assertEqual(lines, [])
+        self.assertEqual(thinking_filter.thinking_chars, len("looping") + len(" forever") * 10)
+
+    def test_reports_skipped_thinking(self):
+        _, thinking_filter = self._run(["<think>ab", "cd", "e</think>", "a"])
+        self.assertEqual(thinking_filter.thinking_chars, 5)
+        self.assertEqual(thinking_filter.thinking_chunks, 3)
+
+    def test_memory_is_bounded_by_the_tag_length(self):
+        thinking_filter = ThinkingFilter()
+        thinking_filter.feed("<think>")
+        for _ in range(1000):
+            thinking_filter.feed("some reasoning </thin")
+            self.assertLess(len(thinking_filter.pending), len(ThinkingFilter.CLOSE_TAG))
+
+
+class AsyncLlmApiTest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        invalidate_validation_cache()
+
+    @patch('genaigrader.llm_api.ollama.AsyncClient')
+    async def test_local_model_streams_without_thinking(self, mock_async_client):
+        chunks = [{'message': {'content': c}} for c in ["<think>hmm", "</think>", "\nb"]]
+        mock_async_client.return_value.chat = AsyncMock(return_value=async_iter(chunks))
+
+        llm = LlmApi(make_model())
+        lines = [line async for line in llm.agenerate_response("prompt")]
+
+        self.assertEqual(lines, ["b"])
+        self.assertEqual(llm.thinking_stats, {'chars': 3, 'chunks': 2})
+        mock_async_client.return_value.chat.assert_awaited_once()
+
+    @patch('genaigrader.llm_api.openai.AsyncOpenAI')
+    async def test_external_model_validates_and_streams(self, mock_async_openai):
+        client = MagicMock()
+        client.models.list = AsyncMock(return_value=[])
+        stream = FakeAsyncStream([openai_chunk("a"), openai_chunk(None)])
+        client.chat.completions.create = AsyncMock(return_value=stream)
+        mock_async_openai.return_value = client
+
+        llm = LlmApi(make_model(is_external=True))
+        lines = [line async for line in llm.agenerate_response("prompt")]
+
+        self.assertEqual(lines, ["a"])
+        self.assertTrue(stream.closed)
+        client.models.list.assert_awaited_once()
+        mock_async_openai.assert_called_once_with(api_key='secret', base_url='https://api.example.com/v1')
+
+    @patch('genaigrader.llm_api.openai.AsyncOpenAI')
+    async def test_async_clients_are_shared_on_a_loop_and_closed_with_it(self, mock_async_openai):
+        client = mock_async_openai.return_value
+        client.models.list = AsyncMock(return_value=[])
+        client.close = AsyncMock()
+
+        for _ in range(3):
+            await LlmApi(make_model(is_external=True)).avalidate()
+        await close_async_clients()
+
+        mock_async_openai.assert_called_once()
+        client.close.assert_awaited_once()
+
+    @patch('genaigrader.llm_api.openai.AsyncOpenAI')
+    async def test_external_model_connection_error_raises_value_error(self, mock_async_openai):
+        client = MagicMock()
+        client.models.list = AsyncMock(side_effect=Exception("boom"))
+        mock_async_openai.return_value = client
+
+        llm = LlmApi(make_model(is_external=True))
+        with self.assertRaises(ValueError) as context:
+            await llm.avalidate()
+        self.assertIn("boom", str(context.exception))
+
+    async def test_missing_fields_fail_before_any_request(self):
+        model = make_model(is_external=True)
+        model.api_url = "not a url"
+        with self.assertRaises(ValueError) as context:
+            await LlmApi(model).avalidate()
+        self.assertIn("API URL is not valid", str(context.exception))
+
+
+class EarlyStopTest(unittest.TestCase):
+
+    def setUp(self):
+        invalidate_validation_cache()
+
+    @patch('genaigrader.llm_api.openai.OpenAI')
+    def test_closing_the_generator_closes_the_upstream_stream(self, mock_openai):
+        stream = FakeStream([openai_chunk(c) for c in ["a", ") Paris", " is", " the", " capital"]])
+        mock_openai.return_value.chat.completions.create.return_value = stream
+
+        response = LlmApi(make_model(is_external=True)).generate_response("prompt")
+        self.assertEqual(next(response), "a")
+        response.close()
+
+        self.assertTrue(stream.closed)
+        self.assertEqual(stream.consumed, 1)
+
+    @patch('genaigrader.llm_api.openai.OpenAI')
+    def test_limits_are_sent_to_the_external_api(self, mock_openai):
+        mock_openai.return_value.chat.completions.create.return_value = FakeStream([])
+
+        list(LlmApi(make_model(is_external=True)).generate_response("prompt", max_tokens=4, stop=[")"]))
+
+        kwargs = mock_openai.return_value.chat.completions.create.call_args.kwargs
+        self.assertEqual(kwargs['max_tokens'], 4)
+        self.assertEqual(kwargs['stop'], [")"])
+
+    @patch('genaigrader.llm_api.ollama.chat')
+    def test_limits_are_sent_to_ollama_as_options(self, mock_chat):
+        mock_chat.return_value = FakeStream([])
+
+        list(LlmApi(make_model()).generate_response("prompt", max_tokens=4, stop=[")"]))
+
+        self.assertEqual(mock_chat.call_args.kwargs['options'], {'num_predict': 4, 'stop': [")"]})
+
+    @patch('genaigrader.llm_api.ollama.chat')
+    def test_no_options_are_sent_without_limits(self, mock_chat):
+        mock_chat.return_value = FakeStream([])
+
+        list(LlmApi(make_model()).generate_response("prompt"))
+
+        self.assertIsNone(mock_chat.call_args.kwargs['options'])
+
+
+class ValidationCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        invalidate_validation_cache()
+
+    @patch('genaigrader.llm_api.openai.OpenAI')
+    def test_client_and_validation_are_reused(self, mock_openai):
+        LlmApi(make_model(is_external=True)).validate()
+        LlmApi(make_model(is_external=True)).validate()
+
+        mock_openai.assert_called_once()
+        mock_openai.return_value.models.list.assert_called_once()
+
+    @patch('genaigrader.llm_api.time.monotonic')
+    @patch('genaigrader.llm_api.openai.OpenAI')
+    def test_validation_expires_after_ttl(self, mock_openai, mock_monotonic):
+        mock_monotonic.return_value = 1000.0
+        LlmApi(make_model(is_external=True)).validate()
+        mock_monotonic.return_value = 1000.0 + VALIDATION_CACHE_TTL + 1
+        LlmApi(make_model(is_external=True)).validate()
+
+        self.assertEqual(mock_openai.return_value.models.list.call_count, 2)
+
+    @patch('genaigrader.llm_api.openai.OpenAI')
+    def test_failed_validation_is_not_cached(self, mock_openai):
+        mock_openai.return_value.models.list.side_effect = [Exception("down"), []]
+        with self.assertRaises(ValueError):
+            LlmApi(make_model(is_external=True)).validate()
+        LlmApi(make_model(is_external=True)).validate()
+
+        self.assertEqual(mock_openai.return_value.models.list.call_count, 2)
+
+    @patch('genaigrader.llm_api.openai.OpenAI')
+    def test_invalidation_forces_a_new_client_and_check(self, mock_openai):
+        model = make_model(is_external=True)
+        LlmApi(model).validate()
+        invalidate_validation_cache(model.api_url, model.api_key)
+        LlmApi(model).validate()
+
+        self.assertEqual(mock_openai.call_count, 2)
+        self.assertEqual(mock_openai.return_value.models.list.call_count, 2)
+
+    @patch('genaigrader.llm_api.openai.OpenAI')
+    def test_different_models_are_validated_separately(self, mock_openai):
+        other = make_model(is_external=True)
+        other.description = 'other-model'
+        LlmApi(make_model(is_external=True)).validate()
+        LlmApi(other).validate()
+
+        mock_openai.assert_called_once()
+        self.assertEqual(mock_openai.return_value.models.list.call_count, 2)
+
+
+class GenerationLimitsTest(unittest.TestCase):
+
+    def _ollama_stream(self, contents):
+        return FakeStream([{'message': {'content': c}} for c in contents])
+
+    @patch('genaigrader.llm_api.ollama.chat')
+    def test_thinking_budget_aborts_and_closes_the_stream(self, mock_chat):
+        stream = self._ollama_stream(["<think>"] + ["loop "] * 100)
+        mock_chat.return_value = stream
+        model = make_model()
+        model.thinking_budget = 20
+
+        with self.assertRaises(ThinkingBudgetExceeded):
+            list(LlmApi(model).generate_response("prompt"))
+
+        self.assertTrue(stream.closed)
+        self.assertLess(stream.consumed, 10)
+
+    @patch('genaigrader.llm_api.time.monotonic')
+    @patch('genaigrader.llm_api.ollama.Client')
+    def test_question_deadline_aborts_the_stream(self, mock_client, mock_monotonic):
+        clock = iter(range(0, 1000, 10))
+        mock_monotonic.side_effect = lambda: next(clock)
+        stream = self._ollama_stream(["<think>"] + ["slow "] * 100)
+        mock_client.return_value.chat.return_value = stream
+        model = make_model()
+        model.question_timeout = 25
+
+        with self.assertRaises(QuestionTimeout):
+            list(LlmApi(model).generate_response("prompt"))
+
+        mock_client.assert_called_once_with(timeout=25)
+        self.assertTrue(stream.closed)
+        self.assertLess(stream.consumed, 5)
+
+    @patch('genaigrader.llm_api.ollama.Client')
+    def test_local_model_runs_on_the_given_ollama_host(self, mock_client):
+        mock_client.return_value.chat.return_value = self._ollama_stream(["a"])
+
+        lines = list(LlmApi(make_model(), ollama_host='http://gpu-2:11434').generate_response("prompt"))
+
+        self.assertEqual(lines, ["a"])
+        mock_client.assert_called_once_with(host='http://gpu-2:11434')
+
+    @patch('genaigrader.llm_api.openai.OpenAI')
+    def test_network_timeout_becomes_question_timeout(self, mock_openai):
+        invalidate_validation_cache()
+        mock_openai.return_value.chat.completions.create.side_effect = openai.APITimeoutError(request=Mock())
+        model = make_model(is_external=True)
+        model.question_timeout = 5
+
+        with self.assertRaises(QuestionTimeout):
+            list(LlmApi(model).generate_response("prompt"))
+        self.assertEqual(mock_openai.return_value.chat.completions.create.call_args.kwargs['timeout'], 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
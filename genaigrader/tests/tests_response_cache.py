@@ -0,0 +1,87 @@
+import json
+from datetime import timedelta
+from unittest.mock import MagicMock, Mock, patch
+from django.test import TestCase
+from django.utils import timezone
+from django.contrib.auth.models import User
+from genaigrader.models import CachedResponse, Course, Exam, Evaluation, Model
+from genaigrader.services.response_cache_service import (
+    ResponseCache, evict_least_recently_used, get_cache_stats, make_cache_key
+)
+from genaigrader.services.stream_service import stream_responses
+
+
+class ResponseCacheTest(TestCase):
+    def setUp(self):
+        self.model = Model.objects.create(description='Test Model')
+
+    def test_miss_then_hit(self):
+        cache = ResponseCache(self.model)
+        self.assertIsNone(cache.get("prompt", {}))
+        cache.put("prompt", {}, "b")
+        self.assertEqual(cache.get("prompt", {}), "b")
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertEqual(CachedResponse.objects.get().hits, 1)
+
+    def test_key_depends_on_model_prompt_and_params(self):
+        other = Model.objects.create(description='Other Model')
+        key = make_cache_key(self.model, "prompt", {})
+        self.assertNotEqual(key, make_cache_key(other, "prompt", {}))
+        self.assertNotEqual(key, make_cache_key(self.model, "prompt 2", {}))
+        self.assertNotEqual(key, make_cache_key(self.model, "prompt", {'max_tokens': 3}))
+
+    def test_process_wide_counters(self):
+        before = get_cache_stats()
+        ResponseCache(self.model).get("unknown", {})
+        self.assertEqual(get_cache_stats()['misses'], before['misses'] + 1)
+
+    def test_eviction_keeps_most_recently_used(self):
+        now = timezone.now()
+        for i in range(5):
+            CachedResponse.objects.create(
+                key=str(i), model=self.model, response="a", last_used_at=now - timedelta(minutes=5 - i)
+            )
+        self.assertEqual(evict_least_recently_used(max_entries=2), 3)
+        self.assertEqual(sorted(CachedResponse.objects.values_list('key', flat=True)), ['3', '4'])
+
+
+class CachedStreamResponsesTest(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='testuser', password='password')
+        course = Course.objects.create(name='Test Course', user=user)
+        self.model = Model.objects.create(description='Test Model')
+        self.exam = Exam.objects.create(course=course, description='Test Exam', user=user)
+
+    def _question(self):
+        question = Mock()
+        question.statement = "Question"
+        question.correct_option.content = "a) option"
+        question.questionoption_set = MagicMock()
+        return question
+
+    @patch('genaigrader.services.stream_service.QuestionEvaluation')
+    def test_second_run_is_served_from_cache(self, mock_question_evaluation):
+        llm = Mock()
+        llm.model_obj = self.model
+        llm.generate_response.side_effect = lambda prompt: iter(["a"])
+
+        first = [json.loads(e[6:]) for e in stream_responses([self._question()], "", llm, 1, self.exam, use_cache=True)]
+        second = [json.loads(e[6:]) for e in stream_responses([self._question()], "", llm, 1, self.exam, use_cache=True)]
+
+        self.assertEqual(llm.generate_response.call_count, 1)
+        self.assertFalse(first[-1]['cached'])
+        self.assertTrue(second[-1]['cached'])
+        self.assertEqual((second[-1]['cache_hits'], second[-1]['cache_misses']), (1, 0))
+        self.assertEqual(Evaluation.objects.count(), 2)
+
+    @patch('genaigrader.services.stream_service.QuestionEvaluation')
+    def test_cache_is_not_used_unless_requested(self, mock_question_evaluation):
+        llm = Mock()
+        llm.model_obj = self.model
+        llm.generate_response.side_effect = lambda prompt: iter(["a"])
+
+        list(stream_responses([self._question()], "", llm, 1, self.exam))
+        list(stream_responses([self._question()], "", llm, 1, self.exam))
+
+        self.assertEqual(llm.generate_response.call_count, 2)
+        self.assertEqual(CachedResponse.objects.count(), 0)
@@ -0,0 +1,127 @@
+import threading
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+from datetime import datetime, timezone
+from django.test import SimpleTestCase
+from genaigrader.services.scheduler_service import ResourceScheduler, dispatch
+
+
+def make_task(task_id, model, position=None, exam_id=1, target_half_width=None, job_id=1, deadline=None):
+    return SimpleNamespace(
+        id=task_id, job_id=job_id, job=SimpleNamespace(target_half_width=target_half_width, deadline=deadline),
+        position=task_id if position is None else position, model=model, model_id=model.id, exam_id=exam_id
+    )
+
+
+def make_model(model_id, api_url=None, description=''):
+    return SimpleNamespace(id=model_id, is_external=api_url is not None, api_url=api_url, description=description)
+
+
+class ResourceSchedulerTest(SimpleTestCase):
+    def setUp(self):
+        self.local_a = make_model(1)
+        self.local_b = make_model(2)
+        self.remote = make_model(3, api_url='https://api.example.com/v1')
+
+    def test_local_host_runs_one_task_at_a_time(self):
+        scheduler = ResourceScheduler(external_slots=2)
+        tasks = [make_task(1, self.local_a), make_task(2, self.local_a), make_task(3, self.local_b)]
+
+        picks = scheduler.select(tasks)
+        self.assertEqual([task.id for task in picks], [1])
+
+        scheduler.start(picks[0])
+        self.assertEqual(scheduler.select(tasks[1:]), [])
+
+    def test_local_host_prefers_the_loaded_model(self):
+        scheduler = ResourceScheduler(external_slots=2)
+        first = make_task(1, self.local_a)
+        scheduler.start(first)
+        scheduler.finish(first)
+
+        # The model-b task comes first in the queue, but model a is already loaded
+        picks = scheduler.select([make_task(2, self.local_b), make_task(3, self.local_a)])
+
+        self.assertEqual([task.id for task in picks], [3])
+
+    def test_external_tasks_run_beside_the_local_one(self):
+        scheduler = ResourceScheduler(external_slots=2)
+        tasks = [make_task(1, self.local_a)] + [make_task(i, self.remote) for i in range(2, 6)]
+
+        picks = scheduler.select(tasks)
+
+        self.assertEqual([task.id for task in picks], [1, 2, 3])
+        self.assertEqual([task.id for task in scheduler.select(tasks, limit=2)], [1, 2])
+
+    def test_adaptive_repetitions_of_a_pair_run_one_at_a_time(self):
+        scheduler = ResourceScheduler(external_slots=4)
+        tasks = [make_task(1, self.remote, target_half_width=0.5), make_task(2, self.remote, target_half_width=0.5),
+                 make_task(3, self.remote, exam_id=2, target_half_width=0.5)]
+
+        picks = scheduler.select(tasks)
+        self.assertEqual([task.id for task in picks], [1, 3])
+
+        scheduler.start(picks[0])
+        self.assertEqual([task.id for task in scheduler.select(tasks[1:])], [3])
+        scheduler.finish(picks[0])
+        self.assertEqual([task.id for task in scheduler.select(tasks[1:])], [2, 3])
+
+    def test_workers_only_run_local_models_pulled_on_their_host(self):
+        scheduler = ResourceScheduler(ollama_host='http://gpu-2:11434', local_models={'llama3'})
+        pulled, missing = make_model(4, description='llama3:latest'), make_model(5, description='qwen3:8b')
+
+        picks = scheduler.select([make_task(1, missing), make_task(2, pulled), make_task(3, self.remote)])
+
+        self.assertEqual([task.id for task in picks], [2, 3])
+        self.assertEqual(scheduler.resource(picks[0]), ('local', 'http://gpu-2:11434'))
+
+    def test_shortest_job_first(self):
+        seconds = {1: 30, 2: 10, 3: 20}
+        scheduler = ResourceScheduler(external_slots=1, order='sjf', estimate=lambda task: seconds[task.id])
+        tasks = [make_task(i, self.remote) for i in (1, 2, 3)]
+
+        self.assertEqual([task.id for task in scheduler.select(tasks)], [2])
+
+    def test_earliest_deadline_first(self):
+        scheduler = ResourceScheduler(external_slots=1, order='deadline')
+        tasks = [
+            make_task(1, self.remote, job_id=1),
+            make_task(2, self.remote, job_id=2, deadline=datetime(2030, 1, 2, tzinfo=timezone.utc)),
+            make_task(3, self.remote, job_id=3, deadline=datetime(2030, 1, 1, tzinfo=timezone.utc)),
+        ]
+
+        self.assertEqual([task.id for task in scheduler.select(tasks)], [3])
+
+
+class DispatchTest(SimpleTestCase):
+    def test_tasks_on_different_resources_overlap(self):
+        tasks = [make_task(1, make_model(1)), make_task(2, make_model(2, api_url='https://api.example.com/v1'))]
+        queue = list(tasks)
+        lock = threading.Lock()
+        running, overlaps = [0], []
+
+        def queued_tasks(**kwargs):
+            with lock:
+                return list(queue)
+
+        def claim_task(task, worker):
+            with lock:
+                queue.remove(task)
+            return True
+
+        def run_task(task):
+            with lock:
+                running[0] += 1
+                overlaps.append(running[0])
+            time.sleep(0.1)
+            with lock:
+                running[0] -= 1
+
+        with patch('genaigrader.services.scheduler_service.queued_tasks', queued_tasks), \
+                patch('genaigrader.services.scheduler_service.connection'):
+            dispatch('worker', run_task, claim_task, scheduler=ResourceScheduler(external_slots=1),
+                     threads=4, poll_interval=0.01, once=True)
+
+        self.assertEqual(queue, [])
+        self.assertEqual(max(overlaps), 2)
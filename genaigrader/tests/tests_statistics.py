@@ -0,0 +1,138 @@
+import io
+import numpy as np
+from unittest.mock import patch
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import transaction
+from django.db.models import QuerySet
+from django.test import TestCase
+from django.utils import timezone
+from genaigrader.models import (
+    Course, Evaluation, EvaluationStatistic, Exam, Model, Question, QuestionEvaluation, QuestionOption
+)
+from genaigrader.services.graphics_service import question_accuracy
+from genaigrader.services.statistics_service import welford_add, welford_remove
+
+
+class WelfordTest(TestCase):
+    def test_adding_and_removing_values_matches_numpy(self):
+        values = [7.0, 3.5, 9.0, 4.0, 6.25]
+        count, mean, m2 = 0, 0.0, 0.0
+        for value in values:
+            count, mean, m2 = welford_add(count, mean, m2, value)
+        count, mean, m2 = welford_remove(count, mean, m2, 9.0)
+
+        rest = np.array([7.0, 3.5, 4.0, 6.25])
+        self.assertEqual(count, 4)
+        self.assertAlmostEqual(mean, rest.mean())
+        self.assertAlmostEqual(m2, ((rest - rest.mean()) ** 2).sum())
+        self.assertEqual(welford_remove(1, 5.0, 0.0, 5.0), (0, 0.0, 0.0))
+
+
+class EvaluationStatisticTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.course = Course.objects.create(name='Course', user=self.user)
+        self.exam = Exam.objects.create(description='Exam', course=self.course, user=self.user)
+        self.model = Model.objects.create(description='model:1b')
+
+    def _evaluate(self, grade, time, status=Evaluation.DONE):
+        return Evaluation.objects.create(
+            prompt='', ev_date=timezone.now(), grade=grade, time=time, model=self.model, exam=self.exam, status=status
+        )
+
+    def _statistic(self):
+        return EvaluationStatistic.objects.get(exam=self.exam, model=self.model)
+
+    def test_finished_evaluations_update_the_statistic(self):
+        self._evaluate(8.0, 10.0)
+        running = self._evaluate(2.0, 5.0, status=Evaluation.RUNNING)
+        self.assertEqual(self._statistic().count, 1)
+
+        running.grade = 4.0
+        running.status = Evaluation.DONE
+        running.save()
+
+        statistic = self._statistic()
+        self.assertEqual((statistic.count, statistic.user, statistic.course), (2, self.user, self.course))
+        self.assertAlmostEqual(statistic.grade_mean, 6.0)
+        self.assertAlmostEqual(statistic.grade_m2, 8.0)
+        self.assertAlmostEqual(statistic.time_mean, 7.5)
+
+    def test_a_statistic_inserted_concurrently_is_added_to(self):
+        self._evaluate(8.0, 10.0)
+        first = QuerySet.first
+        missed = []
+
+        def miss_the_statistic_once(queryset):
+            # As if another transaction inserted the statistic right after this one looked for it
+            if queryset.model is EvaluationStatistic and not missed:
+                missed.append(True)
+                return None
+            return first(queryset)
+
+        with patch.object(QuerySet, 'first', miss_the_statistic_once), transaction.atomic():
+            evaluation = self._evaluate(4.0, 6.0)
+
+        self.assertEqual(missed, [True])
+        self.assertTrue(Evaluation.objects.filter(id=evaluation.id).exists())
+        statistic = self._statistic()
+        self.assertEqual(statistic.count, 2)
+        self.assertAlmostEqual(statistic.grade_mean, 6.0)
+        self.assertAlmostEqual(statistic.time_mean, 8.0)
+
+    def test_deleting_evaluations_removes_them(self):
+        first = self._evaluate(8.0, 10.0)
+        self._evaluate(4.0, 6.0)
+
+        Evaluation.objects.get(id=first.id).delete()
+        statistic = self._statistic()
+        self.assertEqual(statistic.count, 1)
+        self.assertAlmostEqual(statistic.grade_mean, 4.0)
+
+        Evaluation.objects.all().delete()
+        self.assertFalse(EvaluationStatistic.objects.exists())
+
+    def test_deleting_the_exam_deletes_its_statistics(self):
+        self._evaluate(8.0, 10.0)
+
+        self.exam.delete()
+
+        self.assertFalse(EvaluationStatistic.objects.exists())
+
+    def test_rebuild_matches_the_incremental_statistics(self):
+        for grade, time in [(8.0, 10.0), (4.0, 6.0), (5.5, 7.0)]:
+            self._evaluate(grade, time)
+        other = Model.objects.create(description='other:1b')
+        Evaluation.objects.create(prompt='', ev_date=timezone.now(), grade=9.0, time=3.0, model=other, exam=self.exam)
+        incremental = list(EvaluationStatistic.objects.order_by('model_id').values(
+            'model_id', 'count', 'grade_mean', 'grade_m2', 'time_mean', 'time_m2'
+        ))
+
+        EvaluationStatistic.objects.update(count=0, grade_mean=0.0)
+        call_command('rebuild_evaluation_statistics', stdout=io.StringIO())
+
+        rebuilt = list(EvaluationStatistic.objects.order_by('model_id').values(
+            'model_id', 'count', 'grade_mean', 'grade_m2', 'time_mean', 'time_m2'
+        ))
+        self.assertEqual(len(rebuilt), 2)
+        for expected, row in zip(incremental, rebuilt):
+            for key, value in expected.items():
+                self.assertAlmostEqual(row[key], value)
+
+    def test_question_accuracy_counts_finished_evaluations(self):
+        question = Question.objects.create(statement="Capital of France?", exam=self.exam)
+        question.correct_option = QuestionOption.objects.create(content="a) Paris", question=question)
+        question.save()
+        wrong = QuestionOption.objects.create(content="b) Rome", question=question)
+        for option in [question.correct_option] * 3 + [wrong]:
+            QuestionEvaluation.objects.create(evaluation=self._evaluate(5.0, 1.0), question=question, question_option=option)
+        running = self._evaluate(0.0, 1.0, status=Evaluation.RUNNING)
+        QuestionEvaluation.objects.create(evaluation=running, question=question, question_option=wrong)
+
+        accuracy = question_accuracy(self.exam)[question.id]
+
+        self.assertEqual((accuracy['answers'], accuracy['accuracy']), (4, 75.0))
+        self.assertLess(accuracy['low'], 75.0)
+        self.assertGreater(accuracy['high'], 75.0)
+
@@ -1,11 +1,16 @@
 import json
+import time
 from unittest.mock import Mock, MagicMock,patch
 from django.test import Client, TestCase
 from django.contrib.auth.models import User
-from genaigrader.models import Course, Exam, Evaluation, Model, QuestionEvaluation
+from django.utils import timezone
+from genaigrader.llm_api import ThinkingBudgetExceeded
+from genaigrader.models import Course, Exam, Evaluation, Model, Question, QuestionEvaluation, QuestionOption
 
 from genaigrader.models import Model
-from ..services.stream_service import process_question, stream_responses
+from ..services.stream_service import (
+    get_model_answer, process_question, resume_evaluation, stream_responses
+)
 
 class StreamServiceTest(TestCase):
     def setUp(self):
@@ -127,4 +132,271 @@ class StreamServiceTest(TestCase):
         mock_question_evaluation.assert_not_called()
         
         # Verify that question_evaluations list remains empty
-        self.assertEqual(len(question_evaluations), 0)
\ No newline at end of file
+        self.assertEqual(len(question_evaluations), 0)
+
+class ConcurrentStreamResponsesTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='password')
+        self.course = Course.objects.create(name='Test Course', user=self.user)
+        self.model = Model.objects.create(description='Test Model', max_concurrency=3)
+        self.exam = Exam.objects.create(course=self.course, description='Test Exam', user=self.user)
+
+    def _mock_question(self, statement, correct):
+        question = Mock()
+        question.statement = statement
+        question.correct_option.content = f"{correct}) option"
+        question.questionoption_set = MagicMock()
+        return question
+
+    def _mock_llm(self, delays, answers):
+        """LLM mock that answers each statement after the given delay."""
+        def generate_response(prompt):
+            for statement, delay in delays.items():
+                if statement in prompt:
+                    time.sleep(delay)
+                    return iter([answers[statement]])
+            return iter([])
+
+        llm = Mock()
+        llm.model_obj = self.model
+        llm.generate_response.side_effect = generate_response
+        return llm
+
+    def _events(self, responses):
+        return [json.loads(r[6:].strip()) for r in responses]
+
+    @patch('genaigrader.services.stream_service.QuestionEvaluation')
+    def test_concurrent_mode_overlaps_questions_and_keeps_order(self, mock_question_evaluation):
+        questions = [self._mock_question(f"Q{i}", "a") for i in range(3)]
+        llm = self._mock_llm({"Q0": 0.3, "Q1": 0.3, "Q2": 0.3}, {"Q0": "a", "Q1": "b", "Q2": "a"})
+
+        start = time.monotonic()
+        events = self._events(list(stream_responses(questions, "", llm, 3, self.exam)))
+        elapsed = time.monotonic() - start
+
+        self.assertLess(elapsed, 0.8, "Questions should be sent to the model concurrently")
+        self.assertEqual([e['question_number'] for e in events], [1, 2, 3])
+        self.assertEqual([e['processed_questions'] for e in events], [1, 2, 3])
+        self.assertEqual(events[-1]['correct_count'], 2)
+        self.assertIn('total_time', events[-1])
+        self.assertEqual(Evaluation.objects.get().grade, 6.67)
+
+    @patch('genaigrader.services.stream_service.QuestionEvaluation')
+    def test_unordered_mode_emits_answers_as_they_finish(self, mock_question_evaluation):
+        questions = [self._mock_question(f"Q{i}", "a") for i in range(3)]
+        llm = self._mock_llm({"Q0": 0.4, "Q1": 0.0, "Q2": 0.0}, {"Q0": "a", "Q1": "a", "Q2": "a"})
+
+        events = self._events(list(stream_responses(questions, "", llm, 3, self.exam, ordered=False)))
+
+        self.assertEqual(events[-1]['question_number'], 1)
+        self.assertEqual([e['processed_questions'] for e in events], [1, 2, 3])
+        self.assertEqual(events[-1]['correct_count'], 3)
+
+    @patch('genaigrader.services.stream_service.QuestionEvaluation')
+    def test_unordered_mode_does_not_wait_for_the_slowest_answer(self, mock_question_evaluation):
+        questions = [self._mock_question(f"Q{i}", "a") for i in range(3)]
+        llm = self._mock_llm({"Q0": 1.0, "Q1": 0.0, "Q2": 0.1}, {"Q0": "a", "Q1": "a", "Q2": "a"})
+
+        start = time.monotonic()
+        stream = stream_responses(questions, "", llm, 3, self.exam, ordered=False)
+        first = self._events([next(stream)])[0]
+        first_elapsed = time.monotonic() - start
+        list(stream)
+
+        self.assertEqual(first['question_number'], 2)
+        self.assertLess(first_elapsed, 0.6)
+
+    @patch('genaigrader.services.stream_service.QuestionEvaluation')
+    def test_concurrent_mode_reports_error_and_saves_nothing(self, mock_question_evaluation):
+        questions = [self._mock_question(f"Q{i}", "a") for i in range(3)]
+        llm = Mock()
+        llm.model_obj = self.model
+        llm.generate_response.side_effect = Exception("API call failed")
+
+        events = self._events(list(stream_responses(questions, "", llm, 3, self.exam)))
+
+        self.assertEqual(len(events), 1)
+        self.assertIn('API call failed', events[0]['error'])
+        self.assertEqual(Evaluation.objects.count(), 0)
+
+
+class GetModelAnswerTest(TestCase):
+
+    def _llm(self, lines, max_answer_tokens=None):
+        consumed = []
+
+        def generate_response(prompt, **limits):
+            for line in lines:
+                consumed.append(line)
+                yield line
+
+        llm = Mock()
+        llm.model_obj = Model(description='Test Model', max_answer_tokens=max_answer_tokens)
+        llm.generate_response.side_effect = generate_response
+        return llm, consumed
+
+    def test_early_stop_returns_after_first_answer_character(self):
+        llm, consumed = self._llm(["  ", "B) Paris", "because...", "more text"])
+        self.assertEqual(get_model_answer(llm, "prompt"), "b")
+        self.assertEqual(consumed, ["  ", "B) Paris"])
+
+    def test_without_early_stop_whole_response_is_read(self):
+        llm, consumed = self._llm(["B) Paris", "because..."])
+        self.assertEqual(get_model_answer(llm, "prompt", early_stop=False), "b")
+        self.assertEqual(len(consumed), 2)
+
+    def test_empty_response_gives_empty_answer(self):
+        llm, _ = self._llm([])
+        self.assertEqual(get_model_answer(llm, "prompt"), "")
+
+    def test_answer_limits_are_sent_only_when_configured(self):
+        llm, _ = self._llm(["a"], max_answer_tokens=3)
+        get_model_answer(llm, "prompt")
+        llm.generate_response.assert_called_once_with("prompt", max_tokens=3)
+
+        llm, _ = self._llm(["a"])
+        get_model_answer(llm, "prompt")
+        llm.generate_response.assert_called_once_with("prompt")
+
+
+class UnansweredQuestionTest(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='testuser', password='password')
+        course = Course.objects.create(name='Test Course', user=user)
+        self.model = Model.objects.create(description='Test Model')
+        self.exam = Exam.objects.create(course=course, description='Test Exam', user=user)
+        self.questions = []
+        for statement in ["First", "Second"]:
+            question = Question.objects.create(statement=statement, exam=self.exam)
+            option_a = QuestionOption.objects.create(content="a) yes", question=question)
+            QuestionOption.objects.create(content="b) no", question=question)
+            question.correct_option = option_a
+            question.save()
+            self.questions.append(question)
+
+    def test_aborted_question_is_recorded_as_unanswered_and_evaluation_continues(self):
+        def generate_response(prompt, **limits):
+            if "First" in prompt:
+                raise ThinkingBudgetExceeded("too much thinking")
+            yield "b"
+
+        llm = Mock()
+        llm.model_obj = self.model
+        llm.generate_response.side_effect = generate_response
+
+        events = [json.loads(e[6:]) for e in stream_responses(self.questions, "", llm, 2, self.exam)]
+
+        self.assertEqual(len(events), 2)
+        self.assertEqual(events[0]['response']['aborted'], 'thinking_budget')
+        self.assertEqual(events[0]['response']['response'], '')
+        self.assertIsNone(events[1]['response']['aborted'])
+
+        evaluation = Evaluation.objects.get()
+        self.assertEqual(evaluation.grade, 0.0)
+        chosen = dict(evaluation.questionevaluation_set.values_list('question__statement', 'question_option__content'))
+        self.assertEqual(chosen, {"First": None, "Second": "b) no"})
+
+
+class CheckpointedEvaluationTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='password')
+        course = Course.objects.create(name='Test Course', user=self.user)
+        self.model = Model.objects.create(description='Test Model')
+        self.exam = Exam.objects.create(course=course, description='Test Exam', user=self.user)
+        self.questions = []
+        for i in range(5):
+            question = Question.objects.create(statement=f"Q{i}", exam=self.exam)
+            option_a = QuestionOption.objects.create(content="a) yes", question=question)
+            QuestionOption.objects.create(content="b) no", question=question)
+            question.correct_option = option_a
+            question.save()
+            self.questions.append(question)
+
+    def _llm(self, failing=()):
+        asked = []
+
+        def generate_response(prompt, **limits):
+            statement = next(q.statement for q in self.questions if q.statement in prompt)
+            asked.append(statement)
+            if statement in failing:
+                raise Exception("API call failed")
+            yield "a"
+
+        llm = Mock()
+        llm.model_obj = self.model
+        llm.generate_response.side_effect = generate_response
+        return llm, asked
+
+    def _events(self, stream):
+        return [json.loads(e[6:]) for e in stream]
+
+    def test_failure_keeps_answers_received_so_far(self):
+        llm, _ = self._llm(failing={"Q3"})
+
+        events = self._events(stream_responses(self.questions, "Be brief.", llm, 5, self.exam, checkpoint_every=2))
+
+        self.assertIn('error', events[-1])
+        evaluation = Evaluation.objects.get()
+        self.assertEqual(events[-1]['evaluation_id'], evaluation.id)
+        self.assertEqual(evaluation.status, Evaluation.RUNNING)
+        self.assertEqual(evaluation.questionevaluation_set.count(), 3)
+        self.assertEqual(evaluation.grade, 6.0)
+
+    def test_answers_are_checkpointed_while_streaming(self):
+        llm, _ = self._llm()
+        stream = stream_responses(self.questions, "", llm, 5, self.exam, checkpoint_every=2)
+
+        next(stream)
+        self.assertEqual(Evaluation.objects.count(), 0)
+        next(stream)
+        self.assertEqual(Evaluation.objects.get().questionevaluation_set.count(), 2)
+        stream.close()
+        self.assertEqual(QuestionEvaluation.objects.count(), 2)
+
+    def test_resume_continues_from_first_unanswered_question(self):
+        llm, _ = self._llm(failing={"Q3"})
+        list(stream_responses(self.questions, "Be brief.", llm, 5, self.exam, checkpoint_every=2))
+        evaluation = Evaluation.objects.get()
+
+        llm, asked = self._llm()
+        events = self._events(resume_evaluation(evaluation, llm))
+
+        self.assertEqual(asked, ["Q3", "Q4"])
+        self.assertEqual([e['question_number'] for e in events], [4, 5])
+        self.assertEqual(events[-1]['correct_count'], 5)
+        self.assertIn("Be brief.", events[-1]['response']['user_prompt'])
+        evaluation.refresh_from_db()
+        self.assertEqual(evaluation.status, Evaluation.DONE)
+        self.assertEqual(evaluation.grade, 10.0)
+        self.assertEqual(evaluation.questionevaluation_set.count(), 5)
+
+        with self.assertRaises(ValueError):
+            list(resume_evaluation(evaluation, llm))
+
+    def test_resume_numbers_questions_answered_out_of_order(self):
+        # Concurrent runs checkpoint in completion order, so the saved answers can have gaps
+        evaluation = Evaluation.objects.create(
+            prompt="", ev_date=timezone.now(), grade=0, model=self.model, exam=self.exam, time=0.0,
+            status=Evaluation.RUNNING
+        )
+        for question in (self.questions[0], self.questions[2], self.questions[4]):
+            QuestionEvaluation.objects.create(
+                evaluation=evaluation, question=question, question_option=question.correct_option
+            )
+
+        llm, asked = self._llm()
+        events = self._events(resume_evaluation(evaluation, llm))
+
+        self.assertEqual(asked, ["Q1", "Q3"])
+        self.assertEqual([e['question_number'] for e in events], [2, 4])
+        self.assertEqual([e['processed_questions'] for e in events], [4, 5])
+        self.assertEqual(events[-1]['correct_count'], 5)
+
+    def test_running_evaluations_are_left_out_of_the_analysis(self):
+        llm, _ = self._llm(failing={"Q3"})
+        list(stream_responses(self.questions, "", llm, 5, self.exam, checkpoint_every=2))
+        self.client.login(username='testuser', password='password')
+
+        response = self.client.get('/analysis/')
+
+        self.assertEqual(response.context['overall_model_averages'], [])
@@ -7,10 +7,45 @@ from django.contrib.auth.decorators import login_required
 from django.shortcuts import get_object_or_404
 import json
 import requests
+from django.conf import settings
+from genaigrader.llm_api import invalidate_validation_cache
 from genaigrader.services.get_models_service import get_models_for_user
 
 
-OLLAMA_BASE_URL = "http://localhost:11434"
+OLLAMA_BASE_URL = settings.OLLAMA_HOST
+
+# Optional answer limits of the model form, with their types; a blank value unsets the limit
+MODEL_LIMIT_FIELDS = {'max_answer_tokens': int, 'thinking_budget': int, 'question_timeout': float}
+
+
+def model_limits(data):
+    """Answer limits sent in the model form, leaving out the fields it does not include."""
+    return {
+        field: cast(data[field]) if data[field] else None
+        for field, cast in MODEL_LIMIT_FIELDS.items() if field in data
+    }
+
+
+def model_concurrency(data):
+    """
+    Concurrent evaluations sent in the model form.
+
+    Returns:
+    - int | None: The value, or None when the field is missing or blank.
+
+    Raises:
+    - ValueError: If the value is not an integer of at least 1.
+    """
+    value = data.get('max_concurrency')
+    if not value:
+        return None
+    try:
+        concurrency = int(value)
+    except ValueError:
+        concurrency = 0
+    if concurrency < 1:
+        raise ValueError('Max concurrency must be a whole number of at least 1.')
+    return concurrency
 
 @login_required
 def api_view(request):
@@ -25,9 +60,18 @@ def update_model(request, model_id):
     try:
         model = get_object_or_404(Model, id=model_id)
         data = QueryDict(request.body)
+        try:
+            max_concurrency = model_concurrency(data)
+        except ValueError as e:
+            return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+        invalidate_validation_cache(model.api_url, model.api_key)
         model.description = data.get('description')
         model.api_url = data.get('api_url')
         model.api_key = data.get('api_key')
+        if max_concurrency is not None:
+            model.max_concurrency = max_concurrency
+        for field, value in model_limits(data).items():
+            setattr(model, field, value)
         model.save()
         return JsonResponse({'status': 'success'})
     except Exception as e:
@@ -40,6 +84,7 @@ def delete_model(request, model_id):
 
         if not model.is_external and not request.user.is_superuser:
             return JsonResponse({'status': 'error', 'message': 'Permission denied. Only superusers can delete models.'}, status=403)
+        invalidate_validation_cache(model.api_url, model.api_key)
         model.delete()
         return JsonResponse({'status': 'success'})
     except Exception as e:
@@ -49,11 +94,17 @@ def delete_model(request, model_id):
 def create_model(request):
     try:
         data = QueryDict(request.body)
+        try:
+            max_concurrency = model_concurrency(data) or 1
+        except ValueError as e:
+            return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
         new_model = Model.objects.create(
             description=data['description'],
             api_url=data['api_url'],
             api_key=data['api_key'],
-            user=request.user
+            max_concurrency=max_concurrency,
+            user=request.user,
+            **model_limits(data)
         )
         return JsonResponse({
             'status': 'success',
@@ -62,6 +113,8 @@ def create_model(request):
                 'description': new_model.description,
                 'api_url': new_model.api_url,
                 'api_key': new_model.api_key,
+                'max_concurrency': new_model.max_concurrency,
+                **{field: getattr(new_model, field) for field in MODEL_LIMIT_FIELDS},
             }
         })
     except Exception as e:
@@ -1,180 +1,144 @@
 from django.db.models import Count, Q
-from django.shortcuts import render
+from django.shortcuts import get_object_or_404, render
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
-from genaigrader.models import Course, Exam, Model
+from genaigrader.models import BatchJob, Course, Evaluation, Exam
 from django.views.decorators.csrf import csrf_exempt
-from django.http import StreamingHttpResponse
+from django.views.decorators.http import require_GET, require_POST
+from django.http import HttpResponse, JsonResponse
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from genaigrader.services.batch_job_service import events_after, job_summary, submit_batch_job
+from genaigrader.services.estimator_service import estimate_batch
 from genaigrader.services.get_models_service import get_models_for_user
-from genaigrader.services.stream_service import stream_responses
-from genaigrader.llm_api import LlmApi
 import logging
 import json
-from typing import Generator, Iterable, List, Dict, Any
 
-def generate_eval_tasks(exams: Iterable, models: Iterable, repetitions: int) -> Generator:
+def parse_batch_request(request, exams, models):
     """
-    Generator that yields all combinations of exams, models, and repetitions.
+    Reads the batch form, sent as JSON or as form data.
     Args:
-        exams: Iterable of Exam objects.
-        models: Iterable of Model objects.
-        repetitions: Number of repetitions for each exam-model pair.
-    Yields:
-        Tuple of (exam, model, repetition number)
-    """
-    # Models are iterated before exams because loading a local model has
-    # a significant overhead, and we want to minimize the number of times
-    # we load the model.
-    for model in models:
-        for exam in exams:
-            for rep in range(1, repetitions + 1):
-                yield exam, model, rep
-
-def validate_exam(exam: Exam) -> Iterable:
-    """
-    Validates that the exam has questions.
-    Args:
-        exam: Exam object to validate.
-    Returns:
-        Queryset of questions for the exam.
-    Raises:
-        ValueError: If the exam has no questions.
-    """
-    questions = exam.question_set.prefetch_related('questionoption_set').all()
-    if not questions.exists():
-        raise ValueError(f"Exam {exam} has no questions.")
-    return questions
-
-def validate_model(model: Model) -> 'LlmApi':
-    """
-    Validates the model by initializing and validating an LlmApi instance.
-    Args:
-        model: Model object to validate.
+        request: Django HttpRequest object (POST).
+        exams: Queryset of all exams for the user.
+        models: List of all models available to the user.
     Returns:
-        LlmApi instance.
+        Dictionary with the selected 'exams' and 'models', 'repetitions', 'user_prompt',
+        'use_cache', and the optional 'target_half_width' and 'deadline'.
     Raises:
-        ValueError: If the model is invalid.
-    """
-    llm = LlmApi(model)
-    llm.validate()
-    return llm
-
-def extract_summary(responses: List[str]) -> Dict[str, Any] | None:
-    """
-    Extracts summary information from the evaluation responses.
-    Args:
-        responses: List of response strings. Each response is expected to be a JSON string
-            with keys 'correct_count', 'total_time', and 'total_questions'.
-    Returns:
-        Dictionary with grade and time, or None if not found.
+        ValueError: If the repetitions or the target half-width are not numbers.
     """
-    for r in reversed(responses):
-        try:
-            data = json.loads(r.replace('data: ', '').strip())
-            if {'correct_count', 'total_time', 'total_questions'}.issubset(data):
-                
-                normalized_score = round(data['correct_count'] / data['total_questions'] * 10, 2)
-                return {
-                    'grade': f"{normalized_score} ({data['correct_count']}/{data['total_questions']})",
-                    'time': data['total_time']
-                }
-        except json.JSONDecodeError as e:
-            logging.warning(f"Failed to decode JSON in extract_summary: {e}")
-            continue
-    return None
-
-def batch_stream(exams_to_eval: Iterable, models_to_eval: Iterable, repetitions: int, user_prompt: str) -> Generator[str, None, None]:
-    """
-    Streams batch evaluation results for all combinations of exams, models, and repetitions.
-    Args:
-        exams_to_eval: Iterable of Exam objects to evaluate.
-        models_to_eval: Iterable of Model objects to evaluate.
-        repetitions: Number of repetitions for each combination.
-        user_prompt: User-provided prompt to use for all evaluations.
-    Yields:
-        String chunks for streaming HTTP response.
-    """
-    total_tasks = len(exams_to_eval) * len(models_to_eval) * repetitions
-    eval_count = 0
-
-    for exam, model, rep in generate_eval_tasks(exams_to_eval, models_to_eval, repetitions):
-        try:
-            questions = validate_exam(exam)
-        except ValueError as e:
-            logging.warning(str(e))
-            yield f"data: {json.dumps({'error': str(e)})}\n\n"
-            continue
-
-        try:
-            llm = validate_model(model)
-        except ValueError as e:
-            error_msg = f"Model {model}: {str(e)}"
-            logging.warning(error_msg)
-            yield f"data: {json.dumps({'error': error_msg})}\n\n"
-            continue
-
-        try:
-            eval_count += 1
-            subject_name = getattr(exam.course, 'name', '')
-            progress_msg = (
-                f"Eval {eval_count}/{total_tasks} - "
-                f"Model: <b>{model.description}</b> Subject: <b>{subject_name}</b> "
-                f"Exam: <b>{exam.description}</b> Repetition: {rep}/{repetitions}"
-            )
-            logging.info(f"Progress: {progress_msg}")
-            yield f"data: {json.dumps({'progress': progress_msg})}\n\n"
-
-            responses = []
-            for chunk in stream_responses(questions, user_prompt, llm, len(questions), exam):
-                responses.append(chunk)
-                logging.info(f"Yielding chunk: {chunk[:100]}")
-                yield chunk
-
-            summary = extract_summary(responses)
-            if summary:
-                yield f"data: {json.dumps({'eval_result': summary})}\n\n"
-        except Exception as e:
-            error_msg = f"Error during {progress_msg}: {str(e)}"
-            logging.warning(error_msg)
-            yield f"data: {json.dumps({'error': error_msg})}\n\n"
-
-    yield f"data: {json.dumps({'done': True})}\n\n"
+    if request.content_type == 'application/json':
+        data = json.loads(request.body)
+        get, getlist = data.get, lambda key: data.get(key, [])
+    else:
+        get, getlist = request.POST.get, request.POST.getlist
+    selected_exam_ids = getlist('exams[]')
+    selected_model_ids = [str(model_id) for model_id in getlist('models[]')]
+
+    try:
+        repetitions = int(get('repetitions', 1))
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid number of repetitions: {get('repetitions')!r}")
+
+    # Adaptive repetitions and deadlines are optional: blank values disable them
+    target_half_width = get('target_half_width')
+    try:
+        target_half_width = float(target_half_width) if target_half_width not in (None, '') else None
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid target half-width: {target_half_width!r}")
+    deadline = parse_datetime(get('deadline') or '')
+    if deadline is not None and timezone.is_naive(deadline):
+        deadline = timezone.make_aware(deadline)
+
+    return {
+        'exams': exams.filter(id__in=selected_exam_ids),
+        'models': [m for m in models if str(m.id) in selected_model_ids],
+        'repetitions': repetitions,
+        'user_prompt': get('user_prompt', ''),
+        'use_cache': get('use_cache') == 'on',
+        'target_half_width': target_half_width,
+        'deadline': deadline,
+    }
 
 def handle_batch_evaluations_post(request, user, exams, models):
     """
-    Handles the POST logic for batch evaluations: parses request, filters objects, and returns StreamingHttpResponse.
+    Handles the POST logic for batch evaluations: parses request, filters objects, and submits a batch job.
     Args:
         request: Django HttpRequest object (POST).
         user: The current user.
         exams: Queryset of all exams for the user.
         models: Queryset of all models.
     Returns:
-        StreamingHttpResponse for the batch evaluation stream.
+        JsonResponse with the job id and the URLs to follow it. The batch is
+        run by the `run_batch_worker` processes. A 400 response if the form is invalid.
     """
     logging.warning('Batch evaluation POST received')
-    if request.content_type == 'application/json':
-        data = json.loads(request.body)
-        selected_exam_ids = data.get('exams[]', [])
-        selected_model_ids = data.get('models[]', [])
-        repetitions = int(data.get('repetitions', 1))
-        user_prompt = data.get('user_prompt', '')
-    else:
-        selected_exam_ids = request.POST.getlist('exams[]')
-        selected_model_ids = request.POST.getlist('models[]')
-        repetitions = int(request.POST.get('repetitions', 1))
-        user_prompt = request.POST.get('user_prompt', '')
-
-    logging.warning(f'selected_exam_ids: {selected_exam_ids}, selected_model_ids: {selected_model_ids}, repetitions: {repetitions}, user_prompt: {user_prompt}')
+    try:
+        batch = parse_batch_request(request, exams, models)
+        logging.warning(f"exams_to_eval: {[e.id for e in batch['exams']]}, models_to_eval: {[m.id for m in batch['models']]}, "
+                        f"repetitions: {batch['repetitions']}, user_prompt: {batch['user_prompt']}")
+
+        job = submit_batch_job(
+            user, batch['exams'], batch['models'], batch['repetitions'], batch['user_prompt'], batch['use_cache'],
+            batch['target_half_width'], batch['deadline']
+        )
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    return JsonResponse({
+        'job_id': job.id,
+        'status_url': reverse('batch_job_status', args=[job.id]),
+        'events_url': reverse('batch_job_events', args=[job.id]),
+    })
 
-    exams_to_eval = exams.filter(id__in=selected_exam_ids)
-    models_to_eval = [m for m in models if str(m.id) in selected_model_ids]
-    logging.warning(f'exams_to_eval: {[e.id for e in exams_to_eval]}, models_to_eval: {[m.id for m in models_to_eval]}')
+@login_required
+@require_GET
+def batch_job_status(request, job_id):
+    """Returns the state of a batch job and of each of its tasks."""
+    job = get_object_or_404(BatchJob, id=job_id, user=request.user)
+    return JsonResponse(job_summary(job))
 
-    return StreamingHttpResponse(
-        batch_stream(exams_to_eval, models_to_eval, repetitions, user_prompt),
+@login_required
+@require_GET
+def batch_job_events(request, job_id):
+    """
+    Events of a batch job stored after the Last-Event-ID header (or an `after`
+    query parameter), as server-sent events with their ids. The response does
+    not wait for new events, so no server thread is held while the job runs:
+    clients poll again with the id of the last event they got, until the
+    'done' event.
+    """
+    job = get_object_or_404(BatchJob, id=job_id, user=request.user)
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('after') or 0
+    try:
+        last_event_id = int(last_event_id)
+    except ValueError:
+        last_event_id = 0
+    events = events_after(job, last_event_id)
+    return HttpResponse(
+        ''.join(f"id: {event_id}\ndata: {data}\n\n" for event_id, data in events),
         content_type="text/event-stream"
     )
 
+@login_required
+@csrf_exempt
+@require_POST
+def batch_estimate_view(request):
+    """
+    Plans a batch without submitting it: estimated duration of each evaluation
+    and of the whole batch, with 95% bounds, from the past evaluations of the
+    selected models. Takes the same data as the batch form.
+    """
+    local_models, external_models = get_models_for_user(request.user)
+    try:
+        batch = parse_batch_request(
+            request, Exam.objects.filter(user=request.user), list(local_models) + list(external_models)
+        )
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    return JsonResponse(estimate_batch(
+        list(batch['exams']), batch['models'], batch['repetitions'], batch['user_prompt']
+    ))
+
 @login_required
 @csrf_exempt
 def batch_evaluations_view(request):
@@ -188,15 +152,15 @@ def batch_evaluations_view(request):
     """
     user = request.user
     exams = Exam.objects.filter(user=user)
-    exams = exams.annotate(eval_count=Count('evaluation', filter=Q(evaluation__exam__user=user)))
+    exams = exams.annotate(eval_count=Count('evaluation', filter=Q(evaluation__exam__user=user, evaluation__status=Evaluation.DONE)))
     courses = Course.objects.filter(user=user)
 
  
     local_models, external_models = get_models_for_user(user)
 
     # Annotate models with evaluation count, but only count evaluations by the current user
-    local_models = local_models.annotate(eval_count=Count('evaluation', filter=Q(evaluation__exam__user=user)))
-    external_models = external_models.annotate(eval_count=Count('evaluation', filter=Q(evaluation__exam__user=user)))
+    local_models = local_models.annotate(eval_count=Count('evaluation', filter=Q(evaluation__exam__user=user, evaluation__status=Evaluation.DONE)))
+    external_models = external_models.annotate(eval_count=Count('evaluation', filter=Q(evaluation__exam__user=user, evaluation__status=Evaluation.DONE)))
 
     # Group exams by course
     courses_with_exams = {}
@@ -5,9 +5,12 @@ from django.http import JsonResponse, QueryDict
 from django.views.decorators.http import require_http_methods
 from genaigrader.services.course_service import create_new_course
 from django.core.exceptions import ValidationError
-from django.http import HttpResponse
-import csv
-from genaigrader.models import Evaluation, Course
+from genaigrader.models import Evaluation, QuestionEvaluation
+from genaigrader.services.export_service import (
+    EVALUATION_HEADER, QUESTION_HEADER, evaluation_rows, question_evaluation_rows, streaming_csv_response
+)
+from genaigrader.services.columnar_export_service import arrow_available, export_archive
+from django.http import FileResponse
 from django.shortcuts import get_object_or_404
 
 @login_required
@@ -26,7 +29,7 @@ def course_view(request):
         except ValidationError as e:
             return JsonResponse({'status': 'error', 'message': e.message}, status=400)
     courses = Course.objects.filter(user=request.user).prefetch_related('exam_set')
-    return render(request, 'course.html', {'courses': courses})
+    return render(request, 'course.html', {'courses': courses, 'columnar_export': arrow_available()})
 
 @login_required
 @require_http_methods(["PUT"])
@@ -88,82 +91,36 @@ def delete_exam(request, exam_id):
     
 @login_required
 def export_all_evaluations(request):
-    # Set response
-    response = HttpResponse(content_type='text/csv; charset=utf-8-sig')  # Encoding for Excel
-    response['Content-Disposition'] = 'attachment; filename="all_evaluations.csv"'
-    
-    # Create CSV writer
-    writer = csv.writer(response, delimiter=',', quoting=csv.QUOTE_ALL)
-    
-    # Write header
-    writer.writerow([
-        'Course', 
-        'Exam', 
-        'Date', 
-        'Model', 
-        'Prompt', 
-        'Grade', 
-        'Time (s)'
-    ])
-    
-    # Get evaluations with related data
+    # Streamed in chunks, so large histories are not held in memory
     evaluations = Evaluation.objects.filter(
         exam__course__user=request.user
-    ).select_related(
-        'exam__course', 
-        'model'
     ).order_by('exam__course__name', 'exam__description')
-    
-    # Write rows
-    for eval in evaluations:
-        writer.writerow([
-            eval.exam.course.name,
-            eval.exam.description,
-            eval.ev_date.strftime("%d/%m/%Y %H:%M:%S"),
-            eval.model.description,
-            eval.prompt,
-            str(eval.grade).replace('.', ','),
-            str(round(eval.time, 2)).replace('.', ',')
-        ])
-    
-    return response
+    return streaming_csv_response('all_evaluations.csv', EVALUATION_HEADER, evaluation_rows(evaluations))
 
 @login_required
 def export_course_evaluations(request, course_id):
     # Verify course
     course = get_object_or_404(Course, id=course_id, user=request.user)
-    
-    # Set response
-    response = HttpResponse(content_type='text/csv; charset=utf-8-sig')
-    response['Content-Disposition'] = f'attachment; filename="evaluations_{course.name}.csv"'
-    
-    # Create writer
-    writer = csv.writer(response, delimiter=',', quoting=csv.QUOTE_ALL)
-    
-    # Write header
-    writer.writerow([
-        'Exam', 
-        'Date', 
-        'Model', 
-        'Prompt', 
-        'Grade', 
-        'Time (s)'
-    ])
-    
-    # Get evaluations
-    evaluations = Evaluation.objects.filter(
-        exam__course=course
-    ).select_related('exam', 'model')
-    
-    # Write rows
-    for eval in evaluations:
-        writer.writerow([
-            eval.exam.description,
-            eval.ev_date.strftime("%d/%m/%Y %H:%M:%S"),
-            eval.model.description,
-            eval.prompt,
-            str(eval.grade).replace('.', ','),
-            str(round(eval.time, 2)).replace('.', ',')
-        ])
-    
-    return response
\ No newline at end of file
+    evaluations = Evaluation.objects.filter(exam__course=course).order_by('exam__description', 'id')
+    return streaming_csv_response(
+        f'evaluations_{course.name}.csv', EVALUATION_HEADER[1:], evaluation_rows(evaluations, with_course=False)
+    )
+
+@login_required
+def export_question_evaluations(request, course_id=None):
+    """Answers of every evaluation, one row per question, of all the courses or of one of them."""
+    answers = QuestionEvaluation.objects.filter(evaluation__exam__course__user=request.user)
+    filename = 'all_answers.csv'
+    if course_id is not None:
+        course = get_object_or_404(Course, id=course_id, user=request.user)
+        answers = answers.filter(evaluation__exam__course=course)
+        filename = f'answers_{course.name}.csv'
+    return streaming_csv_response(filename, QUESTION_HEADER, question_evaluation_rows(answers))
+
+@login_required
+def export_columnar_data(request):
+    """Evaluations, answers and their courses, exams, models and questions as typed Parquet (or Arrow) tables in a zip."""
+    if not arrow_available():
+        return JsonResponse({'status': 'error', 'message': 'Columnar exports need pyarrow'}, status=501)
+    return FileResponse(export_archive(request.user), as_attachment=True, filename='evaluation_data.zip')
+
@@ -2,6 +2,7 @@ from django.views.decorators.csrf import csrf_exempt
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
 from genaigrader.models import Course, Model
+from genaigrader.services.exam_import_service import accepted_extensions
 from genaigrader.services.get_models_service import get_models_for_user
 from genaigrader.services.upload_file_service import handle_file_upload
 
@@ -14,6 +15,7 @@ def evaluate_view(request):
         "courses": courses,
         "local_models": local_models,
         "external_models": external_models,
+        "exam_extensions": ",".join(accepted_extensions()),
     })
 
 
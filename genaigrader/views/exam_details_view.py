@@ -1,9 +1,12 @@
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from genaigrader.models import Exam, Evaluation
-from django.views.decorators.http import require_http_methods
-from genaigrader.services.graphics_service import process_evaluations_for_graphics, compute_model_statistics
+from django.views.decorators.http import condition, require_http_methods
+from genaigrader.llm_api import LlmApi
+from genaigrader.services.dashboard_cache_service import cached_dashboard, data_etag
+from genaigrader.services.graphics_service import exam_statistics
+from genaigrader.services.stream_service import resume_evaluation
 
 @login_required
 def exam_detail(request, exam_id):
@@ -18,19 +21,38 @@ def exam_detail(request, exam_id):
         course__user=request.user
     )
     
-    evaluations = exam.evaluation_set.all()
-    model_values = process_evaluations_for_graphics(evaluations)
-    model_averages, time_averages = compute_model_statistics(model_values)
+    # Unfinished evaluations are listed so they can be resumed; the statistics only count finished ones
+    statistics = _exam_statistics(request.user, exam)
+    questions = list(exam.question_set.all())
+    for question in questions:
+        question.accuracy = statistics['question_accuracy'].get(question.id)
     
     return render(request, 'exam_detail.html', {
         'exam': exam,
         'course': exam.course,
-        'questions': exam.question_set.all(),
-        'evaluations': evaluations,
-        'model_averages': model_averages,
-        'time_averages': time_averages
+        'questions': questions,
+        'evaluations': exam.evaluation_set.all(),
+        'model_averages': statistics['model_averages'],
+        'time_averages': statistics['time_averages'],
     })
 
+def _exam_etag(request, exam_id):
+    # Checked before the ETag, so a 304 is never sent for another user's exam;
+    # without an ETag the view runs and answers 404.
+    if not Exam.objects.filter(id=exam_id, course__user=request.user).exists():
+        return None
+    return data_etag(request.user.id, f'exam-{exam_id}')
+
+@login_required
+@condition(etag_func=_exam_etag)
+def exam_statistics_data(request, exam_id):
+    """JSON of the statistics of an exam; unchanged data is answered with 304 after two queries."""
+    exam = get_object_or_404(Exam, id=exam_id, course__user=request.user)
+    return JsonResponse(_exam_statistics(request.user, exam))
+
+def _exam_statistics(user, exam):
+    return cached_dashboard(user.id, f'exam-{exam.id}', lambda: exam_statistics(exam))
+
 @login_required
 @require_http_methods(["DELETE"])
 def delete_evaluation(request, eval_id):
@@ -43,4 +65,25 @@ def delete_evaluation(request, eval_id):
         evaluation.delete()
         return JsonResponse({'status': 'success'})
     except Exception as e:
-        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
\ No newline at end of file
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+@login_required
+@require_http_methods(["POST"])
+def resume_evaluation_view(request, eval_id):
+    """Continue an interrupted evaluation, streaming the remaining answers."""
+    evaluation = get_object_or_404(
+        Evaluation.objects.select_related('exam', 'model'),
+        id=eval_id,
+        exam__course__user=request.user,
+        status=Evaluation.RUNNING
+    )
+    try:
+        llm = LlmApi(evaluation.model)
+        llm.validate()
+    except ValueError as e:
+        return HttpResponse(f"Error: {str(e)}", status=400)
+
+    return StreamingHttpResponse(
+        resume_evaluation(evaluation, llm, use_cache=request.POST.get('use_cache') == 'on'),
+        content_type='text/event-stream'
+    )
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -30,6 +31,8 @@ ALLOWED_HOSTS = []
 FILE_UPLOAD_HANDLERS = ["django.core.files.uploadhandler.TemporaryFileUploadHandler"]
 DATA_UPLOAD_MAX_MEMORY_SIZE = 10485760  # 10 MB
 FILE_UPLOAD_MAX_MEMORY_SIZE = 10485760  # 10 MB
+# Raw exam uploads, stored under the SHA-256 of their content
+UPLOADED_FILES_DIR = BASE_DIR / 'uploaded_files'
 
 
 # Application definition
@@ -82,6 +85,8 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Batch workers write from several threads; wait for locks instead of failing
+        'OPTIONS': {'timeout': 20},
     }
 }
 
@@ -129,5 +134,29 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Maximum number of model answers kept in the persistent response cache.
+# The least recently used entries are evicted beyond this size.
+LLM_RESPONSE_CACHE_MAX_ENTRIES = 100_000
+
+# Rows per INSERT/UPDATE statement when exams and evaluation results are
+# written with bulk_create/bulk_update.
+BULK_BATCH_SIZE = 500
+
+# Batch workers: evaluations run at once by a worker, and evaluations run at
+# once against each external API endpoint. A local Ollama host always runs
+# one evaluation at a time.
+BATCH_WORKER_THREADS = 8
+EXTERNAL_ENDPOINT_SLOTS = 4
+# Order in which batch workers pick tasks: 'queue', 'sjf' (shortest estimated first) or 'deadline'
+BATCH_TASK_ORDER = 'queue'
+# Seconds a worker holds a claimed batch task without renewing its lease. Workers
+# renew the leases of their running tasks every third of this; the tasks of a
+# worker that stops renewing are put back in the queue for the other workers.
+BATCH_TASK_LEASE = 60
+
+# Ollama instance used by this process: the web app (e.g. to pull models) and
+# the batch workers, which can run on several hosts, each with its own Ollama.
+OLLAMA_HOST = os.environ.get('OLLAMA_HOST', 'http://localhost:11434')
+
 LOGIN_REDIRECT_URL = 'home'  # Redirect here after logging in
 LOGOUT_REDIRECT_URL = 'login'  # Redirect here after logging out
\ No newline at end of file
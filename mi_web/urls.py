@@ -18,11 +18,11 @@ from django.contrib import admin
 from django.urls import path
 from django.contrib.auth import views as auth_views  
 from genaigrader.views.auth_views import signup  
-from genaigrader.views.course_views import course_view, update_course, delete_course, delete_exam, update_exam, export_all_evaluations, export_course_evaluations
+from genaigrader.views.course_views import course_view, update_course, delete_course, delete_exam, update_exam, export_all_evaluations, export_course_evaluations, export_question_evaluations, export_columnar_data
 from genaigrader.views.evaluate_views import evaluate_view, upload_file
-from genaigrader.views.batch_evaluations_view import batch_evaluations_view
-from genaigrader.views.exam_details_view import exam_detail, delete_evaluation
-from genaigrader.views.analysis_view import analysis_view
+from genaigrader.views.batch_evaluations_view import batch_estimate_view, batch_evaluations_view, batch_job_events, batch_job_status
+from genaigrader.views.exam_details_view import exam_detail, exam_statistics_data, delete_evaluation, resume_evaluation_view
+from genaigrader.views.analysis_view import analysis_view, analysis_data
 from genaigrader.views.api_views import api_view, update_model, delete_model, create_model, pull_model
 from genaigrader.views.home_view import home_view
 
@@ -39,13 +39,22 @@ urlpatterns = [
     path('course/', course_view, name='course'),
     path('upload/', upload_file, name='upload_file'),
     path('exam/<int:exam_id>/', exam_detail, name='exam_detail'),
+    path('exam/<int:exam_id>/data/', exam_statistics_data, name='exam_statistics_data'),
     path('analysis/', analysis_view, name='analysis'),
+    path('analysis/data/', analysis_data, name='analysis_data'),
     path('api/', api_view, name='api'),
     path('batch-evaluations/', batch_evaluations_view, name='batch_evaluations'),
+    path('batch-evaluations/estimate/', batch_estimate_view, name='batch_estimate'),
+    path('batch-jobs/<int:job_id>/', batch_job_status, name='batch_job_status'),
+    path('batch-jobs/<int:job_id>/events/', batch_job_events, name='batch_job_events'),
 
     path('export/all/', export_all_evaluations, name='export_all_evaluations'),
     path('export/course/<int:course_id>/', export_course_evaluations, name='export_course_evaluations'),
+    path('export/answers/', export_question_evaluations, name='export_question_evaluations'),
+    path('export/columnar/', export_columnar_data, name='export_columnar_data'),
+    path('export/course/<int:course_id>/answers/', export_question_evaluations, name='export_course_question_evaluations'),
     path('evaluation/delete/<int:eval_id>/', delete_evaluation, name='delete_evaluation'),
+    path('evaluation/resume/<int:eval_id>/', resume_evaluation_view, name='resume_evaluation'),
     path('course/update/<int:course_id>/', update_course, name='update_course'),
     path('course/delete/<int:course_id>/', delete_course, name='delete_course'),
     path('course/exam/update/<int:exam_id>/', update_exam, name='update_exam'),
@@ -66,5 +66,10 @@ tmux send-keys -t "$SESSION_NAME" "uv run gunicorn $GUNICORN_APP \
     --timeout 6000 \
     --env DJANGO_SETTINGS_MODULE=$SETTINGS_MODULE > /dev/null 2>&1 &" C-m
 
+# Start the batch evaluation worker. A fixed name lets it requeue the tasks
+# it was running if it is killed.
+tmux send-keys -t "$SESSION_NAME" "uv run python manage.py run_batch_worker --name $(hostname)-worker \
+    --settings=$SETTINGS_MODULE >> $LOGFILE 2>&1 & echo \$! > batch_worker.pid" C-m
+
 echo "🟢 App running at: https://$NGROK_URL"
 echo "📦 tmux session: $SESSION_NAME"
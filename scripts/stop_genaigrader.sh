@@ -14,6 +14,16 @@ else
     echo "ℹ️ Gunicorn PID not found. Skipping."
 fi
 
+# Stop the batch worker if running
+if [ -f batch_worker.pid ]; then
+    WORKER_PID=$(cat batch_worker.pid)
+    echo "🛑 Stopping batch worker (PID $WORKER_PID)..."
+    kill "$WORKER_PID" && rm -f batch_worker.pid
+    echo "✅ Batch worker stopped."
+else
+    echo "ℹ️ Batch worker PID not found. Skipping."
+fi
+
 # Stop Ollama if running
 if [ -f ollama.pid ]; then
     OLLAMA_PID=$(cat ollama.pid)
@@ -68,6 +68,13 @@ document.addEventListener("DOMContentLoaded", () => {
         const desc = document.getElementById('desc').value.trim();
         const url = document.getElementById('url').value.trim();
         const key = document.getElementById('key').value.trim();
+        const concurrency = document.getElementById('concurrency').value || '1';
+        // Optional answer limits: blank fields leave them unset
+        const limits = {
+            max_answer_tokens: document.getElementById('max-answer-tokens').value,
+            thinking_budget: document.getElementById('thinking-budget').value,
+            question_timeout: document.getElementById('question-timeout').value
+        };
 
         if (!desc || !url || !key) {
             alert('All fields are required');
@@ -81,7 +88,7 @@ document.addEventListener("DOMContentLoaded", () => {
                     'Content-Type': 'application/x-www-form-urlencoded',
                     'X-CSRFToken': getCookie('csrftoken')
                 },
-                body: new URLSearchParams({description: desc, api_url: url, api_key: key})
+                body: new URLSearchParams({description: desc, api_url: url, api_key: key, max_concurrency: concurrency, ...limits})
             });
             
             const data = await response.json();
@@ -104,6 +111,10 @@ document.addEventListener("DOMContentLoaded", () => {
                 document.getElementById('desc').value = '';
                 document.getElementById('url').value = '';
                 document.getElementById('key').value = '';
+                document.getElementById('concurrency').value = '1';
+                Object.keys(limits).forEach(field => {
+                    document.getElementById(field.replace(/_/g, '-')).value = '';
+                });
             } else {
                 throw new Error(data.message || 'Server error');
             }
@@ -1,3 +1,8 @@
+// localStorage key of the batch job this browser is following
+const ACTIVE_BATCH_JOB_KEY = "activeBatchJob";
+// Milliseconds between two polls of a batch job that sent no new events
+const BATCH_EVENTS_POLL_INTERVAL = 1000;
+
 /**
  * Parses a progress string from the batch evaluation stream.
  * @param {string} progressStr - The progress string to parse.
@@ -21,6 +26,22 @@ function parseProgress(progressStr) {
   };
 }
 
+/**
+ * Returns the UI state of a batch task (its table row data and details
+ * container), creating it on first use. Events of in-process batches carry
+ * no task id and share one state.
+ * @param {number|undefined} taskId - The task id sent with the event.
+ * @returns {object} The mutable state of the task.
+ */
+function batchTaskState(taskId) {
+  window._batchTaskStates = window._batchTaskStates || {};
+  const key = taskId === undefined ? 'default' : taskId;
+  if (!window._batchTaskStates[key]) {
+    window._batchTaskStates[key] = {};
+  }
+  return window._batchTaskStates[key];
+}
+
 /**
  * Updates the progress bar UI with the current evaluation progress.
  * @param {object} progress - The progress object returned by parseProgress.
@@ -56,50 +77,28 @@ function collectBatchEvalFormData(formElem) {
 }
 
 /**
- * Handles the streaming response from the batch evaluation POST request.
- * Reads and processes each chunk of streamed data.
+ * Handles one page of events of a batch job.
+ * Processes each event and returns the id of the last one.
  * @param {Response} response - The fetch response object.
- * @returns {Promise<void>} Resolves when the stream is fully processed.
+ * @param {number} afterId - Id of the last event already processed.
+ * @returns {Promise<number>} Resolves with the id of the last processed event.
  */
-function handleBatchEvalStream(response) {
+function handleBatchEvalEvents(response, afterId) {
   if (!response.ok) {
     $("#loading-indicator").hide();
-    $("#batch-eval-results").html("Error starting batch evaluation.");
+    $("#batch-eval-results").html("Error following batch evaluation.");
     throw new Error("Network response was not ok");
   }
 
-  const reader = response.body.getReader();
-  const decoder = new TextDecoder("utf-8");
-  let buffer = '';
-  window._batchEvalFinished = false; // To detect if the stream finished normally
-
-  function processStream({ done, value }) {
-    if (done) {
-      $("#loading-indicator").hide();
-
-      // If the "done" message was not received, we assume the stream was interrupted
-      if (!window._batchEvalFinished) {
-        const now = new Date();
-        const datetimeStr = now.toLocaleString();
-        $("#batch-eval-errors").append(
-          `<div class="batch-eval-error">
-            <span class="batch-eval-error-date">${datetimeStr}</span>
-            Evaluation stream was interrupted or did not finish properly.
-            Please check the server logs for more details.
-          </div>`
-        );
-      }
-
-      return;
-    }
-
-    buffer += decoder.decode(value, { stream: true });
-    const chunks = buffer.split("\n\n");
-    buffer = chunks.pop() || '';
-    chunks.forEach(chunk => processBatchEvalChunk(chunk));
-    return reader.read().then(processStream);
-  }
-  return reader.read().then(processStream);
+  return response.text().then((text) => {
+    let lastId = afterId;
+    text.split("\n\n").filter(chunk => chunk.trim()).forEach((chunk) => {
+      const idLine = chunk.split("\n").find(line => line.startsWith("id: "));
+      if (idLine) lastId = parseInt(idLine.slice(4), 10);
+      processBatchEvalChunk(chunk);
+    });
+    return lastId;
+  });
 }
 
 /**
@@ -108,15 +107,18 @@ function handleBatchEvalStream(response) {
  * @param {string} chunk - The chunk of data to process.
  */
 function processBatchEvalChunk(chunk) {
-  if (chunk.trim() === "") return;
+  // Server-sent event format: "id: ..." and "data: ..." lines
+  const dataLines = chunk.split("\n").filter(line => line.startsWith("data: "));
+  if (dataLines.length === 0) return;
   try {
-    const data = JSON.parse(chunk.replace("data: ", ""));
+    const data = JSON.parse(dataLines.map(line => line.slice(6)).join("\n"));
+    const task = batchTaskState(data.task);
     if (data.error) {
       // Add a row to the table indicating that there was an error
-      const lastRow = window._batchEvalLastRow || {};
+      const lastRow = task.lastRow || {};
       const now = new Date();
       const datetimeStr = now.toLocaleString();
-      const evalId = window._lastEvalId || '';
+      const evalId = task.evalId || '';
       const headingLink = `<a href="#${evalId}" class="details-link" title="View details"><span class="details-icon" aria-label="Details">🔍</span></a>`;
 
       $("#batch-eval-table").show();
@@ -139,7 +141,7 @@ function processBatchEvalChunk(chunk) {
     } else if (data.progress) {
       const progress = parseProgress(data.progress);
       if (progress) {
-        window._batchEvalLastRow = {
+        task.lastRow = {
           model: progress.model,
           subject: progress.subject,
           exam: progress.exam,
@@ -147,8 +149,8 @@ function processBatchEvalChunk(chunk) {
           totalReps: progress.totalReps,
         };
         // Store current subject and exam for heading
-        window._currentExamDetailKey = `${progress.subject}|||${progress.exam}`;
-        window._examDetailHeadingShown = false;
+        task.examDetailKey = `${progress.subject}|||${progress.exam}`;
+        task.headingShown = false;
         updateProgressBar(progress);
         $("#batch-eval-results").html(`<div class="batch-eval-progress-detail">${progress.detailMsg}</div>`);
       } else {
@@ -157,18 +159,18 @@ function processBatchEvalChunk(chunk) {
     } else if (data.processed_questions && data.response) {
       // Show per-question result as it arrives
       // Insert heading if not already shown for this exam
-      if (!window._examDetailHeadingShown) {
-        const key = window._currentExamDetailKey || '';
+      if (!task.headingShown) {
+        const key = task.examDetailKey || '';
         if (key) {
           const [subject, exam] = key.split('|||');
-          const lastRow = window._batchEvalLastRow || {};
+          const lastRow = task.lastRow || {};
           const model = lastRow.model || '-';
           const repetition = lastRow.repetition || '-';
           const totalReps = lastRow.totalReps || '-';
 
           // Create a unique evalId for this evaluation
           const evalId = `eval-${btoa(`${model}|${subject}|${exam}|${repetition}|${Date.now()}`).replace(/[^a-zA-Z0-9]/g, '')}`;
-          window._lastEvalId = evalId; // Store for use in table row
+          task.evalId = evalId; // Store for use in table row
 
           const headingHtml = `
             <div id="${evalId}" class="exam-detail-heading exam-detail-heading-margin eval-details-section">
@@ -177,30 +179,33 @@ function processBatchEvalChunk(chunk) {
               <span class="exam-detail-label">Exam:</span> <span class="exam-detail-value">${exam} - </span>
               <span class="exam-detail-label">Repetition:</span> <span class="exam-detail-value">${repetition}/${totalReps}</span>
             </div>
+            <div id="${evalId}-questions"></div>
           `;
           $("#exam-details").append(headingHtml);
         }
-        window._examDetailHeadingShown = true;
+        task.headingShown = true;
       }
       const response = data.response;
       const detailsHtml = `
         <div class="exam-detail-box">
           <b>Question ${data.processed_questions}:</b>
           <pre>${response.question_prompt}</pre>
-          <b>Model response:</b> <span class="model-response-text ${response.is_correct ? 'correct-response' : 'incorrect-response'}">${response.response}</span><br>
+          <b>Model response:</b> <span class="model-response-text ${response.is_correct ? 'correct-response' : 'incorrect-response'}">${response.response}</span>${data.cached ? ' <span class="cached-response">(cached)</span>' : ''}<br>
           <b>Correct option:</b> ${response.correct_option}
           <span class="correctness-icon">${response.is_correct ? "✅" : "❌"}</span>
           <div class="question-time">Time: ${data.time || "-"}s</div>
         </div>
       `;
-      $("#exam-details").append(detailsHtml);
+      // Each evaluation has its own container, since several may run at once
+      const $questions = task.evalId ? $(`#${task.evalId}-questions`) : $("#exam-details");
+      $questions.append(detailsHtml);
 
       // Add Back to Top link after the last question
       if (
         (typeof response.total_questions !== 'undefined' && data.processed_questions == response.total_questions) ||
         (typeof data.total_questions !== 'undefined' && data.processed_questions == data.total_questions)
       ) {
-        $("#exam-details").append('<div class="back-to-top-link-container"><a href="#top" class="back-to-top-link no-underline">⬆ Back to Top</a></div>');
+        $questions.append('<div class="back-to-top-link-container"><a href="#top" class="back-to-top-link no-underline">⬆ Back to Top</a></div>');
       }
 
     } else if (data.response) {
@@ -234,12 +239,12 @@ function processBatchEvalChunk(chunk) {
       $("#batch-eval-summary").insertAfter("#batch-eval-results > div:first-child");
 
       // --- Add row to table ---
-      const lastRow = window._batchEvalLastRow || {};
+      const lastRow = task.lastRow || {};
       const now = new Date();
       const datetimeStr = now.toLocaleString();
 
-      // Use the lastEvalId created with the headingHtml for the link
-      const evalId = window._lastEvalId || '';
+      // Use the evalId created with the headingHtml for the link
+      const evalId = task.evalId || '';
       const headingLink = `<a href="#${evalId}" class="details-link" title="View details"><span class="details-icon" aria-label="Details">🔍</span></a>`;
       $("#batch-eval-table").show();
       $("#batch-eval-table tbody").append(
@@ -257,15 +262,30 @@ function processBatchEvalChunk(chunk) {
         // Now append the details section after the table row
         $("#exam-details").append(`<div id="${evalId}" class="eval-details-section"></div>`);
       }
+    } else if (data.adaptive) {
+      // An exam-model pair of an adaptive batch stopped repeating
+      const adaptive = data.adaptive;
+      if (adaptive.saved > 0) {
+        $("#batch-eval-errors").append(
+          `<div class="batch-eval-adaptive">
+            <b>${adaptive.model}</b> on <b>${adaptive.exam}</b>: grade within ±${adaptive.half_width} after
+            ${adaptive.repetitions} repetition(s), ${adaptive.saved} skipped.
+          </div>`
+        );
+      }
     } else if (data.done) {
       // Do not clear or append, just mark finished
       window._batchEvalFinished = true; // Mark as finished correctly
+      localStorage.removeItem(ACTIVE_BATCH_JOB_KEY);
       let finishedMsg = "Batch evaluation finished.";
       if (window._batchEvalStartTime) {
         const elapsedMs = Date.now() - window._batchEvalStartTime;
         const elapsedStr = formatDuration(elapsedMs);
         finishedMsg += ` <span class="batch-eval-time">(Total time: ${elapsedStr})</span>`;
       }
+      if (data.repetitions_saved !== undefined) {
+        finishedMsg += ` ${data.repetitions_saved} repetition(s) saved by adaptive sampling.`;
+      }
       $("#batch-eval-results").html(`<div>${finishedMsg}</div>`);
       $("#loading-indicator").hide();
     }
@@ -292,6 +312,7 @@ $(document).ready(function () {
     $("#batch-eval-results").html("");
     $("#batch-eval-errors").html("");
     $("#exam-details").html("");
+    window._batchTaskStates = {};
     
     // Record start time for batch evaluation
     window._batchEvalStartTime = Date.now();
@@ -299,7 +320,7 @@ $(document).ready(function () {
     // Collect and prepare data
     const data = collectBatchEvalFormData(this);
     
-    // Fetch and handle stream
+    // Submit the batch as a job, then follow its events
     fetch(window.location.pathname, {
       method: "POST",
       headers: {
@@ -308,14 +329,65 @@ $(document).ready(function () {
       },
       body: JSON.stringify(data),
     })
-      .then(handleBatchEvalStream)
+      .then((response) => {
+        if (!response.ok) {
+          return response.json().catch(() => ({})).then((error) => {
+            throw new Error(error.message || "Error starting batch evaluation.");
+          });
+        }
+        return response.json();
+      })
+      .then((job) => {
+        localStorage.setItem(ACTIVE_BATCH_JOB_KEY, JSON.stringify({ eventsUrl: job.events_url, startTime: window._batchEvalStartTime }));
+        return followBatchJob(job.events_url);
+      })
       .catch((error) => {
         $("#loading-indicator").hide();
         $("#batch-eval-errors").html("Error: " + error.message);
       });
   });
+
+  // A batch started earlier keeps running on the server: follow it again
+  const activeJob = JSON.parse(localStorage.getItem(ACTIVE_BATCH_JOB_KEY) || "null");
+  if (activeJob) {
+    $("#loading-indicator").show();
+    window._batchEvalStartTime = activeJob.startTime;
+    followBatchJob(activeJob.eventsUrl).catch((error) => {
+      localStorage.removeItem(ACTIVE_BATCH_JOB_KEY);
+      $("#loading-indicator").hide();
+      $("#batch-eval-errors").html("Error: " + error.message);
+    });
+  }
 });
 
+/**
+ * Follows the events of a batch job until its "done" event. Events are
+ * replayed from the start of the job, so the page can be rebuilt after a
+ * reload. The server answers at once with the events it has, so the job is
+ * polled again: right away after new events, otherwise after a pause.
+ * @param {string} eventsUrl - URL of the job's events.
+ * @param {number} afterId - Id of the last event already processed.
+ * @returns {Promise<void>} Resolves when the job is done.
+ */
+function followBatchJob(eventsUrl, afterId = 0) {
+  if (afterId === 0) window._batchEvalFinished = false;
+  return fetch(`${eventsUrl}?after=${afterId}`, { headers: { "Cache-Control": "no-cache" } })
+    .catch(() => {
+      // The batch keeps running in the workers: reload the page to follow it again
+      throw new Error("Lost connection to the batch evaluation. It keeps running on the server; " +
+                      "reload the page to follow it again.");
+    })
+    .then(response => handleBatchEvalEvents(response, afterId))
+    .then((lastId) => {
+      if (window._batchEvalFinished) {
+        $("#loading-indicator").hide();
+        return;
+      }
+      const delay = lastId === afterId ? BATCH_EVENTS_POLL_INTERVAL : 0;
+      return new Promise(resolve => setTimeout(resolve, delay)).then(() => followBatchJob(eventsUrl, lastId));
+    });
+}
+
 /**
  * Formats a duration in milliseconds into a human-readable string.
  * Examples: "5s", "2m 10s", "1h 3m 5s", "1d 2h 3m 5s"
@@ -355,9 +427,53 @@ function updateEvalCountIndicator() {
   document.getElementById('eval-count-indicator').innerHTML = msg;
 }
 
+/**
+ * Asks the server for the estimated duration of the selected batch and shows it.
+ * Requests are debounced while the selection changes.
+ */
+function updateEstimateIndicator() {
+  clearTimeout(window._estimateTimer);
+  window._estimateTimer = setTimeout(() => {
+    const form = document.getElementById('batch-eval-form');
+    const indicator = document.getElementById('eval-estimate-indicator');
+    const data = collectBatchEvalFormData(form);
+    if (!data['exams[]'] || !data['models[]'] || !parseInt(data.repetitions)) {
+      indicator.innerHTML = '';
+      return;
+    }
+    fetch(`${window.location.pathname}estimate/`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json", "X-CSRFToken": $("input[name='csrfmiddlewaretoken']").val() },
+      body: JSON.stringify(data),
+    })
+      .then((response) => response.ok ? response.json() : null)
+      .then((estimate) => {
+        if (!estimate) return;
+        if (estimate.unknown_evaluations === estimate.evaluations) {
+          indicator.innerHTML = 'Estimated time: unknown (no past evaluations to estimate from)';
+          return;
+        }
+        const wall = estimate.wall;
+        let msg = `Estimated time: <b>~${formatDuration(wall.seconds * 1000)}</b> ` +
+          `(95%: ${formatDuration(wall.low * 1000)} – ${formatDuration(wall.high * 1000)}), ` +
+          `~${estimate.prompt_tokens} prompt tokens`;
+        if (estimate.unknown_evaluations) {
+          msg += `; ${estimate.unknown_evaluations} evaluation(s) without history not included`;
+        }
+        indicator.innerHTML = msg;
+      })
+      .catch(() => { indicator.innerHTML = ''; });
+  }, 400);
+}
+
 document.addEventListener('DOMContentLoaded', function() {
   updateEvalCountIndicator();
-  document.getElementById('exams').addEventListener('change', updateEvalCountIndicator);
-  document.getElementById('models').addEventListener('change', updateEvalCountIndicator);
+  updateEstimateIndicator();
+  ['exams', 'models'].forEach((id) => {
+    document.getElementById(id).addEventListener('change', updateEvalCountIndicator);
+    document.getElementById(id).addEventListener('change', updateEstimateIndicator);
+  });
   document.getElementById('repetitions').addEventListener('input', updateEvalCountIndicator);
+  document.getElementById('repetitions').addEventListener('input', updateEstimateIndicator);
+  document.getElementById('user-prompt').addEventListener('change', updateEstimateIndicator);
 });
@@ -61,8 +61,15 @@ function handleStreamingResponse(response, onProgress) {
         if (data.error) {
           $("#loading-indicator").hide();
           $("#exam-results").append(`<div class="error-message">${data.error}</div>`);
+          if (data.evaluation_id) {
+            $("#exam-results").append(`<div class="error-message">The answers received so far were saved. The evaluation can be resumed from the exam page.</div>`);
+          }
           return; // Skip further processing of this chunk
         }
+        if (data.notice) {
+          $("#exam-results").append(`<div class="info-message">${data.notice}</div>`);
+          return;
+        }
 
         onProgress(data);
       } catch (e) {
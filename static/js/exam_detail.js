@@ -103,6 +103,52 @@ function deleteEvaluation(button) {
     }
 }
 
+function resumeEvaluation(button) {
+    const row = $(button).closest('tr');
+    const evalId = row.data('eval-id');
+
+    $(button).prop('disabled', true).text('⏳');
+    fetch(`/evaluation/resume/${evalId}/`, {
+        method: 'POST',
+        headers: {
+            'X-CSRFToken': getCookie('csrftoken')
+        }
+    }).then(response => {
+        if (!response.ok) {
+            return response.text().then(text => { throw new Error(text); });
+        }
+        // Drain the event stream; the last event carries the final result
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder('utf-8');
+        let buffer = '';
+        let lastError = null;
+        const read = () => reader.read().then(({ done, value }) => {
+            if (done) {
+                if (lastError) throw new Error(lastError);
+                location.reload();
+                return;
+            }
+            buffer += decoder.decode(value, { stream: true });
+            const chunks = buffer.split('\n\n');
+            buffer = chunks.pop() || '';
+            chunks.forEach(chunk => {
+                if (chunk.trim() === '') return;
+                try {
+                    const data = JSON.parse(chunk.replace('data: ', ''));
+                    if (data.error) lastError = data.error;
+                } catch (e) {
+                    console.error('Error parsing chunk:', e);
+                }
+            });
+            return read();
+        });
+        return read();
+    }).catch(error => {
+        alert('Error resuming: ' + error.message);
+        $(button).prop('disabled', false).text('▶️');
+    });
+}
+
 // Charts with confidence intervals
 document.addEventListener('DOMContentLoaded', function () {
     const modelAverages = JSON.parse(document.getElementById('model-averages-data').textContent);